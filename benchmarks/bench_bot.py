@@ -0,0 +1,253 @@
+"""End-to-end benchmark for ExpenseBot.
+
+Drives ``handle_message`` and ``handle_button`` with synthetic Telegram
+updates against a fake ChatOpenAI and a fake Sheets service, and reports
+throughput plus p50/p95/p99 latency per stage. Results are written as JSON
+so runs can be compared over time.
+
+    python -m benchmarks.bench_bot --chats 1 4 16 --concurrency 1 8 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import patch
+from benchmarks.fakes import FakeChatModel, FakeSheetsServer
+from src.bot.main import ExpenseBot
+from src.sheets.transport import SheetsTransport
+
+FORMULAIC = ["coffee {n} cash", "{n} thb grab card", "lunch {n}", "taxi {n} cash", "groceries {n} card"]
+FREE_FORM = [
+    "spent {n} on dinner with friends at the night market",
+    "paid {n} baht for the kids' swimming lessons yesterday",
+    "we bought a new kettle for {n} at the mall, paid by card",
+]
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": 1000 * sum(samples) / len(samples),
+        "p50_ms": 1000 * percentile(samples, 50),
+        "p95_ms": 1000 * percentile(samples, 95),
+        "p99_ms": 1000 * percentile(samples, 99),
+    }
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap_async(self, stage, func):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def wrap_sync(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+class FakeChat:
+    def __init__(self, chat_id, reply_latency):
+        self.id = chat_id
+        self.reply_latency = reply_latency
+
+        self.first_reply = None
+
+    async def reply(self, *args, **kwargs):
+        await asyncio.sleep(self.reply_latency)
+        if self.first_reply is None:
+            self.first_reply = time.perf_counter()
+        # Stands in for the sent telegram.Message, so previews can edit it
+        return SimpleNamespace(edit_text=self.reply, delete=self.reply)
+
+def message_update(chat, text):
+    message = SimpleNamespace(
+        chat_id=chat.id, text=text, from_user=SimpleNamespace(id=chat.id),
+        reply_text=chat.reply
+    )
+    return SimpleNamespace(message=message, effective_chat=chat, effective_message=message, callback_query=None)
+
+# Callback queries and confirmation messages each have their own ids, as in Telegram
+CALLBACK_IDS = itertools.count(1)
+
+def button_update(chat, data):
+    callback_id = next(CALLBACK_IDS)
+    message = SimpleNamespace(chat_id=chat.id, message_id=callback_id, reply_text=chat.reply)
+
+    async def answer(*args, **kwargs):
+        return None
+
+    query = SimpleNamespace(
+        id=str(callback_id), data=data, message=message, answer=answer, edit_message_text=chat.reply
+    )
+    return SimpleNamespace(callback_query=query, effective_chat=chat, effective_message=message, message=None)
+
+def build_bot(args, workdir, timer, sheets_url):
+    """Construct ExpenseBot against the fake backends, with stage timing hooks installed."""
+    llm = FakeChatModel(latency=args.llm_latency)
+    with ExitStack() as stack:
+        stack.enter_context(patch(
+            "src.sheets.client.SheetsClient.create_transport",
+            lambda client: SheetsTransport(base_url=sheets_url)
+        ))
+        stack.enter_context(patch("src.agent.main.ChatOpenAI", return_value=llm))
+        stack.enter_context(patch("src.agent.main.TRACING_ENABLED", False))
+        stack.enter_context(patch("src.bot.main.TELEGRAM_TOKEN", "123456:benchmark"))
+        stack.enter_context(patch("src.bot.main.OUTBOX_PATH", os.path.join(workdir, "outbox.db")))
+        stack.enter_context(patch("src.bot.main.PENDING_PATH", os.path.join(workdir, "pending.db")))
+        stack.enter_context(patch("src.bot.main.MIRROR_PATH", os.path.join(workdir, "mirror.db")))
+        # Nothing from the user's .env: no shared caches, households or rates, so every run starts cold
+        for target, value in (
+            ("src.agent.main.LLM_CACHE_PATH", None), ("src.bot.main.RECENT_WRITES_PATH", None),
+            ("src.agent.main.FX_RATES_PATH", None), ("src.bot.main.FX_RATES_PATH", None),
+            ("src.agent.main.HIS_TG_ID", None), ("src.agent.main.HER_TG_ID", None),
+            ("src.config.HIS_TG_ID", None), ("src.config.HER_TG_ID", None),
+            ("src.config.TENANTS_PATH", None), ("src.config.GOOGLE_SHEETS_ID", "benchmark"),
+        ):
+            stack.enter_context(patch(target, value))
+        stack.enter_context(patch("src.bot.main.MAX_CONCURRENT_UPDATES", args.current_concurrency))
+        # Build the agent while the fakes are patched in
+        stack.enter_context(patch("src.bot.main.LAZY_STARTUP", False))
+        bot = ExpenseBot()
+
+    agent = bot.agent
+    for stage in ("_fast_parse", "_parse_expense", "_format_for_confirmation"):
+        setattr(agent, stage, timer.wrap_async(stage.lstrip("_"), getattr(agent, stage)))
+    agent.workflow = agent._create_workflow()
+    writer = bot.sheets_client.writer
+    writer.write_rows = timer.wrap_sync("sheets_append", writer.write_rows)
+    writer.flush_interval = args.flush_interval
+    return bot, llm
+
+async def run_chat(bot, chat, messages, timer, rng, fast_ratio):
+    handle_message = timer.wrap_async("handle_message", bot.scheduler.wrap(bot.handle_message))
+    handle_button = timer.wrap_async("handle_button", bot.scheduler.wrap(bot.handle_button))
+    for _ in range(messages):
+        templates = FORMULAIC if rng.random() < fast_ratio else FREE_FORM
+        text = rng.choice(templates).format(n=rng.randint(10, 5000))
+        chat.first_reply = None
+        sent_at = time.perf_counter()
+        await handle_message(message_update(chat, text), None)
+        timer.samples["first_feedback"].append(chat.first_reply - sent_at)
+        await handle_button(button_update(chat, "confirm"), None)
+
+async def run_once(args, chats, concurrency):
+    args.current_concurrency = concurrency
+    timer = StageTimer()
+    rng = random.Random(args.seed)
+    service = FakeSheetsServer(latency=args.sheets_latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        bot, llm = build_bot(args, workdir, timer, service.start())
+        await bot.post_init(bot.app)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_chat(bot, FakeChat(1000 + index, args.reply_latency), args.messages, timer, rng, args.fast_ratio)
+            for index in range(chats)
+        ))
+        handled = time.perf_counter() - start
+        # Wait for the background pipeline to commit every confirmed row
+        await bot.outbox_worker.drain()
+        await bot.sheets_client.writer.flush()
+        committed = time.perf_counter() - start
+        await bot.post_shutdown(bot.app)
+        await service.stop()
+
+    total = chats * args.messages
+    return {
+        "chats": chats,
+        "concurrency": concurrency,
+        "messages": total,
+        "handled_seconds": handled,
+        "committed_seconds": committed,
+        "messages_per_second": total / handled,
+        "llm_calls": llm.calls,
+        "sheets_append_calls": service.append_calls,
+        "rows_written": len(service.rows) - 1,
+        "parsers": dict(bot.agent.parser_stats),
+        "stages": {stage: summarize(samples) for stage, samples in sorted(timer.samples.items())},
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def print_run(run):
+    print(
+        f"chats={run['chats']:<4} concurrency={run['concurrency']:<4} "
+        f"{run['messages_per_second']:8.1f} msg/s  llm_calls={run['llm_calls']:<5} "
+        f"sheets_appends={run['sheets_append_calls']}"
+    )
+    for stage, stats in run["stages"].items():
+        print(
+            f"    {stage:<26} n={stats['count']:<6} p50={stats['p50_ms']:8.1f}ms "
+            f"p95={stats['p95_ms']:8.1f}ms p99={stats['p99_ms']:8.1f}ms"
+        )
+
+async def main(args):
+    runs = []
+    for chats in args.chats:
+        for concurrency in args.concurrency:
+            run = await run_once(args, chats, concurrency)
+            print_run(run)
+            runs.append(run)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "current_concurrency")
+        },
+        "runs": runs,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, nargs="+", default=[1, 8], help="Chat counts to sweep")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="MAX_CONCURRENT_UPDATES values to sweep")
+    parser.add_argument("--messages", type=int, default=20, help="Messages sent by each chat")
+    parser.add_argument("--fast-ratio", type=float, default=0.7, help="Share of formulaic messages")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake ChatOpenAI latency in seconds")
+    parser.add_argument("--sheets-latency", type=float, default=0.2, help="Fake Sheets request latency in seconds")
+    parser.add_argument("--reply-latency", type=float, default=0.05, help="Fake Telegram reply latency in seconds")
+    parser.add_argument("--flush-interval", type=float, default=0.2, help="Sheets batch flush interval in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json", help="Where to write JSON results")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args()
+    results = asyncio.run(main(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
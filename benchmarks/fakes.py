@@ -0,0 +1,150 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application as WebApplication, RequestHandler
+
+AMOUNT_RE = re.compile(r"\d+(?:\.\d+)?")
+
+class FakeChatModel(BaseChatModel):
+    """Stand-in for ChatOpenAI that answers after a fixed latency.
+
+    It extracts one expense per number in the last message, so the agent's
+    JSON parsing and validation run exactly as they do against the real model.
+    Streamed replies send their first chunk after a fifth of the latency and
+    spread the rest evenly over the remainder.
+    """
+
+    latency: float = 0.5
+    chunk_size: int = 16
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-expense-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        text = messages[-1].content
+        expenses = [
+            {
+                "date": "2024-01-01",
+                "description": "Benchmark expense",
+                "amount": float(amount),
+                "currency": "THB",
+                "cash": False,
+                "user": "bench"
+            }
+            for amount in AMOUNT_RE.findall(text)
+        ] or [{
+            "date": "2024-01-01", "description": text[:40], "amount": 1.0,
+            "currency": "THB", "cash": False, "user": "bench"
+        }]
+        content = json.dumps({"expenses": expenses})
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": sum(len(str(m.content)) // 4 for m in messages),
+                "output_tokens": len(content) // 4,
+                "total_tokens": sum(len(str(m.content)) // 4 for m in messages) + len(content) // 4
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        message = self._reply(messages).generations[0].message
+        content = message.content
+        pieces = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        await asyncio.sleep(self.latency / 5)
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(self.latency * 4 / 5 / max(1, len(pieces) - 1))
+            last = index == len(pieces) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=piece, usage_metadata=message.usage_metadata if last else None
+            ))
+
+class _SheetsHandler(RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    async def prepare(self):
+        self.server.requests += 1
+        self.server.auth_headers.append(self.request.headers.get("Authorization"))
+        if self.server.latency:
+            await asyncio.sleep(self.server.latency)
+        if self.server.failures:
+            status, retry_after = self.server.failures.popleft()
+            self.set_status(status)
+            if retry_after is not None:
+                self.set_header("Retry-After", str(retry_after))
+            self.finish(json.dumps({"error": {"code": status, "message": "Injected failure"}}))
+
+class _AppendHandler(_SheetsHandler):
+    def post(self, spreadsheet_id, range):
+        values = json.loads(self.request.body)["values"]
+        with self.server.lock:
+            self.server.append_calls += 1
+            first = len(self.server.rows) + 1
+            self.server.rows.extend(values)
+            last = len(self.server.rows)
+        self.write({"updates": {"updatedRange": f"Actual!A{first}:F{last}", "updatedRows": len(values)}})
+
+class _GetHandler(_SheetsHandler):
+    def get(self, spreadsheet_id, range):
+        start = int(re.search(r"![A-Z]+(\d+)", range).group(1))
+        with self.server.lock:
+            values = [list(row) for row in self.server.rows[start - 1:]]
+        self.write({"range": range, "values": values})
+
+class FakeSheetsServer:
+    """Local HTTP server for the slice of the Sheets v4 REST API that SheetsTransport uses.
+
+    Every request waits ``latency`` seconds. Queue ``(status, retry_after)``
+    pairs on ``failures`` to make the next requests fail.
+    """
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.rows: List[List[Any]] = [["Date", "Description", "Amount", "Currency", "Cash", "User"]]
+        self.append_calls = 0
+        self.requests = 0
+        self.auth_headers: List[Optional[str]] = []
+        self.failures = deque()
+        self.lock = threading.Lock()
+        self.server: Optional[HTTPServer] = None
+        self.url: Optional[str] = None
+
+    def start(self) -> str:
+        """Listen on a free local port (needs a running event loop) and return the API base URL."""
+        app = WebApplication([
+            (r"/v4/spreadsheets/([^/]+)/values/([^/]+):append", _AppendHandler, {"server": self}),
+            (r"/v4/spreadsheets/([^/]+)/values/([^/]+)", _GetHandler, {"server": self}),
+        ])
+        sockets = bind_sockets(0, "127.0.0.1")
+        self.server = HTTPServer(app)
+        self.server.add_sockets(sockets)
+        self.url = f"http://127.0.0.1:{sockets[0].getsockname()[1]}/v4"
+        return self.url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.stop()
+            await self.server.close_all_connections()
+            self.server = None
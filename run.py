@@ -1,10 +1,20 @@
+import time
+STARTED_AT = time.perf_counter()
+
 import logging
-from src.bot.main import ExpenseBot
+from src.config import SHARDS
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     logger = logging.getLogger(__name__)
     
-    logger.info("Starting ExpenseBot...")
-    bot = ExpenseBot()
-    bot.run()
\ No newline at end of file
+    if SHARDS > 0:
+        # Only the router runs here; the bot itself is imported and built in each worker process
+        from src.bot.shards import ShardRouter
+        logger.info(f"Starting ExpenseBot with {SHARDS} shard workers...")
+        ShardRouter(SHARDS, started_at=STARTED_AT).run()
+    else:
+        from src.bot.main import ExpenseBot
+        logger.info("Starting ExpenseBot...")
+        bot = ExpenseBot(started_at=STARTED_AT)
+        bot.run()
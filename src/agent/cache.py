@@ -0,0 +1,89 @@
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def normalize_message(message: str) -> str:
+    """Lowercase and collapse whitespace so trivially different messages share an entry."""
+    return " ".join(message.lower().split()).strip(" .!")
+
+class ExtractionCache:
+    """LRU cache of validated LLM extractions with TTL eviction.
+
+    Entries are keyed by the normalized message together with its date context
+    (today's date and the sender), so relative dates like "yesterday" never
+    resolve against a stale day. When ``path`` is given, entries are also kept
+    in SQLite and survive restarts.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 24 * 3600, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute("DELETE FROM extraction_cache WHERE expires_at < ?", (time.time(),))
+
+    @staticmethod
+    def make_key(message: str, today: str, user: Optional[str]) -> str:
+        raw = f"{today}\x00{user or ''}\x00{normalize_message(message)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < now:
+            del self._entries[key]
+            entry = None
+        if entry is None and self.conn is not None:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM extraction_cache WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                entry = (row[1], json.loads(row[0]))
+                self._store(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def set(self, key: str, value: Any) -> None:
+        entry = (time.time() + self.ttl, copy.deepcopy(value))
+        self._store(key, entry)
+        if self.conn is not None:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), entry[0])
+            )
+
+    def _store(self, key: str, entry: Tuple[float, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,201 @@
+import logging
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from src.metrics import CATEGORIZED
+
+# Categories are assigned locally, without a model call. A keyword/merchant
+# trie catches known names; everything else is matched against per-category
+# centroids of hashed character n-grams, learned from confirmed expenses.
+
+DEFAULT_CATEGORY = "Other"
+
+# Seed keywords; confirmed expenses extend and override them
+DEFAULT_KEYWORDS = {
+    "Groceries": [
+        "groceries", "grocery", "supermarket", "market", "makro", "lotus", "lotus's", "big c", "tops",
+        "villa market", "foodland", "7 eleven", "7-eleven", "family mart", "fruit", "vegetables", "продукты",
+    ],
+    "Food": [
+        "coffee", "cafe", "lunch", "dinner", "breakfast", "restaurant", "starbucks", "amazon cafe",
+        "food", "pizza", "burger", "kfc", "mcdonalds", "bar", "beer", "snack", "кофе", "обед", "ужин",
+    ],
+    "Transport": [
+        "taxi", "grab", "bolt", "bts", "mrt", "bus", "train", "fuel", "petrol", "gas station", "parking",
+        "toll", "motorbike", "такси", "бензин",
+    ],
+    "Housing": [
+        "rent", "electricity", "water bill", "internet", "condo", "maintenance", "аренда",
+    ],
+    "Health": [
+        "pharmacy", "doctor", "hospital", "clinic", "dentist", "medicine", "boots", "watsons", "аптека",
+    ],
+    "Shopping": [
+        "clothes", "shoes", "lazada", "shopee", "ikea", "uniqlo", "central", "electronics",
+    ],
+    "Entertainment": [
+        "cinema", "movie", "netflix", "spotify", "youtube", "museum", "tickets", "concert", "games",
+    ],
+    "Travel": [
+        "hotel", "flight", "airbnb", "agoda", "booking", "visa", "airport", "hostel",
+    ],
+}
+
+WORD_RE = re.compile(r"[^\W\d_][\w'&-]*|\d+[a-z]*")
+
+def tokenize(text: str) -> List[str]:
+    return WORD_RE.findall(str(text or "").lower())
+
+class KeywordTrie:
+    """Maps word sequences (keywords, merchant names) to categories; the longest match wins."""
+
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+        self.size = 0
+
+    def insert(self, tokens: List[str], category: str) -> None:
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if None not in node:
+            self.size += 1
+        # A later insert (e.g. a user correction) overrides an earlier one
+        node[None] = category
+
+    def match(self, tokens: List[str]) -> Optional[str]:
+        best, best_length = None, 0
+        for start in range(len(tokens)):
+            node = self.root
+            for offset in range(start, len(tokens)):
+                node = node.get(tokens[offset])
+                if node is None:
+                    break
+                if None in node and offset - start + 1 > best_length:
+                    best, best_length = node[None], offset - start + 1
+        return best
+
+class Categorizer:
+    """Assigns a category to each expense from its description, fully offline.
+
+    ``classify`` first looks the description's words up in the keyword trie,
+    then falls back to cosine similarity between its hashed character
+    trigrams and each category's centroid, and to ``DEFAULT_CATEGORY`` when
+    nothing is similar enough. ``learn`` updates the centroids with every
+    confirmed expense; when the confirmed category differs from what would
+    have been predicted, the description is also added to the trie so the
+    correction sticks.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]] = DEFAULT_KEYWORDS, dim: int = 4096,
+                 min_similarity: float = 0.15):
+        self.logger = logging.getLogger(__name__)
+        self.dim = dim
+        self.min_similarity = min_similarity
+        self.trie = KeywordTrie()
+        self.categories: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.sums = np.zeros((0, dim), dtype=np.float32)
+        # Unit-length copies of the centroids, so a match is a single gather and dot product
+        self.unit = np.zeros((0, dim), dtype=np.float32)
+        self.examples = 0
+        self.trained = False
+        self._category(DEFAULT_CATEGORY)
+        for category, words in keywords.items():
+            for word in words:
+                self.trie.insert(tokenize(word), category)
+                # Seed the centroid too, so near-misses like "groceris" still match
+                self._add(word, category)
+
+    def _category(self, name: str) -> int:
+        index = self.index.get(name)
+        if index is None:
+            index = len(self.categories)
+            self.categories.append(name)
+            self.index[name] = index
+            self.sums = np.vstack([self.sums, np.zeros((1, self.dim), dtype=np.float32)])
+            self.unit = np.vstack([self.unit, np.zeros((1, self.dim), dtype=np.float32)])
+        return index
+
+    def normalize_category(self, name: Any) -> Optional[str]:
+        """Canonical spelling of a category name; unknown names become new categories"""
+        text = " ".join(str(name or "").split())
+        if not text:
+            return None
+        for category in self.categories:
+            if category.lower() == text.lower():
+                return category
+        return text[0].upper() + text[1:]
+
+    def features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashed character trigram counts of the padded words, as (indices, unit weights)"""
+        counts: Dict[int, float] = {}
+        for word in tokenize(text):
+            padded = f" {word} "
+            for start in range(len(padded) - 2):
+                bucket = zlib.crc32(padded[start:start + 3].encode()) % self.dim
+                counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        if not counts:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return indices, weights / np.linalg.norm(weights)
+
+    def _add(self, text: str, category: str) -> None:
+        indices, weights = self.features(text)
+        if not len(indices):
+            return
+        row = self._category(category)
+        np.add.at(self.sums[row], indices, weights)
+        norm = np.linalg.norm(self.sums[row])
+        self.unit[row] = self.sums[row] / norm if norm else 0.0
+
+    def classify(self, description: str) -> str:
+        category, _ = self.explain(description)
+        return category
+
+    def explain(self, description: str) -> Tuple[str, str]:
+        """Category and how it was found (keyword, similarity or default)"""
+        category = self.trie.match(tokenize(description))
+        if category is not None:
+            return category, "keyword"
+        indices, weights = self.features(description)
+        if len(indices):
+            scores = self.unit[:, indices] @ weights
+            best = int(np.argmax(scores))
+            if scores[best] >= self.min_similarity:
+                return self.categories[best], "similarity"
+        return DEFAULT_CATEGORY, "default"
+
+    def categorize(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copies of the expense dicts with a category set"""
+        categorized = []
+        for item in items:
+            category, source = self.explain(item.get("description", ""))
+            CATEGORIZED.inc(source=source)
+            categorized.append(dict(item, category=category))
+        return categorized
+
+    def learn(self, description: str, category: str) -> None:
+        """Learn from a confirmed expense"""
+        category = self.normalize_category(category)
+        if category is None or not tokenize(description):
+            return
+        if self.classify(description) != category:
+            # The user corrected the prediction: make this exact description match from now on
+            self.trie.insert(tokenize(description), category)
+        self._add(description, category)
+        self.examples += 1
+
+    def train(self, rows: Iterable[Tuple[str, str]]) -> int:
+        """Learn from (description, category) pairs, e.g. previously confirmed sheet rows"""
+        count = 0
+        for description, category in rows:
+            if category:
+                self.learn(description, category)
+                count += 1
+        self.trained = True
+        self.logger.info(f"Categorizer trained on {count} rows ({len(self.categories)} categories)")
+        return count
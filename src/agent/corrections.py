@@ -0,0 +1,107 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.agent.fastpath import CURRENCY_ALIASES, DATE_WORDS, PAYMENT_WORDS, _parse_amount
+from src.agent.validation import HER_WORDS, HIS_WORDS
+
+# Rule-based patches for short corrections to a pending confirmation, like
+# "actually 150", "it was card" or "item 2 yesterday". Like the fast path it
+# only answers when every token is understood, and returns None otherwise so
+# the correction goes to the LLM.
+
+# Words that carry no information in a correction
+FILLER_WORDS = {
+    "actually", "no", "nope", "sorry", "oh", "oops", "wait", "i", "mean", "meant", "please",
+    "it", "it's", "its", "that", "this", "was", "is", "were", "should", "be", "been",
+    "the", "a", "an", "one", "by", "with", "in", "on", "to", "for", "change", "make", "set", "paid", "pay",
+    "amount", "price", "cost", "total", "currency", "payment", "date", "user", "spent",
+    "нет", "было", "это", "на", "вообще-то",
+}
+
+ORDINAL_WORDS = {"first": 0, "second": 1, "third": 2, "fourth": 3, "fifth": 4, "last": -1}
+
+# "item 2", "number 2" or "#2" picks which expense of a multi-item message to correct
+SELECTOR_RE = re.compile(r"\b(?:item|number)\s+(\d+)\b|#(\d+)\b")
+ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+DESCRIPTION_RE = re.compile(r"^\s*(?:description|call it|rename(?: it)?(?: to)?)\s*[:=]?\s+(?P<text>.+?)\s*$", re.IGNORECASE)
+
+def parse_correction_fast(message: str, count: int, today: date,
+                          categories: Iterable[str] = ()) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Turn a short correction into ``(item index, changed fields)`` without calling the model.
+
+    ``count`` is the number of pending expenses and ``categories`` the known
+    category names, which can be given as one word. Returns None when the message
+    has anything the grammar does not cover, or doesn't say which of several
+    expenses it is about.
+    """
+    categories = {category.lower(): category for category in categories}
+    index = None
+    match = SELECTOR_RE.search(message.lower())
+    if match:
+        index = int(match.group(1) or match.group(2)) - 1
+        message = message[:match.start()] + " " + message[match.end():]
+
+    description = DESCRIPTION_RE.match(message)
+    if description:
+        changes = {"description": description.group("text").capitalize()}
+    else:
+        changes = {}
+        tokens = [token.strip(",.;:!?") for token in message.lower().split()]
+        for token in [token for token in tokens if token]:
+            field, value = _parse_token(token, today, categories)
+            if field is None:
+                if token in ORDINAL_WORDS and index is None:
+                    index = ORDINAL_WORDS[token] % count if count else 0
+                    continue
+                if token in FILLER_WORDS:
+                    continue
+                return None
+            if field == "amount":
+                amount, currency = value
+                if "amount" in changes or (currency and "currency" in changes):
+                    return None
+                changes["amount"] = amount
+                if currency:
+                    changes["currency"] = currency
+            elif field in changes:
+                return None
+            else:
+                changes[field] = value
+
+    if not changes:
+        return None
+    if index is None:
+        if count != 1:
+            return None
+        index = 0
+    if not 0 <= index < count:
+        return None
+    return index, changes
+
+def _parse_token(token: str, today: date, categories: Dict[str, str]) -> Tuple[Optional[str], Any]:
+    amount = _parse_amount(token)
+    if amount is not None:
+        return "amount", amount
+    if token in CURRENCY_ALIASES:
+        return "currency", CURRENCY_ALIASES[token]
+    if token in PAYMENT_WORDS:
+        return "cash", PAYMENT_WORDS[token]
+    if token in DATE_WORDS:
+        return "date", (today - timedelta(days=DATE_WORDS[token])).isoformat()
+    if ISO_DATE_RE.match(token):
+        try:
+            return "date", datetime.strptime(token, "%Y-%m-%d").date().isoformat()
+        except ValueError:
+            return None, None
+    if token in HIS_WORDS or token in HER_WORDS:
+        return "user", token
+    if token in categories:
+        return "category", categories[token]
+    return None, None
+
+def apply_changes(items: List[Dict[str, Any]], changes: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Copy of ``items`` with each ``(index, fields)`` patch applied"""
+    patched = [dict(item) for item in items]
+    for index, fields in changes:
+        patched[index].update(fields)
+    return patched
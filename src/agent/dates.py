@@ -0,0 +1,74 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+import pytz
+
+# Relative dates ("yesterday", "3 days ago", "last friday") resolved locally,
+# in the household's time zone, so the model is handed dates instead of being
+# asked to work them out. Only unambiguous phrases are resolved; anything else
+# is left to the model, which is told today's date.
+
+TIMEZONE = pytz.timezone("Asia/Bangkok")
+
+def local_today() -> date:
+    return datetime.now(TIMEZONE).date()
+
+DAY_WORDS = {
+    "today": 0, "сегодня": 0,
+    "yesterday": 1, "вчера": 1,
+    "day before yesterday": 2, "the day before yesterday": 2, "позавчера": 2,
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5,
+}
+
+# Weekday names by Python's weekday(), in English and the forms used after "в" in Russian
+WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "понедельник": 0, "вторник": 1, "среду": 2, "четверг": 3, "пятницу": 4, "субботу": 5, "воскресенье": 6,
+}
+
+NUMBER = r"\d{1,3}|" + "|".join(NUMBER_WORDS)
+DATE_PHRASE_RE = re.compile(
+    r"\b(?:"
+    r"(?P<day>(?:the )?day before yesterday|today|yesterday|сегодня|позавчера|вчера)"
+    rf"|(?P<count>{NUMBER}) (?P<unit>days?|weeks?|дн(?:я|ей|ь)|недел(?:ю|и|ь)) (?:ago|назад)"
+    rf"|(?P<last>last |this past |в прошл(?:ый|ую|ое) |на прошлой неделе в )?(?:on |в )?(?P<weekday>{'|'.join(WEEKDAYS)})"
+    r")\b",
+    re.IGNORECASE
+)
+
+def resolve_dates(text: str, today: date) -> List[Tuple[str, date]]:
+    """``(phrase, date)`` for each relative date in ``text``, in order.
+
+    A bare weekday is the most recent one, today included; "last friday" is the
+    most recent one before today.
+    """
+    found = []
+    for match in DATE_PHRASE_RE.finditer(text):
+        phrase = match.group(0).lower()
+        if match.group("day"):
+            days = DAY_WORDS[match.group("day").lower()]
+        elif match.group("count"):
+            count = match.group("count").lower()
+            days = int(count) if count.isdigit() else NUMBER_WORDS[count]
+            if match.group("unit").lower().startswith(("week", "недел")):
+                days *= 7
+        else:
+            days = (today.weekday() - WEEKDAYS[match.group("weekday").lower()]) % 7
+            if days == 0 and match.group("last"):
+                days = 7
+        found.append((phrase, today - timedelta(days=days)))
+    return found
+
+def date_context(text: str, today: date) -> str:
+    """The dates a prompt needs: today's, and what each relative date in ``text`` refers to"""
+    context = f"Today is {today.isoformat()} ({today.strftime('%A')})."
+    resolved = resolve_dates(text, today)
+    if resolved:
+        context += " In the message, " + ", ".join(
+            f'"{phrase}" is {day.isoformat()}' for phrase, day in resolved
+        ) + "."
+    return context
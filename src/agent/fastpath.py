@@ -0,0 +1,122 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from src.currency import CURRENCY_ALIASES, CURRENCY_NAMES, ISO_CURRENCIES
+
+# Rule-based extractor for short, formulaic messages like "coffee 80 cash" or
+# "450 thb grab card". It only answers when every token is accounted for and
+# returns None otherwise, so anything unusual still goes to the LLM.
+
+PAYMENT_WORDS = {
+    "cash": True, "наличные": True, "нал": True, "кэш": True,
+    "card": False, "карта": False, "картой": False, "credit": False, "debit": False,
+}
+
+DATE_WORDS = {
+    "today": 0, "сегодня": 0,
+    "yesterday": 1, "вчера": 1,
+}
+
+# Date expressions the grammar does not resolve; leave them to the model
+DATE_HINTS = {
+    "ago", "last", "before", "week", "month", "позавчера", "назад", "прошлой", "прошлый",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+}
+
+MAX_DESCRIPTION_WORDS = 4
+
+AMOUNT_RE = re.compile(r"^(?P<pre>[฿$€₽₴])?(?P<amount>\d{1,3}(?:,\d{3})+|\d+)(?:[.,](?P<cents>\d{1,2}))?(?P<post>[a-zа-я฿$€₽₴]+)?$")
+WORD_RE = re.compile(r"^[^\W\d_][\w'&-]*$")
+# Separators between expenses in one message; "1,200" has no space so it stays intact
+SEGMENT_RE = re.compile(r",\s+|;|\n")
+
+def _parse_amount(token: str):
+    match = AMOUNT_RE.match(token)
+    if not match:
+        return None
+    currency_token = match.group("pre") or match.group("post")
+    if currency_token and currency_token not in CURRENCY_ALIASES:
+        return None
+    amount = float(match.group("amount").replace(",", ""))
+    if match.group("cents"):
+        amount += float("0." + match.group("cents"))
+    currency = CURRENCY_ALIASES[currency_token] if currency_token else None
+    return amount, currency
+
+def parse_expense_fast(message: str, user: Optional[str], today: date,
+                       default_currency: str = "THB") -> Optional[Dict[str, Any]]:
+    """Extract an expense from a short message without calling the model.
+
+    Returns a dict with the ``ExpenseSchema`` fields, or None when the message
+    does not match the grammar unambiguously.
+    """
+    if not user:
+        return None
+    tokens = [token.strip(",.;:!") for token in message.lower().split()]
+    tokens = [token for token in tokens if token]
+    if not tokens:
+        return None
+
+    amount = currency = cash = days_ago = None
+    description = []
+    for token in tokens:
+        if token in DATE_HINTS:
+            return None
+        parsed = _parse_amount(token)
+        if parsed is not None:
+            if amount is not None:
+                return None  # Several numbers, e.g. multiple expenses in one message
+            amount, token_currency = parsed
+            if token_currency:
+                if currency is not None:
+                    return None
+                currency = token_currency
+        elif token in CURRENCY_ALIASES:
+            if currency is not None:
+                return None
+            currency = CURRENCY_ALIASES[token]
+        elif token in CURRENCY_NAMES or token.upper() in ISO_CURRENCIES:
+            return None  # A currency the grammar doesn't take, e.g. "jpy" or "pounds"; don't default it to THB
+        elif token in PAYMENT_WORDS:
+            if cash is not None:
+                return None
+            cash = PAYMENT_WORDS[token]
+        elif token in DATE_WORDS:
+            if days_ago is not None:
+                return None
+            days_ago = DATE_WORDS[token]
+        elif WORD_RE.match(token):
+            description.append(token)
+        else:
+            return None
+
+    if amount is None or amount <= 0 or not description or len(description) > MAX_DESCRIPTION_WORDS:
+        return None
+
+    return {
+        "date": (today - timedelta(days=days_ago or 0)).isoformat(),
+        "description": " ".join(description).capitalize(),
+        "amount": amount,
+        "currency": currency or default_currency,
+        "cash": bool(cash),
+        "user": user,
+    }
+
+def parse_expenses_fast(message: str, user: Optional[str], today: date,
+                        default_currency: str = "THB") -> Optional[List[Dict[str, Any]]]:
+    """Extract one or more expenses, e.g. "coffee 80, lunch 250 card".
+
+    Every segment has to parse on the fast path, otherwise the whole message
+    goes to the LLM and None is returned.
+    """
+    expenses = []
+    for segment in SEGMENT_RE.split(message):
+        if not segment.strip():
+            continue
+        expense = parse_expense_fast(segment, user, today, default_currency)
+        if expense is None:
+            return None
+        expenses.append(expense)
+    return expenses or None
@@ -1,209 +1,559 @@
 import logging
-import pytz
-import os
-from datetime import datetime
-from typing import TypeVar, List, Union, Dict, Any, Optional
+import time
+from typing import TypeVar, List, Dict, Any, Optional, NamedTuple, Callable, Awaitable, Tuple
 from langchain_openai import ChatOpenAI
+from langchain_openai.chat_models.base import BaseChatOpenAI
 from langgraph.graph import StateGraph, END
-from langchain.tools import StructuredTool
-from langchain.prompts import ChatPromptTemplate
-from langsmith import Client
-from langchain_core.tracers import LangChainTracer
-from src.schemas import ExpenseSchema
+from src.schemas import ExpenseSchema, ExpenseListSchema
 from pydantic import BaseModel
-from typing_extensions import Annotated
 import json
-from langchain_core.messages import AIMessage
+import uuid
+import openai
+from collections import Counter
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.utils.json import parse_json_markdown
+from src.agent.cache import ExtractionCache
+from src.agent.categories import Categorizer
+from src.agent.corrections import apply_changes, parse_correction_fast
+from src.agent.dates import date_context, local_today
+from src.agent.fastpath import parse_expenses_fast
+from src.agent.prompts import CORRECTION_PROMPT, PARSE_PROMPT, TokenBudget
+from src.agent.summary import format_expenses_summary
+from src.agent.tracing import TraceSampler
+from src.agent.validation import validate_expenses
+from src.currency import FxTable
+from src.ratelimit import PRIORITY_PARSE, parse_retry_after
+from src.tenants import DEFAULT_TENANT_ID, Tenant
+from src.config import (
+    DEFAULT_CURRENCY, LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_PATH, LANGCHAIN_PROJECT,
+    TRACING_ENABLED, TRACING_SAMPLE_RATE, TRACING_BATCH_SIZE, TRACING_FLUSH_INTERVAL,
+    OPENAI_TOKEN_ESTIMATE, OPENAI_MAX_RETRIES, PROMPT_TOKEN_BUDGET, LLM_MODELS, HIS_TG_ID, HER_TG_ID, BASE_CURRENCY, FX_RATES_PATH
+)
+from src.metrics import (
+    REGISTRY, NODE_SECONDS, LLM_SECONDS, LLM_TOKENS, MESSAGES, CORRECTIONS, LLM_TIER_SECONDS, LLM_TIER_RESULTS, LLM_ESCALATIONS
+)
 
 # Define state types
 S = TypeVar("S", bound=Dict[str, Any])
 
-class GetTimeToolSchema(BaseModel):
-    """Schema for get_current_time tool that takes no arguments"""
-    pass
-
 # Define state schema
 class ExpenseState(BaseModel):
     message: str
-    expense_data: Optional[Dict[str, Any]] = None
+    user: Optional[str] = None
+    expenses: Optional[List[Dict[str, Any]]] = None
     formatted_expense: Optional[str] = None
     status: Optional[str] = None
+    parser: Optional[str] = None  # "fast_path", "cache" or "llm"
+    model: Optional[str] = None  # Model tier that produced an LLM result
+
+class ModelTier(NamedTuple):
+    name: str
+    llm: Any
+    runnable: Any  # llm with structured output bound, or llm itself
+    structured: bool
+    streaming: Any  # llm in JSON mode where the provider has one, for streamed replies
+
+def make_tier(name: str, llm) -> ModelTier:
+    """Bind ExpenseListSchema as structured output when the model supports it"""
+    # Partial structured output isn't streamed, so streamed calls ask for a bare JSON object instead
+    streaming = llm.bind(response_format={"type": "json_object"}) if isinstance(llm, BaseChatOpenAI) else llm
+    try:
+        return ModelTier(name, llm, llm.with_structured_output(ExpenseListSchema, include_raw=True), True, streaming)
+    except (AttributeError, NotImplementedError):
+        return ModelTier(name, llm, llm, False, streaming)
+
+def parse_json_reply(text: str) -> Any:
+    """The JSON in a model reply, also when it is fenced or wrapped in prose"""
+    try:
+        return parse_json_markdown(text)
+    except json.JSONDecodeError:
+        start = min((text.find(bracket) for bracket in "{[" if bracket in text), default=-1)
+        end = max(text.rfind("}"), text.rfind("]"))
+        if start < 0 or end < start:
+            raise ValueError(f"Reply has no JSON: {text[:80]!r}")
+        return json.loads(text[start:end + 1])
+
+def partial_expenses(text: str) -> List[Dict[str, Any]]:
+    """Expenses readable from an incomplete JSON reply; fields that haven't arrived are missing"""
+    try:
+        parsed = parse_json_markdown(text)
+    except Exception:
+        return []
+    if isinstance(parsed, dict):
+        parsed = parsed.get("expenses", [parsed])
+    return [item for item in parsed or [] if isinstance(item, dict) and item]
 
 class ExpenseTrackingAgent:
-    def __init__(self, sheets_client):
+    def __init__(self, sheets_client, outbox=None, quota=None, fx=None):
         self.logger = logging.getLogger(__name__)
+        self.quota = quota
+        # Converts confirmed expenses to BASE_CURRENCY for the sheet's base amount column
+        self.fx = fx if fx is not None else FxTable.load(FX_RATES_PATH, BASE_CURRENCY)
         
-        self.logger.info("Initializing LangSmith...")
-        self.langsmith_client = Client()
-        self.tracer = LangChainTracer(project_name="expense_tracking")
+        self.logger.info(f"LangSmith tracing {'enabled' if TRACING_ENABLED else 'disabled'}")
+        self.tracing = TraceSampler(
+            TRACING_ENABLED,
+            sample_rate=TRACING_SAMPLE_RATE,
+            project=LANGCHAIN_PROJECT or "expense_tracking",
+            batch_size=TRACING_BATCH_SIZE,
+            flush_interval=TRACING_FLUSH_INTERVAL
+        )
         
-        self.logger.info("Initializing ChatOpenAI...")
-        self.llm = ChatOpenAI()
+        # Cheapest model first; a result that fails validation escalates to the next one
+        self.logger.info(f"Initializing model cascade: {' -> '.join(LLM_MODELS)}")
+        self.tiers = [make_tier(model, ChatOpenAI(model=model, stream_usage=True)) for model in LLM_MODELS]
+        # Which tier's result was accepted, per LLM-parsed message
+        self.tier_stats = Counter()
+        # Each household learns its own categories; ``categorizer`` serves the default household
+        self.categorizer = Categorizer()
+        self.categorizers: Dict[str, Categorizer] = {}
+        self.extraction_cache = ExtractionCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_PATH or None)
+        REGISTRY.gauge_callback(
+            "expense_bot_llm_cache_hits_total", "Extraction cache hits",
+            lambda: self.extraction_cache.hits, type="counter"
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_llm_cache_misses_total", "Extraction cache misses",
+            lambda: self.extraction_cache.misses, type="counter"
+        )
         
         self.logger.info("Setting up SheetsClient...")
         self.sheets_client = sheets_client
+        self.outbox = outbox
         
-        self.logger.info("Creating tools...")
-        self.tools = self._create_tools()
+        # Which parser handled each message, to track the fast-path hit rate
+        self.parser_stats = Counter()
         
         self.logger.info("Creating workflow graph...")
         self.workflow = self._create_workflow()
 
-    def _create_tools(self) -> List[StructuredTool]:
-        """Create the agent's tools"""
-        append_expense_tool = StructuredTool(
-            name="append_expense_to_table",
-            description="Formats an expense entry for confirmation",
-            func=self._format_expense,
-            args_schema=ExpenseSchema
-        )
-        
-        get_time_tool = StructuredTool(
-            name="get_current_time",
-            description="Returns current time in Thailand timezone",
-            func=self._get_current_time,
-            args_schema=GetTimeToolSchema  # Add args_schema even though it takes no arguments
-        )
-        
-        return [append_expense_tool, get_time_tool]
-
     def _create_workflow(self) -> StateGraph:
         """Create the workflow graph"""
         # Create the graph with proper state schema
         workflow = StateGraph(ExpenseState)
 
         # Add nodes
-        workflow.add_node("parse_expense", self._parse_expense)
-        workflow.add_node("format_for_confirmation", self._format_for_confirmation)
+        workflow.add_node("fast_parse", self._timed_node("fast_parse", self._fast_parse))
+        workflow.add_node("parse_expense", self._timed_node("parse_expense", self._parse_expense, with_config=True))
+        workflow.add_node("categorize", self._timed_node("categorize", self._categorize, with_config=True))
+        workflow.add_node("format_for_confirmation", self._timed_node("format_for_confirmation", self._format_for_confirmation))
 
-        # Add edges - Remove the automatic flow to write_to_sheet
-        workflow.add_edge("parse_expense", "format_for_confirmation")
+        # Add edges - fall through to the LLM only when the fast path is not confident
+        workflow.add_conditional_edges(
+            "fast_parse",
+            self._route_after_fast_parse,
+            {"parsed": "categorize", "llm": "parse_expense"}
+        )
+        workflow.add_edge("parse_expense", "categorize")
+        workflow.add_edge("categorize", "format_for_confirmation")
         workflow.add_edge("format_for_confirmation", END)  # End after formatting
 
         # Set entry point
-        workflow.set_entry_point("parse_expense")
+        workflow.set_entry_point("fast_parse")
 
         return workflow.compile()
 
-    async def _parse_expense(self, state: ExpenseState) -> ExpenseState:
-        """Parse expense information from user input"""
+    def _timed_node(self, name: str, node, with_config: bool = False):
+        """Wrap a graph node so its latency is recorded per node; ``with_config`` passes the graph's RunnableConfig on"""
+        async def timed(state: ExpenseState, config: RunnableConfig) -> ExpenseState:
+            with NODE_SECONDS.time(node=name):
+                return await (node(state, config) if with_config else node(state))
+        return timed
+
+    async def _fast_parse(self, state: ExpenseState) -> ExpenseState:
+        """Parse short, formulaic messages locally without calling the LLM"""
+        today = local_today()
+        expenses = parse_expenses_fast(state.message, state.user, today, DEFAULT_CURRENCY)
+        if expenses is None:
+            return state
+        self.logger.info(f"Parsed {len(expenses)} expenses on the fast path")
+        return state.model_copy(update={
+            "expenses": expenses,
+            "status": "pending_confirmation",
+            "parser": "fast_path"
+        })
+
+    def _route_after_fast_parse(self, state: ExpenseState) -> str:
+        return "parsed" if state.expenses is not None else "llm"
+
+    async def _parse_expense(self, state: ExpenseState, graph_config: Optional[RunnableConfig] = None) -> ExpenseState:
+        """Parse expense information from user input, escalating through the model tiers"""
         self.logger.info("Parsing expense from user input")
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """Extract expense information from the user message and return a structured JSON object with these exact fields:
-            - date (YYYY-MM-DD)
-            - description (string)
-            - amount (number)
-            - currency (string, e.g. THB)
-            - cash (boolean)
-            - user (string)
-            
-            For dates mentioned relatively (like "yesterday" or "three days ago"), calculate the actual date.
-            Return ONLY the JSON object, no other text.
-            """),
-            ("user", "{input}")
-        ])
+        today = local_today()
+        cache_key = self.extraction_cache.make_key(state.message, today.isoformat(), state.user)
+        cached = self.extraction_cache.get(cache_key)
+        if cached is not None:
+            self.logger.info(f"Extraction cache hit (hit rate {self.extraction_cache.hit_rate:.0%})")
+            return state.model_copy(update={
+                "expenses": cached,
+                "status": "pending_confirmation",
+                "parser": "cache"
+            })
         
-        chain = prompt | self.llm
+        # Relative dates are resolved here, so the model copies dates instead of computing them
+        inputs = {
+            "input": state.message,
+            "user": state.user or "default_user",
+            "dates": date_context(state.message, today)
+        }
+        budget = PARSE_PROMPT.budget(inputs, PROMPT_TOKEN_BUDGET, self.tiers[0].name)
         
+        # Runs are only recorded in memory here; the sampler decides afterwards whether to export them
+        collector = self.tracing.collector()
+        config = {
+            "callbacks": [collector] if collector else [],
+            "run_name": "parse_expense",
+            "metadata": {
+                "project": "expense_tracking",
+                "run_name": "parse_expense"
+            }
+        }
+        # Set by process_message to show partial results while the model streams
+        configurable = (graph_config or {}).get("configurable") or {}
+        on_progress = configurable.get("on_progress")
+        tenant = configurable.get("tenant")
+        error = None
         try:
-            result = await chain.ainvoke(
-                {"input": state.message},
-                config={
-                    "callbacks": [self.tracer],
-                    "metadata": {
-                        "project": "expense_tracking",
-                        "run_name": "parse_expense"
-                    }
-                }
-            )
-            
-            # Extract JSON content from AIMessage
-            if isinstance(result, AIMessage):
-                content = result.content
-            else:
-                content = result
+            async def attempt(tier: ModelTier) -> List[Dict[str, Any]]:
+                if on_progress is not None:
+                    # Also clears whatever a rejected tier had shown
+                    on_progress([])
+                items = await self._extract(tier, PARSE_PROMPT.template, inputs, config, on_progress, budget)
+                return self._validated(items, today, state.user, tenant)
+            expenses, tier = await self._cascade(attempt)
             
-            expense_data = json.loads(content)
-            self.logger.info(f"Successfully parsed expense data: {expense_data}")
+            self.logger.info(
+                f"Successfully parsed {len(expenses)} expenses with {tier.name} "
+                f"(escalation rate {self.escalation_rate:.0%})"
+            )
+            self.extraction_cache.set(cache_key, expenses)
             
             # Only parse and format, don't write yet
-            return ExpenseState(
-                message=state.message,
-                expense_data=expense_data,
-                formatted_expense=None,  # Will be set in _format_for_confirmation
-                status="pending_confirmation"  # New status to indicate waiting for confirmation
-            )
+            return state.model_copy(update={
+                "expenses": expenses,
+                "formatted_expense": None,  # Will be set in _format_for_confirmation
+                "status": "pending_confirmation",  # New status to indicate waiting for confirmation
+                "parser": "llm",
+                "model": tier.name
+            })
         except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
             self.logger.error(f"Failed to parse expense: {str(e)}")
             raise
+        finally:
+            self.logger.info(budget.report())
+            self.tracing.finish(collector, error)
 
-    async def _format_for_confirmation(self, state: ExpenseState) -> ExpenseState:
-        """Format expense for user confirmation"""
-        formatted = f"""
-📝 Expense Details:
-📅 Date: {state.expense_data['date']}
-💰 Amount: {state.expense_data['amount']} {state.expense_data['currency']}
-📄 Description: {state.expense_data['description']}
-💳 Payment Type: {'Cash' if state.expense_data['cash'] else 'Card'}
-👤 User: {state.expense_data['user']}
-"""
-        return ExpenseState(
-            message=state.message,
-            expense_data=state.expense_data,
-            formatted_expense=formatted,
-            status=state.status
-        )
+    async def _cascade(self, attempt: Callable[[ModelTier], Awaitable[List[Dict[str, Any]]]]) -> Tuple[List[Dict[str, Any]], ModelTier]:
+        """Run ``attempt`` on each model tier until one returns a result; the last tier's error is raised"""
+        for index, tier in enumerate(self.tiers):
+            start = time.perf_counter()
+            try:
+                expenses = await attempt(tier)
+            except Exception as e:
+                LLM_TIER_SECONDS.observe(time.perf_counter() - start, tier=tier.name)
+                LLM_TIER_RESULTS.inc(tier=tier.name, outcome="rejected")
+                if index == len(self.tiers) - 1:
+                    raise
+                # Failed or invalid output from a cheaper tier: try the next, stronger model
+                self.logger.info(f"Escalating from {tier.name}: {str(e)}")
+                LLM_ESCALATIONS.inc(tier=tier.name)
+                continue
+            LLM_TIER_SECONDS.observe(time.perf_counter() - start, tier=tier.name)
+            LLM_TIER_RESULTS.inc(tier=tier.name, outcome="accepted")
+            self.tier_stats[tier.name] += 1
+            return expenses, tier
 
-    async def _await_confirmation(self, state: ExpenseState) -> ExpenseState:
-        """Await user confirmation"""
-        # This node doesn't do anything as confirmation is handled by the bot
-        return state
-
-    async def _write_to_sheet(self, state: ExpenseState) -> ExpenseState:
-        """Write confirmed expense to sheet"""
-        await self.sheets_client.append_expense(**state.expense_data)
-        return ExpenseState(
-            message=state.message,
-            expense_data=state.expense_data,
-            formatted_expense=state.formatted_expense,
-            status="written"
-        )
+    def _validated(self, items: List[Dict[str, Any]], today, user: Optional[str],
+                   tenant: Optional[Tenant] = None) -> List[Dict[str, Any]]:
+        his_id, her_id = (tenant.his_id, tenant.her_id) if tenant is not None else (HIS_TG_ID, HER_TG_ID)
+        expenses, problems = validate_expenses(items, today, user, his_id, her_id)
+        if problems:
+            raise ValueError("; ".join(problems))
+        return expenses
+
+    @property
+    def escalation_rate(self) -> float:
+        """Share of LLM-parsed messages that the first tier could not handle"""
+        total = sum(self.tier_stats.values())
+        return 1 - self.tier_stats[self.tiers[0].name] / total if total else 0.0
 
-    def _format_expense(self, **kwargs) -> Dict[str, Any]:
-        """Format expense data"""
-        return kwargs
+    async def _extract(self, tier: ModelTier, prompt, inputs: Dict[str, Any], config: Dict[str, Any],
+                       on_progress: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                       budget: Optional[TokenBudget] = None) -> List[Dict[str, Any]]:
+        """Run one model tier and return the expense dicts it produced"""
+        if on_progress is not None:
+            # Partial structured output isn't exposed, so streamed calls parse the JSON reply as it grows
+            shown = []
+            def on_chunk(text: str) -> None:
+                nonlocal shown
+                partial = partial_expenses(text)
+                if partial and partial != shown:
+                    shown = partial
+                    on_progress(partial)
+            result = await self._call_llm(prompt | tier.streaming, inputs, config, on_chunk=on_chunk, budget=budget)
+        else:
+            result = await self._call_llm(prompt | tier.runnable, inputs, config, budget=budget)
+        if tier.structured and on_progress is None:
+            if result.get("parsed") is None:
+                raise ValueError(f"Structured output failed: {result.get('parsing_error')}")
+            return [expense.model_dump() for expense in result["parsed"].expenses]
+        
+        # Extract JSON content from AIMessage, also when it is fenced or wrapped in prose
+        content = result.content if isinstance(result, BaseMessage) else result
+        parsed = parse_json_reply(content)
+        if isinstance(parsed, dict):
+            parsed = parsed.get("expenses", [parsed])
+        return [ExpenseSchema(**item).model_dump() for item in parsed]
+
+    async def _call_llm(self, chain, inputs: Dict[str, Any], config: Dict[str, Any], priority: int = PRIORITY_PARSE,
+                        on_chunk: Optional[Callable[[str], None]] = None, budget: Optional[TokenBudget] = None):
+        """Invoke an LLM chain within the OpenAI request and token quotas, waiting out rate limits.
+
+        With ``on_chunk`` the chain is streamed and the callback gets the reply text received so far.
+        The reported usage is added to ``budget``, the request's token budget.
+        """
+        # Roughly 4 characters per token, plus the fixed prompt and the reply; corrected by actual usage
+        estimate = OPENAI_TOKEN_ESTIMATE + len(inputs.get("input", "")) // 4
+        attempt = 0
+        while True:
+            if self.quota is not None:
+                await self.quota.acquire("openai_requests", priority=priority)
+                await self.quota.acquire("openai_tokens", estimate, priority=priority)
+            try:
+                with LLM_SECONDS.time():
+                    if on_chunk is None:
+                        result = await chain.ainvoke(inputs, config=config)
+                    else:
+                        result = None
+                        async for chunk in chain.astream(inputs, config=config):
+                            result = chunk if result is None else result + chunk
+                            on_chunk(result.content if isinstance(result, BaseMessage) else result)
+            except openai.RateLimitError as e:
+                # An exhausted billing quota won't recover by waiting
+                if self.quota is None or attempt >= OPENAI_MAX_RETRIES or e.code == "insufficient_quota":
+                    raise
+                attempt += 1
+                retry_after = parse_retry_after(e.response.headers.get("retry-after")) if e.response is not None else None
+                self.quota.pause("openai_requests", retry_after if retry_after is not None else 2 ** attempt)
+                continue
+            # Structured output returns {"raw": AIMessage, "parsed": ...}
+            raw = result.get("raw") if isinstance(result, dict) else result
+            usage = getattr(raw, "usage_metadata", None) or {}
+            LLM_TOKENS.inc(usage.get("input_tokens", 0), kind="prompt")
+            LLM_TOKENS.inc(usage.get("output_tokens", 0), kind="completion")
+            LLM_TOKENS.inc((usage.get("input_token_details") or {}).get("cache_read", 0) or 0, kind="cached")
+            if budget is not None:
+                budget.charge(usage)
+            if self.quota is not None:
+                self.quota.charge("openai_tokens", usage.get("total_tokens", estimate) - estimate)
+            return result
+
+    def categorizer_for(self, tenant: Optional[Tenant] = None) -> Categorizer:
+        """The household's categorizer, created on first use"""
+        if tenant is None or tenant.id == DEFAULT_TENANT_ID:
+            return self.categorizer
+        categorizer = self.categorizers.get(tenant.id)
+        if categorizer is None:
+            categorizer = self.categorizers[tenant.id] = Categorizer()
+        return categorizer
+
+    async def _categorize(self, state: ExpenseState, graph_config: Optional[RunnableConfig] = None) -> ExpenseState:
+        """Assign each expense a category from the household's local index"""
+        tenant = ((graph_config or {}).get("configurable") or {}).get("tenant")
+        return state.model_copy(update={"expenses": self.categorizer_for(tenant).categorize(state.expenses)})
+
+    async def _format_for_confirmation(self, state: ExpenseState) -> ExpenseState:
+        """Format expense for user confirmation"""
+        formatted = format_expenses_summary(state.expenses)
+        return state.model_copy(update={"formatted_expense": formatted})
 
-    def _get_current_time(self) -> str:
-        """Get current time in Thailand timezone"""
-        self.logger.info("Fetching current time")
-        tz = pytz.timezone('Asia/Bangkok')
-        return datetime.now(tz).isoformat()
+    async def process_message(self, message: str, user: Optional[str] = None,
+                              on_progress: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                              tenant: Optional[Tenant] = None) -> Dict[str, Any]:
+        """Process a new expense message.
 
-    async def process_message(self, message: str) -> Dict[str, Any]:
-        """Process a new expense message"""
-        self.logger.info(f"Processing message: {message}")
+        ``tenant`` is the household the message belongs to; without one the configured
+        HIS_TG_ID/HER_TG_ID and the default categorizer are used. ``on_progress`` is called with the expenses parsed so far while an LLM reply streams in,
+        and with an empty list when an LLM call starts. It is never called for fast-path or cached results.
+        """
+        self.logger.info(f"Processing message ({len(message)} chars)")
         try:
             # Only parse and format, don't write
-            result = await self.workflow.ainvoke({"message": message})
-            self.logger.info(f"Workflow completed with result: {result}")
+            result = await self.workflow.ainvoke(
+                {"message": message, "user": user},
+                config={"configurable": {"on_progress": on_progress, "tenant": tenant}}
+            )
+            self.logger.debug("Workflow completed with result: %s", result)
+            
+            self.parser_stats[result["parser"]] += 1
+            MESSAGES.inc(parser=result["parser"])
+            total = sum(self.parser_stats.values())
+            self.logger.info(
+                f"Message handled by {result['parser']} parser, "
+                f"fast-path hit rate {self.parser_stats['fast_path'] / total:.0%} over {total} messages"
+            )
             
             # Since result is a dict, access it directly
             return {
-                "data": result["expense_data"],
-                "summary": result["formatted_expense"]
+                "key": uuid.uuid4().hex,  # Idempotency key for the outbox
+                "items": result["expenses"],
+                "selected": [True] * len(result["expenses"]),
+                "summary": result["formatted_expense"],
+                "parser": result["parser"],
+                "model": result.get("model")
             }
         except Exception as e:
             self.logger.error(f"Error processing message: {str(e)}")
             raise
 
-    async def write_expense(self, expense_data: Dict[str, Any]) -> None:
-        """Write a confirmed expense to the sheet"""
-        self.logger.info(f"Writing expense to sheet: {expense_data}")
+    async def process_correction(self, expense_data: Dict[str, Any], message: str, user: Optional[str] = None,
+                                 tenant: Optional[Tenant] = None) -> Optional[Dict[str, Any]]:
+        """Apply a correction to a pending confirmation.
+
+        Short edits like "actually 150" or "it was card" are patched locally without a model call.
+        Anything else goes to the model as the pending records plus the correction, and only the
+        changed fields come back. Returns None when the correction couldn't be applied.
+        """
+        self.logger.info(f"Processing correction ({len(message)} chars)")
+        items = expense_data["items"]
+        today = local_today()
+        
+        categorizer = self.categorizer_for(tenant)
+        expenses = None
+        parser = "patch"
+        patch = parse_correction_fast(message, len(items), today, categorizer.categories)
+        if patch is not None:
+            try:
+                expenses = self._validated(apply_changes(items, [patch]), today, user, tenant)
+            except ValueError as e:
+                self.logger.info(f"Local patch rejected ({str(e)}), asking the model")
+        if expenses is None:
+            parser = "llm"
+            try:
+                expenses = await self._correct_with_llm(items, message, today, user, tenant)
+            except Exception as e:
+                self.logger.error(f"Failed to apply correction: {str(e)}")
+                return None
+        expenses = self._recategorize(items, expenses, categorizer)
+        
+        CORRECTIONS.inc(parser=parser)
+        self.logger.info(f"Correction applied by {parser}")
+        return dict(
+            expense_data,
+            items=expenses,
+            selected=expense_data.get("selected") or [True] * len(expenses),
+            summary=format_expenses_summary(expenses),
+            parser=parser
+        )
+
+    def _recategorize(self, before: List[Dict[str, Any]], after: List[Dict[str, Any]],
+                      categorizer: Categorizer) -> List[Dict[str, Any]]:
+        """Keep categories the correction set; re-categorize items whose description changed"""
+        expenses = []
+        for old, new in zip(before, after):
+            if new.get("category") != old.get("category"):
+                new = dict(new, category=categorizer.normalize_category(new["category"]))
+            elif new["description"] != old["description"]:
+                new = categorizer.categorize([new])[0]
+            expenses.append(new)
+        return expenses
+
+    async def _correct_with_llm(self, items: List[Dict[str, Any]], message: str, today, user: Optional[str],
+                                tenant: Optional[Tenant] = None) -> List[Dict[str, Any]]:
+        """Ask the model for the fields a correction changes, given the records it applies to"""
+        records = [dict(item, index=index) for index, item in enumerate(items)]
+        inputs = {
+            "input": message,
+            "records": json.dumps(records, ensure_ascii=False),
+            "dates": date_context(message, today)
+        }
+        budget = CORRECTION_PROMPT.budget(inputs, PROMPT_TOKEN_BUDGET, self.tiers[0].name)
+        
+        collector = self.tracing.collector()
+        config = {
+            "callbacks": [collector] if collector else [],
+            "run_name": "process_correction",
+            "metadata": {
+                "project": "expense_tracking",
+                "run_name": "process_correction"
+            }
+        }
+        
+        async def attempt(tier: ModelTier) -> List[Dict[str, Any]]:
+            result = await self._call_llm(CORRECTION_PROMPT.template | tier.llm, inputs, config, budget=budget)
+            content = result.content if isinstance(result, BaseMessage) else result
+            changes = []
+            for change in json.loads(content).get("changes", []):
+                fields = dict(change)
+                index = fields.pop("index", None)
+                if not isinstance(index, int) or not 0 <= index < len(items):
+                    raise ValueError(f"change refers to unknown record {index!r}")
+                unknown = set(fields) - set(ExpenseSchema.model_fields)
+                if unknown:
+                    raise ValueError(f"change has unknown fields {sorted(unknown)}")
+                changes.append((index, fields))
+            if not changes:
+                raise ValueError("the model found nothing to change")
+            return self._validated(apply_changes(items, changes), today, user, tenant)
+        
+        error = None
+        try:
+            expenses, tier = await self._cascade(attempt)
+            self.logger.info(f"Correction applied with {tier.name}")
+            return expenses
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            self.logger.info(budget.report())
+            self.tracing.finish(collector, error)
+
+    async def write_expense(self, expense_data: Dict[str, Any], tenant: Optional[Tenant] = None,
+                            outbox=None, sheets_client=None) -> None:
+        """Write the selected items of a confirmed message to the outbox, or straight to the sheet without one.
+
+        ``outbox`` and ``sheets_client`` are the household's; they default to the agent's own.
+        """
+        self.logger.debug("Writing expenses to sheet: %s", expense_data)
+        selected = expense_data.get("selected") or [True] * len(expense_data["items"])
+        # Converted at write time with the rate of the expense's date, so the sheet can be summed as is
+        items = self.fx.annotate(expense_data["items"])
+        outbox = outbox if outbox is not None else self.outbox
+        sheets_client = sheets_client if sheets_client is not None else self.sheets_client
+        categorizer = self.categorizer_for(tenant)
         try:
-            # Write to sheet only when explicitly called after confirmation
-            await self.sheets_client.append_expense(**expense_data["data"])
-            self.logger.info("Successfully wrote expense to sheet")
+            if outbox is not None:
+                # Commit locally; the outbox worker syncs them to the sheet in the background.
+                # Item keys derive from the message key, so a repeated confirm is a no-op
+                key = expense_data.get("key") or uuid.uuid4().hex
+                entries = [
+                    (f"{key}:{index}", item)
+                    for index, (item, keep) in enumerate(zip(items, selected)) if keep
+                ]
+                recorded = outbox.enqueue_many(entries)
+                self.logger.info(f"Recorded {recorded} of {len(entries)} expenses for {key} in outbox")
+                if recorded:
+                    self._learn_categories([item for _, item in entries], categorizer)
+                return
+            # Write to sheet only when explicitly called after confirmation, as one multi-row append
+            confirmed = [item for item, keep in zip(items, selected) if keep]
+            await sheets_client.append_expenses(confirmed)
+            self.logger.info("Successfully wrote expenses to sheet")
+            self._learn_categories(confirmed, categorizer)
         except Exception as e:
-            self.logger.error(f"Failed to write expense to sheet: {str(e)}")
+            self.logger.error(f"Failed to write expenses to sheet: {str(e)}")
             raise
+
+    def _learn_categories(self, items: List[Dict[str, Any]], categorizer: Categorizer) -> None:
+        # Confirmed items are labelled examples, including categories the user corrected
+        for item in items:
+            if item.get("category"):
+                categorizer.learn(item["description"], item["category"])
+
+    def close(self) -> None:
+        """Export queued traces and close the extraction cache"""
+        self.tracing.close()
+        self.extraction_cache.close()
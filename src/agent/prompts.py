@@ -0,0 +1,139 @@
+import logging
+from typing import Any, Dict, Optional
+from langchain_core.prompts import ChatPromptTemplate
+from src.metrics import LLM_PROMPT_TOKENS, LLM_REQUEST_TOKENS, LLM_OVER_BUDGET
+
+# Prompts are compiled once, at import. Each is a fixed system message that is
+# byte-identical on every call, followed by a second system message with what
+# changes per request (dates, the sender, pending records) and then the user's
+# text. Keeping the variable parts after the fixed prefix lets the provider's
+# prompt cache reuse it, and the fixed part is stripped of indentation and
+# blank lines, which the model was being billed for.
+
+logger = logging.getLogger(__name__)
+
+def compact(text: str) -> str:
+    """Strip indentation and blank lines"""
+    return "\n".join(line.strip() for line in text.strip().splitlines() if line.strip())
+
+_encodings: Dict[str, Any] = {}
+
+def _encoding(model: Optional[str]):
+    key = model or ""
+    if key not in _encodings:
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model or "gpt-4o-mini")
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # tiktoken isn't installed, or can't download its encoding files
+            logger.info(f"Counting prompt tokens as 4 characters each, as tiktoken is unavailable: {str(e)}")
+            encoding = None
+        _encodings[key] = encoding
+    return _encodings[key]
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    encoding = _encoding(model)
+    return len(encoding.encode(text)) if encoding is not None else (len(text) + 3) // 4
+
+class CompiledPrompt:
+    """A fixed system prompt plus a per-request context, as one prebuilt ChatPromptTemplate.
+
+    ``context`` is a template with ``{placeholders}``; the user's text goes in ``{input}``.
+    """
+
+    def __init__(self, name: str, instructions: str, context: str):
+        self.name = name
+        self.instructions = compact(instructions)
+        self.context = compact(context)
+        self.template = ChatPromptTemplate.from_messages([
+            ("system", self.instructions.replace("{", "{{").replace("}", "}}")),
+            ("system", self.context),
+            ("user", "{input}")
+        ])
+        self._fixed_tokens: Dict[str, int] = {}
+
+    def fixed_tokens(self, model: Optional[str] = None) -> int:
+        """Tokens in the fixed prefix, counted once per model"""
+        key = model or ""
+        if key not in self._fixed_tokens:
+            self._fixed_tokens[key] = count_tokens(self.instructions, model)
+        return self._fixed_tokens[key]
+
+    def budget(self, inputs: Dict[str, Any], limit: int, model: Optional[str] = None) -> "TokenBudget":
+        """Measure one request's prompt, before it is sent"""
+        variable = count_tokens(self.context.format(**inputs), model) + count_tokens(inputs["input"], model)
+        return TokenBudget(self.name, self.fixed_tokens(model), variable, limit)
+
+class TokenBudget:
+    """Tokens one request spends, across every model call it makes, against a per-request budget.
+
+    ``fixed`` and ``variable`` are the measured prompt; ``charge`` adds what the
+    provider reported for each call, including prompt tokens it served from cache.
+    """
+
+    def __init__(self, name: str, fixed: int, variable: int, limit: int):
+        self.name = name
+        self.fixed = fixed
+        self.variable = variable
+        self.limit = limit
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.fixed + self.variable
+
+    def charge(self, usage: Dict[str, Any]) -> None:
+        self.calls += 1
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    def report(self) -> str:
+        """Record the request's token use and describe it for the log"""
+        LLM_PROMPT_TOKENS.observe(self.prompt_tokens, prompt=self.name)
+        LLM_REQUEST_TOKENS.observe(self.input_tokens + self.output_tokens, prompt=self.name)
+        over = self.limit and self.input_tokens + self.output_tokens > self.limit
+        if over:
+            LLM_OVER_BUDGET.inc(prompt=self.name)
+        return (
+            f"{self.name}: prompt {self.prompt_tokens} tokens ({self.fixed} fixed, {self.variable} for this request); "
+            f"{self.calls} calls used {self.input_tokens} input ({self.cached_tokens} cached) and "
+            f"{self.output_tokens} output tokens of a {self.limit} budget{' - over budget' if over else ''}"
+        )
+
+PARSE_PROMPT = CompiledPrompt("parse_expense", """
+    Extract every expense mentioned in the user message and return a JSON object
+    {"expenses": [...]} where each item has these exact fields:
+    - date (YYYY-MM-DD)
+    - description (string)
+    - amount (number)
+    - currency (string, e.g. THB)
+    - cash (boolean)
+    - user (string)
+    Use the dates given below for relative dates, and today's date when the message names none.
+    Unless the message names someone else, set user to the sender. If it says the expense is his or
+    hers, set user to "his" or "her".
+    Return ONLY the JSON object, no other text.
+""", """
+    {dates} The sender is {user}.
+""")
+
+CORRECTION_PROMPT = CompiledPrompt("process_correction", """
+    You correct expense records that are waiting for the user's confirmation.
+    Apply the user's correction and return a JSON object {"changes": [...]} with one entry per
+    record that changes: its "index" plus only the fields that change, using the same field names
+    (date as YYYY-MM-DD, description, amount as a number, currency, cash as a boolean, user, category).
+    Use the dates given below for relative dates. If the correction says an expense is his or hers,
+    set user to "his" or "her".
+    Return ONLY the JSON object, no other text.
+""", """
+    {dates}
+    The current records, numbered by "index", are:
+    {records}
+""")
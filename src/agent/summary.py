@@ -0,0 +1,43 @@
+from typing import Any, Dict, List, Optional
+
+def format_expense_summary(expense_data: Dict[str, Any]) -> str:
+    """Render an expense for the confirmation message"""
+    return f"""
+📝 Expense Details:
+📅 Date: {expense_data['date']}
+💰 Amount: {expense_data['amount']} {expense_data['currency']}
+📄 Description: {expense_data['description']}
+💳 Payment Type: {'Cash' if expense_data['cash'] else 'Card'}
+👤 User: {expense_data['user']}
+""" + (f"🏷️ Category: {expense_data['category']}\n" if expense_data.get('category') else "")
+
+def format_expenses_summary(items: List[Dict[str, Any]], selected: Optional[List[bool]] = None) -> str:
+    """Render one or more expenses, marking which ones are selected for writing"""
+    if len(items) == 1:
+        return format_expense_summary(items[0])
+    lines = ["", "📝 Expenses:"]
+    for index, item in enumerate(items):
+        mark = "✅" if selected is None or selected[index] else "⬜"
+        lines.append(
+            f"{mark} {index + 1}. 📅 {item['date']} · 📄 {item['description']} · "
+            f"💰 {item['amount']} {item['currency']} · 💳 {'Cash' if item['cash'] else 'Card'} · 👤 {item['user']}"
+            + (f" · 🏷️ {item['category']}" if item.get('category') else "")
+        )
+    return "\n".join(lines) + "\n"
+
+def format_partial_expenses(items: List[Dict[str, Any]]) -> str:
+    """Render expenses while the model is still producing them, showing only the fields seen so far"""
+    lines = ["⏳ Reading your expense..."]
+    for index, item in enumerate(items):
+        parts = []
+        if item.get("date"):
+            parts.append(f"📅 {item['date']}")
+        if item.get("description"):
+            parts.append(f"📄 {item['description']}")
+        if item.get("amount") is not None:
+            parts.append(f"💰 {item['amount']} {item.get('currency') or ''}".rstrip())
+        if item.get("cash") is not None:
+            parts.append(f"💳 {'Cash' if item['cash'] else 'Card'}")
+        if parts:
+            lines.append(f"{index + 1}. " + " · ".join(parts))
+    return "\n".join(lines)
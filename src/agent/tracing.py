@@ -0,0 +1,132 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Fields LangSmith's batch ingest endpoint accepts for a run
+RUN_FIELDS = (
+    "id", "name", "run_type", "start_time", "end_time", "extra", "error", "serialized",
+    "events", "inputs", "outputs", "parent_run_id", "tags", "trace_id", "dotted_order"
+)
+
+def run_payloads(run, project: str) -> List[Dict[str, Any]]:
+    """Flatten a collected run tree into batch-ingest payloads, parents first."""
+    payloads = []
+    stack = [run]
+    while stack:
+        current = stack.pop()
+        payload = {field: getattr(current, field, None) for field in RUN_FIELDS}
+        payload["session_name"] = project
+        payloads.append(payload)
+        stack.extend(reversed(current.child_runs or []))
+    return payloads
+
+class TraceSampler:
+    """Decides which LLM calls are sent to LangSmith and exports them off the request path.
+
+    Every call made while tracing is enabled is recorded in memory by a run
+    collector. When the call finishes, its run tree is kept if the call was
+    sampled (``sample_rate``) or failed, and handed to a background thread
+    that uploads runs in batches. When tracing is disabled nothing is
+    collected and langsmith is never imported or contacted by this class.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float = 1.0, project: str = "expense_tracking",
+                 batch_size: int = 20, flush_interval: float = 5.0, client=None, max_queue: int = 1000):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.project = project
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.client = client
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+        if enabled:
+            # Our sampling replaces langchain's trace-everything behaviour driven by these variables
+            for name in ("LANGCHAIN_TRACING_V2", "LANGSMITH_TRACING"):
+                os.environ.pop(name, None)
+
+    def collector(self):
+        """Callback handler that records one call's runs, or None when tracing is off."""
+        if not self.enabled:
+            return None
+        from langchain_core.tracers.run_collector import RunCollectorCallbackHandler
+        return RunCollectorCallbackHandler()
+
+    def finish(self, collector, error: Optional[str] = None) -> bool:
+        """Queue the collected runs for export if the call was sampled or failed. Never blocks."""
+        if collector is None or not collector.traced_runs:
+            return False
+        if error is None and random.random() >= self.sample_rate:
+            return False
+
+        for run in collector.traced_runs:
+            if error is not None and run.error is None:
+                # The chain itself succeeded but its output was rejected
+                run.error = error
+            try:
+                self.queue.put_nowait(run)
+            except queue.Full:
+                self.dropped += 1
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+                self.thread.start()
+
+    def _get_client(self):
+        if self.client is None:
+            from langsmith import Client
+            self.client = Client()
+        return self.client
+
+    def _export_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            run = self.queue.get()
+            if run is None:
+                return
+            # Collect more runs until the batch is full or the flush interval passes
+            batch = [run]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    run = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if run is None:
+                    stopping = True
+                    break
+                batch.append(run)
+            self._export(batch)
+
+    def _export(self, runs) -> None:
+        payloads = [payload for run in runs for payload in run_payloads(run, self.project)]
+        try:
+            self._get_client().batch_ingest_runs(create=payloads, pre_sampled=True)
+            self.exported += len(runs)
+        except Exception as e:
+            self.dropped += len(runs)
+            self.logger.warning(f"Failed to export {len(runs)} traces: {str(e)}")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Export whatever is queued, then stop the background thread."""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
@@ -0,0 +1,80 @@
+import math
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from src.currency import normalize_currency
+
+# Checks applied to model output before it is shown for confirmation. A
+# result that fails any of them is sent to the next, stronger model tier.
+
+# Words a model may put in the user field instead of a Telegram id
+HIS_WORDS = {"his", "him", "he", "husband"}
+HER_WORDS = {"her", "hers", "she", "wife"}
+
+# Dates further ahead than this are treated as a misread, not a planned expense
+MAX_FUTURE_DAYS = 1
+
+def resolve_user(value: Any, sender: Optional[str], his_id: Optional[str], her_id: Optional[str]) -> Optional[str]:
+    """Map the model's user field onto a household member's Telegram id.
+
+    Without configured ids any non-empty value is accepted as is.
+    """
+    text = str(value or "").strip()
+    if not (his_id and her_id):
+        return text or sender
+    if text in (his_id, her_id):
+        return text
+    lowered = text.lower()
+    if lowered in HIS_WORDS:
+        return his_id
+    if lowered in HER_WORDS:
+        return her_id
+    if sender in (his_id, her_id) and lowered in ("", "me", "i", "default_user", str(sender).lower()):
+        return sender
+    return None
+
+def validate_expense(item: Dict[str, Any], today: date, sender: Optional[str] = None,
+                     his_id: Optional[str] = None, her_id: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Return the normalized expense and no errors, or None and what is wrong with it."""
+    errors = []
+    try:
+        expense_date = datetime.strptime(str(item.get("date")), "%Y-%m-%d").date()
+        if expense_date > today + timedelta(days=MAX_FUTURE_DAYS):
+            errors.append(f"date {item.get('date')} is in the future")
+    except ValueError:
+        errors.append(f"date {item.get('date')!r} is not YYYY-MM-DD")
+
+    try:
+        amount = float(item.get("amount"))
+        if not math.isfinite(amount) or amount <= 0:
+            errors.append(f"amount {item.get('amount')!r} is not positive")
+    except (TypeError, ValueError):
+        errors.append(f"amount {item.get('amount')!r} is not a number")
+
+    currency = normalize_currency(item.get("currency"))
+    if currency is None:
+        errors.append(f"currency {item.get('currency')!r} is not known")
+
+    user = resolve_user(item.get("user"), sender, his_id, her_id)
+    if user is None:
+        errors.append(f"user {item.get('user')!r} is not a household member")
+
+    if not str(item.get("description") or "").strip():
+        errors.append("description is empty")
+
+    if errors:
+        return None, errors
+    return dict(item, amount=amount, currency=currency, user=user), []
+
+def validate_expenses(items: List[Dict[str, Any]], today: date, sender: Optional[str] = None,
+                      his_id: Optional[str] = None, her_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Validate every item; any error rejects the whole result."""
+    if not items:
+        return [], ["no expenses found"]
+    expenses, errors = [], []
+    for index, item in enumerate(items):
+        expense, item_errors = validate_expense(item, today, sender, his_id, her_id)
+        if expense is None:
+            errors.extend(f"item {index + 1}: {error}" for error in item_errors)
+        else:
+            expenses.append(expense)
+    return (expenses, []) if not errors else ([], errors)
@@ -1,33 +1,251 @@
+import asyncio
 import logging
+import signal
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from telegram.error import Conflict
-from src.agent.main import ExpenseTrackingAgent
 from src.sheets.client import SheetsClient
-from src.config import TELEGRAM_TOKEN, GOOGLE_SHEETS_ID
+from src.sheets.pool import SheetsClientCache
+from src.sheets.mirror import SheetMirror
+from src.sheets.outbox import Outbox, OutboxWorker
+from src.agent.dates import local_today
+from src.bot.pending import create_pending_store
+from src.bot.writes import RecentWrites, confirmation_key, format_age
+from src.bot.preview import ConfirmationPreview
+from src.bot.reports import month_range, week_range, format_totals, format_user_totals, format_category_totals
+from src.bot.scheduler import ChatScheduler
+from src.bot.server import BotHttpServer
+from src.ratelimit import QuotaScheduler, PRIORITY_CONFIRM, PRIORITY_BACKGROUND
+from src.metrics import REGISTRY, TELEGRAM_REPLY_SECONDS, DUPLICATE_CONFIRMS, DUPLICATES_FLAGGED
+from src.tenants import TenantRegistry, Tenant, shard_for, tenant_path
+from src.config import (
+    TELEGRAM_TOKEN, OUTBOX_PATH, OUTBOX_MAX_ATTEMPTS, MAX_CONCURRENT_UPDATES, SHEETS_CLIENT_CACHE_SIZE,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    PENDING_STORE, PENDING_PATH, PENDING_TTL, PENDING_MAX_SIZE, MIRROR_PATH, MIRROR_SYNC_INTERVAL,
+    METRICS_PORT, LAZY_STARTUP, MAX_QUEUED_UPDATES, STREAM_PREVIEW, STREAM_EDIT_INTERVAL,
+    OPENAI_RPM, OPENAI_TPM, SHEETS_WRITE_RPM, SHEETS_READ_RPM, BASE_CURRENCY, FX_RATES_PATH,
+    RECENT_WRITES_PATH, RECENT_WRITES_TTL, RECENT_WRITES_MAX_SIZE, DUPLICATE_WINDOW
+)
+
+class Household:
+    """What the bot keeps open for one tenant: a handle on its spreadsheet, its outbox and its sheet mirror"""
+
+    def __init__(self, tenant: Tenant, sheets_client, outbox, outbox_worker, mirror):
+        self.tenant = tenant
+        self.sheets_client = sheets_client
+        self.outbox = outbox
+        self.outbox_worker = outbox_worker
+        self.mirror = mirror
+        self.mirror_task = None
 
 class ExpenseBot:
-    def __init__(self):
+    def __init__(self, started_at=None, shard=None, shards=0):
         self.logger = logging.getLogger(__name__)
-        self.logger.info("Initializing SheetsClient...")
-        sheets_client = SheetsClient(GOOGLE_SHEETS_ID)
+        # As a shard worker, this process only serves the households hashed to ``shard``
+        self.shard = shard
+        self.shards = shards
+        # Startup is measured from ``started_at`` (a time.perf_counter() value), e.g. taken before imports
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.startup_timings = {}
+        # One set of quota buckets for every OpenAI and Sheets call; bursts of up to 10 seconds' worth.
+        # The accounts are shared by all shard workers, so each gets an equal share of the limits
+        share = shards if shard is not None and shards > 0 else 1
+        self.quota = QuotaScheduler({
+            name: (per_minute / share, max(1.0, per_minute / share / 6))
+            for name, per_minute in (
+                ("openai_requests", OPENAI_RPM),
+                ("openai_tokens", OPENAI_TPM),
+                ("sheets_write", SHEETS_WRITE_RPM),
+                ("sheets_read", SHEETS_READ_RPM),
+            )
+        })
+        self.tenants = TenantRegistry.from_config()
+        self.sheets_clients = SheetsClientCache(
+            lambda spreadsheet_id: SheetsClient(spreadsheet_id, lazy=LAZY_STARTUP, quota=self.quota),
+            SHEETS_CLIENT_CACHE_SIZE
+        )
+        self.households = {
+            tenant.id: self._open_household(tenant) for tenant in self.tenants if self.owns(tenant)
+        }
+        # The default household, which single-household deployments and the agent's defaults use
+        default = self.households.get(self.tenants.default.id) if self.tenants.default else None
+        self.sheets_client = default.sheets_client if default else None
+        self.outbox = default.outbox if default else None
+        self.outbox_worker = default.outbox_worker if default else None
+        self.mirror = default.mirror if default else None
+        if default is not None:
+            # Build the default client up front, as before households; others open on first use
+            self.sheets_clients.get(default.tenant.spreadsheet_id)
         
-        self.logger.info("Initializing ExpenseTrackingAgent...")
-        self.agent = ExpenseTrackingAgent(sheets_client)
+        # FX rates for base-currency totals; loaded on first use, as numpy isn't needed to start
+        self._fx = None
+        
+        # With lazy startup the agent (langchain, langgraph, OpenAI) is built in the background after post_init
+        self._agent = None
+        self._agent_future = None
+        if not LAZY_STARTUP:
+            self._create_agent()
         
         self.logger.info("Setting up Telegram bot...")
-        self.app = Application.builder().token(TELEGRAM_TOKEN).build()
+        # PTB hands every update to its own task; the scheduler then enforces
+        # per-chat ordering and the real concurrency cap
+        self.scheduler = ChatScheduler(MAX_CONCURRENT_UPDATES)
+        builder = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .concurrent_updates(True)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+        )
+        if shard is not None:
+            # Shard workers get their updates from the router process, never from Telegram
+            builder = builder.updater(None)
+        self.app = builder.build()
         
         # Add handlers
-        self.app.add_handler(CommandHandler("start", self.start_command))
-        self.app.add_handler(MessageHandler(filters.TEXT, self.handle_message))
-        self.app.add_handler(CallbackQueryHandler(self.handle_button))
+        self.app.add_handler(CommandHandler("start", self.scheduler.wrap(self.start_command)))
+        self.app.add_handler(CommandHandler("month", self.scheduler.wrap(self.month_command)))
+        self.app.add_handler(CommandHandler("week", self.scheduler.wrap(self.week_command)))
+        self.app.add_handler(CommandHandler("by_user", self.scheduler.wrap(self.by_user_command)))
+        self.app.add_handler(CommandHandler("by_category", self.scheduler.wrap(self.by_category_command)))
+        self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.scheduler.wrap(self.handle_message)))
+        self.app.add_handler(CallbackQueryHandler(self.scheduler.wrap(self.handle_button, PRIORITY_CONFIRM)))
         
         # Add error handler
         self.app.add_error_handler(self.error_handler)
         
-        # Store pending expenses
-        self.pending_expenses = {}
+        # Store pending expenses. Each chat's entry is only touched from inside
+        # that chat's scheduler slot, so handlers never interleave on it
+        self.pending_expenses = create_pending_store(PENDING_STORE, PENDING_PATH, PENDING_TTL, PENDING_MAX_SIZE)
+        # Confirmed writes, so a repeated confirm is answered without writing again
+        self.recent_writes = RecentWrites(RECENT_WRITES_MAX_SIZE, RECENT_WRITES_TTL, RECENT_WRITES_PATH)
+        self.metrics_server = None
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Expose queue depths and cache effectiveness, read at scrape time."""
+        REGISTRY.gauge_callback(
+            "expense_bot_outbox_pending", "Confirmed expenses not yet written to Sheets",
+            self.outbox_pending
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_outbox_dead_letters", "Confirmed expenses Sheets kept rejecting, set aside in the outbox",
+            self.outbox_dead
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_pending_confirmations", "Expenses waiting for the user to confirm",
+            lambda: len(self.pending_expenses)
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_updates_running", "Updates currently being handled",
+            lambda: self.scheduler.running
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_updates_queued", "Updates waiting for or holding a chat slot",
+            lambda: self.scheduler.queued
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_llm_cache_hit_rate", "Share of LLM extractions answered from the cache",
+            lambda: self._agent.extraction_cache.hit_rate
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_startup_ready_seconds", "Seconds from process start until updates were accepted",
+            lambda: self.startup_timings["ready_seconds"]
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_startup_agent_seconds", "Seconds from process start until the agent was ready",
+            lambda: self.startup_timings["agent_seconds"]
+        )
+
+    def owns(self, tenant: Tenant) -> bool:
+        return self.shard is None or shard_for(tenant.id, self.shards) == self.shard
+
+    def _open_household(self, tenant: Tenant) -> Household:
+        """Open a tenant's outbox and mirror; its Sheets client is only built when first used."""
+        self.logger.info(f"Opening household {tenant.id}...")
+        sheets_client = self.sheets_clients.handle(tenant.spreadsheet_id)
+        outbox = Outbox(tenant_path(OUTBOX_PATH, tenant.id))
+        return Household(
+            tenant,
+            sheets_client,
+            outbox,
+            OutboxWorker(outbox, sheets_client, max_attempts=OUTBOX_MAX_ATTEMPTS),
+            SheetMirror(tenant_path(MIRROR_PATH, tenant.id), sheets_client)
+        )
+
+    def outbox_pending(self) -> int:
+        return sum(household.outbox.pending_count() for household in self.households.values())
+
+    def outbox_dead(self) -> int:
+        return sum(household.outbox.dead_count() for household in self.households.values())
+
+    async def _household(self, update: Update):
+        """The household an update's chat belongs to; tells chats that belong to none"""
+        tenant = self.tenants.for_chat(update.effective_chat.id if update.effective_chat else None)
+        household = self.households.get(tenant.id) if tenant is not None else None
+        if household is None:
+            self.logger.warning(f"No household for chat_id {update.effective_chat.id if update.effective_chat else None}")
+            if update.effective_message:
+                await update.effective_message.reply_text("This chat isn't linked to a household yet.")
+        return household
+
+    def _create_agent(self):
+        """Import and build the expense agent. Blocking; lazy startup runs it on a worker thread."""
+        self.logger.info("Initializing ExpenseTrackingAgent...")
+        from src.agent.main import ExpenseTrackingAgent
+        self._agent = ExpenseTrackingAgent(self.sheets_client, outbox=self.outbox, quota=self.quota, fx=self.fx)
+        self.startup_timings["agent_seconds"] = time.perf_counter() - self.started_at
+        self.logger.info(f"Agent ready {self.startup_timings['agent_seconds']:.2f}s after start")
+        return self._agent
+
+    @property
+    def fx(self):
+        if self._fx is None:
+            from src.currency import FxTable
+            self._fx = FxTable.load(FX_RATES_PATH, BASE_CURRENCY)
+        return self._fx
+
+    def _base_total(self, household: Household, start, end):
+        """(total in BASE_CURRENCY, BASE_CURRENCY, expenses without a rate), unless there is nothing to convert"""
+        rows = household.mirror.amounts(start, end)
+        if all(row[2] == BASE_CURRENCY for row in rows):
+            return None
+        days, amounts, currencies, recorded = zip(*rows)
+        total, missing = self.fx.total(amounts, currencies, days, recorded)
+        return total, BASE_CURRENCY, missing
+
+    @property
+    def agent(self):
+        """The expense agent, built on the spot if it isn't ready yet. Handlers use get_agent()."""
+        if self._agent is None:
+            self._create_agent()
+        return self._agent
+
+    def _warm_agent(self):
+        """Start building the agent in the background, once."""
+        if self._agent is None and self._agent_future is None:
+            self._agent_future = asyncio.get_running_loop().run_in_executor(None, self._create_agent)
+        return self._agent_future
+
+    async def get_agent(self):
+        """Return the agent, waiting for the background warm-up without blocking the event loop."""
+        if self._agent is None:
+            future = self._warm_agent()
+            try:
+                # Shielded so a cancelled handler doesn't cancel the warm-up for everyone else
+                await asyncio.shield(future)
+            except Exception:
+                # Let the next update retry
+                if self._agent_future is future:
+                    self._agent_future = None
+                raise
+        return self._agent
+
+    async def _reply(self, send, *args, **kwargs):
+        """Send or edit a Telegram message, recording how long Telegram took"""
+        with TELEGRAM_REPLY_SECONDS.time(method=getattr(send, "__name__", "send")):
+            return await send(*args, **kwargs)
 
     async def start_command(self, update: Update, context):
         self.logger.info("Received /start command")
@@ -35,40 +253,101 @@ class ExpenseBot:
             "Hello! I will help you track your expenses. Just send me the expense information."
         )
 
+    def _today(self):
+        return local_today()
+
+    async def month_command(self, update: Update, context):
+        """Report this month's totals from the household's sheet mirror"""
+        household = await self._household(update)
+        if household is None:
+            return
+        start, end = month_range(self._today())
+        await update.message.reply_text(format_totals(
+            "This month", start, end, household.mirror.totals(start, end), self._base_total(household, start, end)
+        ))
+
+    async def week_command(self, update: Update, context):
+        """Report this week's totals from the household's sheet mirror"""
+        household = await self._household(update)
+        if household is None:
+            return
+        start, end = week_range(self._today())
+        await update.message.reply_text(format_totals(
+            "This week", start, end, household.mirror.totals(start, end), self._base_total(household, start, end)
+        ))
+
+    async def by_user_command(self, update: Update, context):
+        """Report this month's totals per user from the household's sheet mirror"""
+        household = await self._household(update)
+        if household is None:
+            return
+        start, end = month_range(self._today())
+        rows = household.mirror.totals(start, end, by_user=True)
+        await update.message.reply_text(format_user_totals("This month", start, end, rows, self._base_total(household, start, end)))
+
+    async def by_category_command(self, update: Update, context):
+        """Report this month's totals per category from the household's sheet mirror"""
+        household = await self._household(update)
+        if household is None:
+            return
+        start, end = month_range(self._today())
+        rows = household.mirror.totals(start, end, by_category=True)
+        await update.message.reply_text(format_category_totals(
+            "This month", start, end, rows, self._base_total(household, start, end)
+        ))
+
     async def handle_message(self, update: Update, context):
+        received_at = time.perf_counter()
         chat_id = update.message.chat_id
-        self.logger.info(f"Received message from chat_id {chat_id}: {update.message.text}")
+        self.logger.info(f"Received message from chat_id {chat_id} ({len(update.message.text)} chars)")
+        household = await self._household(update)
+        if household is None:
+            return
         
-        if chat_id in self.pending_expenses:
-            self.logger.info(f"Found pending expense for chat_id {chat_id}, processing correction")
-            expense_data = await self.agent.process_correction(
-                self.pending_expenses[chat_id],
-                update.message.text
-            )
-        else:
-            self.logger.info(f"Processing new expense for chat_id {chat_id}")
-            expense_data = await self.agent.process_message(update.message.text)
+        preview = ConfirmationPreview(update.message, self._reply, STREAM_EDIT_INTERVAL, received_at)
+        agent = await self.get_agent()
+        try:
+            if chat_id in self.pending_expenses:
+                self.logger.info(f"Found pending expense for chat_id {chat_id}, processing correction")
+                expense_data = await agent.process_correction(
+                    self.pending_expenses[chat_id],
+                    update.message.text,
+                    user=str(update.message.from_user.id),
+                    tenant=household.tenant
+                )
+            else:
+                self.logger.info(f"Processing new expense for chat_id {chat_id}")
+                expense_data = await agent.process_message(
+                    update.message.text,
+                    user=str(update.message.from_user.id),
+                    on_progress=preview.update if STREAM_PREVIEW else None,
+                    tenant=household.tenant
+                )
+        except Exception:
+            # Don't leave a half-filled preview behind; the error handler reports the failure
+            await preview.discard()
+            raise
         
         if expense_data:
-            self.logger.info(f"Storing pending expense for chat_id {chat_id}: {expense_data}")
+            # Flag items matching a recent write, e.g. the same message sent twice
+            expense_data["duplicates"] = self.recent_writes.duplicates(
+                household.tenant.id, expense_data["items"], DUPLICATE_WINDOW
+            )
+            if expense_data["duplicates"]:
+                DUPLICATES_FLAGGED.inc(len(expense_data["duplicates"]))
+                self.logger.info(f"Flagged {len(expense_data['duplicates'])} possible duplicates for chat_id {chat_id}")
+            self.logger.info(f"Storing pending expense for chat_id {chat_id} ({len(expense_data['items'])} items)")
             self.pending_expenses[chat_id] = expense_data
             
-            keyboard = [
-                [
-                    InlineKeyboardButton("Yes ✅", callback_data="confirm"),
-                    InlineKeyboardButton("No ❌", callback_data="reject")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             self.logger.info(f"Sending confirmation request to chat_id {chat_id}")
-            await update.message.reply_text(
-                f"I'll add this expense:\n{expense_data['summary']}\n\nIs this correct?",  # Use only the formatted summary
-                reply_markup=reply_markup
+            # Replaces the streamed preview, if one was shown, and attaches the buttons
+            await preview.finish(
+                self._confirmation_text(expense_data),
+                reply_markup=self._confirmation_keyboard(expense_data)
             )
         else:
             self.logger.warning(f"Failed to process expense for chat_id {chat_id}")
-            await update.message.reply_text("I couldn't understand the expense. Please try again.")
+            await preview.finish("I couldn't understand the expense. Please try again.")
 
     async def handle_button(self, update: Update, context):
         query = update.callback_query
@@ -76,26 +355,67 @@ class ExpenseBot:
         self.logger.info(f"Received button callback from chat_id {chat_id}: {query.data}")
         await query.answer()
         self.logger.info(f"Answered callback query for chat_id {chat_id}")
+        household = await self._household(update)
+        if household is None:
+            return
+        
+        if query.data == "confirm":
+            pending = self.pending_expenses.get(chat_id)
+            if pending is not None and self.recent_writes.find([f"confirm:{confirmation_key(pending)}"]):
+                # The pending entry itself was written, e.g. it was restored after a restart
+                self.logger.info(f"Pending expense for chat_id {chat_id} was already recorded, not writing it again")
+                DUPLICATE_CONFIRMS.inc()
+                del self.pending_expenses[chat_id]
+                await self._reply(query.message.reply_text, "✅ Expense already recorded.")
+                return
+            if self.recent_writes.find(self._write_keys(query)):
+                # A redelivered callback or a tap on an older confirmation; the current pending entry stays
+                self.logger.info(f"Confirmation tapped again in chat_id {chat_id} was already recorded")
+                DUPLICATE_CONFIRMS.inc()
+                await self._reply(query.message.reply_text, "✅ Expense already recorded.")
+                return
         
         if chat_id not in self.pending_expenses:
             self.logger.warning(f"No pending expense found for chat_id {chat_id}")
             await query.message.reply_text("No pending expense found. Please start over.")
             return
         
-        if query.data == "confirm":
+        if query.data.startswith("toggle:"):
+            expense_data = self.pending_expenses[chat_id]
+            index = int(query.data.split(":", 1)[1])
+            if 0 <= index < len(expense_data["selected"]):
+                expense_data["selected"][index] = not expense_data["selected"][index]
+                self.pending_expenses[chat_id] = expense_data
+                expense_data = self.pending_expenses[chat_id]  # Re-render the summary
+                self.logger.info(f"Toggled item {index} for chat_id {chat_id}")
+                await self._reply(
+                    query.edit_message_text,
+                    self._confirmation_text(expense_data),
+                    reply_markup=self._confirmation_keyboard(expense_data)
+                )
+        
+        elif query.data == "confirm":
             self.logger.info(f"Processing confirmation for chat_id {chat_id}")
+            expense_data = self.pending_expenses[chat_id]
+            if not any(expense_data["selected"]):
+                await query.message.reply_text("No expenses selected. Select at least one or press No.")
+                return
             try:
-                expense_data = self.pending_expenses[chat_id]
-                self.logger.info(f"Writing expense data: {expense_data}")
-                await self.agent.write_expense(expense_data)
-                self.logger.info(f"Successfully recorded expense for chat_id {chat_id}")
-                await query.message.reply_text("✅ Expense successfully recorded!")
+                self.logger.debug("Writing expense data: %s", expense_data)
+                agent = await self.get_agent()
+                await agent.write_expense(expense_data, tenant=household.tenant, outbox=household.outbox)
             except Exception as e:
+                # Keep the pending expense so the user can simply press Yes again
                 self.logger.error(f"Failed to record expense for chat_id {chat_id}: {str(e)}")
-                await query.message.reply_text(f"❌ Failed to record expense: {str(e)}")
-            finally:
-                self.logger.info(f"Clearing pending expense for chat_id {chat_id}")
-                del self.pending_expenses[chat_id]
+                await self._reply(query.message.reply_text, f"❌ Failed to record expense: {str(e)}")
+                return
+            self.logger.info(f"Successfully recorded expense for chat_id {chat_id}, clearing pending expense")
+            self.recent_writes.record(
+                self._write_keys(query, expense_data), household.tenant.id,
+                [item for item, keep in zip(expense_data["items"], expense_data["selected"]) if keep]
+            )
+            del self.pending_expenses[chat_id]
+            await self._reply(query.message.reply_text, "✅ Expense successfully recorded!")
         
         elif query.data == "reject":
             self.logger.info(f"User rejected expense for chat_id {chat_id}")
@@ -103,6 +423,45 @@ class ExpenseBot:
                 "Please tell me what needs to be corrected, and I'll adjust the entry."
             )
 
+    def _write_keys(self, query, expense_data=None):
+        """Keys a confirm is recorded under: its callback, its confirmation message and what it writes"""
+        keys = [f"callback:{query.id}", f"message:{query.message.chat_id}:{query.message.message_id}"]
+        if expense_data is not None:
+            keys.append(f"confirm:{confirmation_key(expense_data)}")
+        return keys
+
+    def _confirmation_text(self, expense_data):
+        if len(expense_data["items"]) == 1:
+            text = f"I'll add this expense:\n{expense_data['summary']}\n\nIs this correct?"  # Use only the formatted summary
+        else:
+            text = (
+                f"I'll add these expenses:\n{expense_data['summary']}\n"
+                "Tap an item to include or skip it. Is this correct?"
+            )
+        duplicates = expense_data.get("duplicates")
+        if duplicates:
+            lines = [
+                f"{index + 1}. {expense_data['items'][index]['description']} ({format_age(time.time() - written_at)} ago)"
+                for index, written_at in duplicates
+            ]
+            text += "\n\n⚠️ Possibly already recorded:\n" + "\n".join(lines)
+        return text
+
+    def _confirmation_keyboard(self, expense_data):
+        keyboard = []
+        if len(expense_data["items"]) > 1:
+            # One toggle per item, so a single message can be partially confirmed
+            for index, (item, selected) in enumerate(zip(expense_data["items"], expense_data["selected"])):
+                keyboard.append([InlineKeyboardButton(
+                    f"{'✅' if selected else '⬜'} {index + 1}. {item['description']} {item['amount']} {item['currency']}",
+                    callback_data=f"toggle:{index}"
+                )])
+        keyboard.append([
+            InlineKeyboardButton("Yes ✅", callback_data="confirm"),
+            InlineKeyboardButton("No ❌", callback_data="reject")
+        ])
+        return InlineKeyboardMarkup(keyboard)
+
     async def error_handler(self, update: Update, context):
         """Handle errors caused by updates."""
         self.logger.error(f"Update {update} caused error {context.error}")
@@ -119,8 +478,111 @@ class ExpenseBot:
                     "Sorry, something went wrong. Please try again later."
                 )
 
+    async def post_init(self, application: Application):
+        """Start syncing the outbox, replaying entries left from a previous run, and the sheet mirror."""
+        self.startup_timings["ready_seconds"] = time.perf_counter() - self.started_at
+        self.logger.info(f"Accepting updates {self.startup_timings['ready_seconds']:.2f}s after start")
+        if LAZY_STARTUP:
+            self._warm_agent()
+        loop = asyncio.get_running_loop()
+        for household in self.households.values():
+            household.outbox_worker.start()
+            household.mirror_task = loop.create_task(self._sync_mirror(household))
+        if self.shard is not None:
+            # Each worker process has its own registry, so serve it on its own port
+            port = METRICS_PORT + 1 + self.shard if METRICS_PORT else None
+        else:
+            # Polling has no HTTP server of its own, so serve /health and /metrics separately
+            port = METRICS_PORT if BOT_MODE != "webhook" else None
+        if port:
+            self.metrics_server = BotHttpServer(self.app, self.health, webhook_path=None)
+            self.metrics_server.start(port, WEBHOOK_HOST)
+
+    async def _sync_mirror(self, household: Household):
+        """Keep a household's sheet mirror current with rows added outside this bot."""
+        while True:
+            try:
+                await self.quota.acquire("sheets_read", priority=PRIORITY_BACKGROUND)
+                # Resolve the client here, as the client cache is only touched from the event loop
+                client = household.sheets_client.client
+                await client.run_blocking(household.mirror.sync, client)
+                agent = await self.get_agent()
+                categorizer = agent.categorizer_for(household.tenant)
+                if not categorizer.trained:
+                    # Learn categories from rows confirmed before this process started
+                    categorizer.train(household.mirror.labeled_rows())
+            except Exception as e:
+                self.logger.warning(f"Sheet mirror sync failed for {household.tenant.id}: {str(e)}")
+            await asyncio.sleep(MIRROR_SYNC_INTERVAL)
+
+    async def post_shutdown(self, application: Application):
+        """Drain the outbox and flush queued Sheets writes before the process exits."""
+        self.logger.info("Flushing pending Sheets writes...")
+        for household in self.households.values():
+            if household.mirror_task is not None:
+                household.mirror_task.cancel()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        for household in self.households.values():
+            await household.outbox_worker.stop()
+        await self.sheets_clients.close()
+        for household in self.households.values():
+            household.outbox.close()
+            household.mirror.close()
+        self.pending_expenses.close()
+        self.recent_writes.close()
+        if self._agent is not None:
+            self._agent.close()
+
+    def accepting_updates(self):
+        """Whether the backlog leaves room for more updates; the webhook turns updates away when it doesn't.
+
+        PTB only starts so many handlers at once, so updates beyond that wait in its update queue
+        before the scheduler sees them.
+        """
+        return self.scheduler.queued + self.app.update_queue.qsize() < MAX_QUEUED_UPDATES
+
+    def health(self):
+        """Health status for the HTTP server's /health endpoint."""
+        return {
+            "status": "ok" if self.app.running else "starting",
+            "pending_expenses": self.pending_expenses.stats(),
+            "recent_writes": self.recent_writes.stats(),
+            "outbox_pending": self.outbox_pending(),
+            "outbox_dead_letters": self.outbox_dead(),
+            "households": len(self.households),
+            "startup": self.startup_timings
+        }
+
+    async def serve_shard(self, updates):
+        """Handle updates forwarded by the shard router until it sends None.
+
+        ``updates`` is a multiprocessing queue of ``Update.to_dict()`` payloads. They go into
+        PTB's update queue in arrival order, so each chat's scheduler sees them in order.
+        """
+        loop = asyncio.get_running_loop()
+        await self.app.initialize()
+        await self.post_init(self.app)
+        await self.app.start()
+        try:
+            while True:
+                data = await loop.run_in_executor(None, updates.get)
+                if data is None:
+                    break
+                await self.app.update_queue.put(Update.de_json(data, self.app.bot))
+        finally:
+            self.logger.info(f"Stopping shard {self.shard}...")
+            await self.app.stop()
+            await self.app.shutdown()
+            await self.post_shutdown(self.app)
+
     def run(self):
         """Run the bot."""
+        if BOT_MODE == "webhook":
+            self.logger.info("Starting bot in webhook mode...")
+            asyncio.run(self.run_webhook())
+            return
+        
         self.logger.info("Starting bot polling...")
         try:
             self.app.run_polling()
@@ -128,3 +590,29 @@ class ExpenseBot:
             self.logger.error(f"Error running bot: {e}")
             raise
 
+    async def run_webhook(self):
+        """Serve Telegram updates from the embedded HTTP server until SIGINT/SIGTERM."""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        server = BotHttpServer(
+            self.app, self.health, secret_token=WEBHOOK_SECRET, webhook_path=WEBHOOK_PATH,
+            accepting=self.accepting_updates
+        )
+        await self.app.initialize()
+        await self.post_init(self.app)
+        await self.app.start()
+        try:
+            server.start(WEBHOOK_PORT, WEBHOOK_HOST)
+            if WEBHOOK_URL:
+                self.logger.info(f"Registering webhook {WEBHOOK_URL}{WEBHOOK_PATH}")
+                await self.app.bot.set_webhook(url=f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET)
+            await stop.wait()
+        finally:
+            self.logger.info("Stopping webhook server...")
+            await server.stop()
+            await self.app.stop()
+            await self.app.shutdown()
+            await self.post_shutdown(self.app)
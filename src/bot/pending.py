@@ -0,0 +1,164 @@
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+from src.agent.summary import format_expenses_summary
+
+# Only these fields of a processed message are persisted; the summary and
+# other derived values are rebuilt when the entry is read back
+STORED_FIELDS = ("key", "items", "selected", "duplicates")
+
+def compact_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: entry[field] for field in STORED_FIELDS if field in entry}
+
+def expand_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(entry, summary=format_expenses_summary(entry["items"], entry.get("selected")))
+
+class PendingStore(MutableMapping):
+    """Pending confirmations keyed by chat id, bounded by TTL and size.
+
+    Subclasses implement the storage primitives; this class handles
+    compacting entries on write, re-rendering them on read and eviction
+    metrics.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.logger = logging.getLogger(__name__)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.evicted_ttl = 0
+        self.evicted_size = 0
+
+    def _load(self, chat_id: int) -> Optional[Tuple[float, Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def _save(self, chat_id: int, expires_at: float, entry: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _delete(self, chat_id: int) -> bool:
+        raise NotImplementedError
+
+    def _purge_expired(self, now: float) -> None:
+        raise NotImplementedError
+
+    def __getitem__(self, chat_id: int) -> Dict[str, Any]:
+        stored = self._load(chat_id)
+        if stored is None:
+            raise KeyError(chat_id)
+        expires_at, entry = stored
+        if expires_at < time.time():
+            self._delete(chat_id)
+            self.evicted_ttl += 1
+            raise KeyError(chat_id)
+        return expand_entry(entry)
+
+    def __setitem__(self, chat_id: int, entry: Dict[str, Any]) -> None:
+        self._save(chat_id, time.time() + self.ttl, compact_entry(entry))
+
+    def __delitem__(self, chat_id: int) -> None:
+        if not self._delete(chat_id):
+            raise KeyError(chat_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self), "evicted_ttl": self.evicted_ttl, "evicted_size": self.evicted_size}
+
+    def close(self) -> None:
+        pass
+
+class MemoryPendingStore(PendingStore):
+    """In-process store; entries are lost on restart."""
+
+    def __init__(self, ttl: float = 24 * 3600, max_size: int = 10000):
+        super().__init__(ttl, max_size)
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def _load(self, chat_id):
+        return self._entries.get(chat_id)
+
+    def _save(self, chat_id, expires_at, entry):
+        self._entries[chat_id] = (expires_at, entry)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self.evicted_size += 1
+            self.logger.info(f"Evicted pending expense for chat_id {evicted} (store full)")
+
+    def _delete(self, chat_id):
+        return self._entries.pop(chat_id, None) is not None
+
+    def _purge_expired(self, now):
+        expired = [chat_id for chat_id, (expires_at, _) in self._entries.items() if expires_at < now]
+        for chat_id in expired:
+            del self._entries[chat_id]
+        self.evicted_ttl += len(expired)
+
+    def __iter__(self) -> Iterator[int]:
+        self._purge_expired(time.time())
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        self._purge_expired(time.time())
+        return len(self._entries)
+
+class SQLitePendingStore(PendingStore):
+    """SQLite-backed store so pending confirmations survive deploys."""
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, max_size: int = 10000):
+        super().__init__(ttl, max_size)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                chat_id INTEGER PRIMARY KEY,
+                entry TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._purge_expired(time.time())
+
+    def _load(self, chat_id):
+        row = self.conn.execute("SELECT expires_at, entry FROM pending WHERE chat_id = ?", (chat_id,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _save(self, chat_id, expires_at, entry):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pending (chat_id, entry, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+            (chat_id, json.dumps(entry), expires_at, time.time())
+        )
+        cursor = self.conn.execute(
+            "DELETE FROM pending WHERE chat_id IN (SELECT chat_id FROM pending ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+        if cursor.rowcount > 0:
+            self.evicted_size += cursor.rowcount
+            self.logger.info(f"Evicted {cursor.rowcount} pending expenses (store full)")
+
+    def _delete(self, chat_id):
+        return self.conn.execute("DELETE FROM pending WHERE chat_id = ?", (chat_id,)).rowcount > 0
+
+    def _purge_expired(self, now):
+        self.evicted_ttl += self.conn.execute("DELETE FROM pending WHERE expires_at < ?", (now,)).rowcount
+
+    def __iter__(self) -> Iterator[int]:
+        self._purge_expired(time.time())
+        return iter([row[0] for row in self.conn.execute("SELECT chat_id FROM pending ORDER BY updated_at")])
+
+    def __len__(self) -> int:
+        self._purge_expired(time.time())
+        return self.conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+def create_pending_store(backend: str, path: str, ttl: float, max_size: int) -> PendingStore:
+    """Build the pending store selected in config ("memory" or "sqlite")."""
+    if backend == "sqlite":
+        return SQLitePendingStore(path, ttl=ttl, max_size=max_size)
+    if backend == "memory":
+        return MemoryPendingStore(ttl=ttl, max_size=max_size)
+    raise ValueError(f"Unknown pending store backend: {backend}")
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from telegram.error import BadRequest, RetryAfter
+from src.agent.summary import format_partial_expenses
+from src.metrics import FIRST_FEEDBACK_SECONDS
+
+class ConfirmationPreview:
+    """Shows a parse in progress by editing a single placeholder message.
+
+    ``update`` never blocks the caller: sends and edits run in a background
+    task, and updates arriving faster than ``interval`` seconds apart are
+    coalesced so only the latest text is shown. This keeps a chat within
+    Telegram's edit rate limits however fast the model streams. The
+    placeholder is only sent on the first update, so replies that need no
+    LLM call (fast path, cache) still arrive as one message.
+    """
+
+    def __init__(self, message, reply, interval: float = 1.0, received_at: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.message = message  # The user's message, which the preview replies to
+        self.reply = reply  # Coroutine wrapper that times Telegram calls, e.g. ExpenseBot._reply
+        self.interval = interval
+        self.received_at = time.perf_counter() if received_at is None else received_at
+        self.sent = None  # The placeholder message, once sent
+        self.text: Optional[str] = None  # Text currently shown
+        self.pending: Optional[str] = None
+        self.next_edit = 0.0
+        self.edits = 0
+        self._done = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, items: List[Dict[str, Any]]) -> None:
+        """Show the expenses parsed so far (possibly none yet)"""
+        if self._done.is_set():
+            return
+        self.pending = format_partial_expenses(items)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        try:
+            while self.pending is not None:
+                if self.sent is not None:
+                    delay = self.next_edit - time.monotonic()
+                    if delay > 0:
+                        try:
+                            # Wake early if the final result arrives
+                            await asyncio.wait_for(self._done.wait(), delay)
+                        except asyncio.TimeoutError:
+                            pass
+                        if self._done.is_set():
+                            return
+                text, self.pending = self.pending, None
+                if self.sent is None:
+                    self.sent = await self.reply(self.message.reply_text, text)
+                    self.text = text
+                    self.next_edit = time.monotonic() + self.interval
+                    FIRST_FEEDBACK_SECONDS.observe(time.perf_counter() - self.received_at)
+                elif text != self.text:
+                    try:
+                        await self._edit(text)
+                    except RetryAfter:
+                        # Show it once the pause is over, unless something newer arrived
+                        self.pending = self.pending or text
+        except Exception as e:
+            # A lost preview is cosmetic; the final result is still delivered by finish()
+            self.logger.warning(f"Failed to update preview: {str(e)}")
+        finally:
+            self._task = None
+
+    async def _edit(self, text: str, **kwargs) -> None:
+        try:
+            await self.reply(self.sent.edit_text, text, **kwargs)
+            self.text = text
+            self.edits += 1
+            self.next_edit = time.monotonic() + self.interval
+        except RetryAfter as e:
+            # Telegram asked this chat to slow down: hold back further edits
+            self.next_edit = time.monotonic() + float(e.retry_after)
+            raise
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+
+    async def finish(self, text: str, reply_markup=None) -> None:
+        """Replace the preview with the final text, or send it if no preview was shown"""
+        self._done.set()
+        self.pending = None
+        if self._task is not None:
+            # Lets an in-flight send finish so the placeholder is never orphaned
+            await self._task
+        if self.sent is None:
+            await self.reply(self.message.reply_text, text, reply_markup=reply_markup)
+            FIRST_FEEDBACK_SECONDS.observe(time.perf_counter() - self.received_at)
+            return
+        try:
+            await self._edit(text, reply_markup=reply_markup)
+        except RetryAfter:
+            await asyncio.sleep(max(0.0, self.next_edit - time.monotonic()))
+            await self._edit(text, reply_markup=reply_markup)
+
+    async def discard(self) -> None:
+        """Stop updating and delete the preview, e.g. when parsing failed"""
+        self._done.set()
+        self.pending = None
+        if self._task is not None:
+            await self._task
+        if self.sent is not None:
+            try:
+                await self.reply(self.sent.delete)
+            except Exception as e:
+                self.logger.warning(f"Failed to delete preview: {str(e)}")
+            self.sent = None
@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+def month_range(today: date) -> Tuple[date, date]:
+    start = today.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+def week_range(today: date) -> Tuple[date, date]:
+    start = today - timedelta(days=today.weekday())
+    return start, start + timedelta(days=6)
+
+def format_amount(amount: float) -> str:
+    return f"{amount:,.2f}"
+
+def format_base_total(base: Optional[Tuple[float, str, int]]) -> List[str]:
+    """Line for (total in the base currency, base currency, expenses without a rate), if there is one."""
+    if base is None:
+        return []
+    total, currency, missing = base
+    line = f"💱 All together: {format_amount(total)} {currency}"
+    if missing:
+        line += f" ({missing} expenses without an exchange rate left out)"
+    return [line]
+
+def format_totals(title: str, start: date, end: date, rows: List[Tuple],
+                  base: Optional[Tuple[float, str, int]] = None) -> str:
+    """Render (currency, total, count) rows from SheetMirror.totals."""
+    lines = [f"📊 {title} ({start.isoformat()} – {end.isoformat()}):"]
+    if not rows:
+        lines.append("No expenses recorded.")
+    for currency, total, count in rows:
+        lines.append(f"💰 {format_amount(total)} {currency} ({count} expenses)")
+    return "\n".join(lines + format_base_total(base))
+
+def format_user_totals(title: str, start: date, end: date, rows: List[Tuple],
+                       base: Optional[Tuple[float, str, int]] = None) -> str:
+    """Render (user, currency, total, count) rows from SheetMirror.totals(by_user=True)."""
+    lines = [f"📊 {title} by user ({start.isoformat()} – {end.isoformat()}):"]
+    if not rows:
+        lines.append("No expenses recorded.")
+    for user, currency, total, count in rows:
+        lines.append(f"👤 {user}: {format_amount(total)} {currency} ({count} expenses)")
+    return "\n".join(lines + format_base_total(base))
+
+def format_category_totals(title: str, start: date, end: date, rows: List[Tuple],
+                           base: Optional[Tuple[float, str, int]] = None) -> str:
+    """Render (category, currency, total, count) rows from SheetMirror.totals(by_category=True)."""
+    lines = [f"📊 {title} by category ({start.isoformat()} – {end.isoformat()}):"]
+    if not rows:
+        lines.append("No expenses recorded.")
+    for category, currency, total, count in rows:
+        lines.append(f"🏷️ {category or 'Uncategorized'}: {format_amount(total)} {currency} ({count} expenses)")
+    return "\n".join(lines + format_base_total(base))
@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, Optional
+from src.metrics import UPDATE_SECONDS
+from src.ratelimit import PRIORITY_PARSE
+
+class PrioritySlots:
+    """A semaphore that hands freed slots to the most urgent waiter first."""
+
+    def __init__(self, capacity: int):
+        self.free = capacity
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, priority: int = PRIORITY_PARSE) -> None:
+        if self.free > 0 and not self._waiters:
+            self.free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.free += 1
+
+class ChatScheduler:
+    """Runs update handlers concurrently across chats and strictly in order within a chat.
+
+    Each chat has its own FIFO lock, so a correction can never overtake the
+    message it corrects and a button press never races the parse it confirms.
+    A global pool of slots caps how many handlers run at once; it is only taken
+    after the chat lock, so updates queued behind a busy chat don't hold slots
+    that other chats could use. Freed slots go to the most urgent waiter, so
+    confirmations run ahead of new messages under load.
+    """
+
+    def __init__(self, max_concurrency: int = 8):
+        self.logger = logging.getLogger(__name__)
+        self.max_concurrency = max_concurrency
+        self._slots = PrioritySlots(max_concurrency)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._queued: Dict[Hashable, int] = {}
+        self.running = 0
+
+    @property
+    def queued(self) -> int:
+        """Number of updates waiting for or holding a chat slot."""
+        return sum(self._queued.values())
+
+    @asynccontextmanager
+    async def slot(self, chat_id: Optional[Hashable], priority: int = PRIORITY_PARSE):
+        """Hold the chat's turn and a global concurrency slot for the duration of the block."""
+        if chat_id is None:
+            await self._slots.acquire(priority)
+            try:
+                yield
+            finally:
+                self._slots.release()
+            return
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._queued[chat_id] = self._queued.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                await self._slots.acquire(priority)
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+                    self._slots.release()
+        finally:
+            self._queued[chat_id] -= 1
+            if not self._queued[chat_id]:
+                # Nobody else is waiting on this chat, so its lock can go
+                del self._queued[chat_id]
+                del self._locks[chat_id]
+
+    def wrap(self, handler, priority: int = PRIORITY_PARSE):
+        """Wrap a PTB callback so it runs inside its chat's slot."""
+        @functools.wraps(handler)
+        async def scheduled(update, context):
+            chat = getattr(update, "effective_chat", None)
+            async with self.slot(chat.id if chat else None, priority):
+                with UPDATE_SECONDS.time(handler=handler.__name__):
+                    return await handler(update, context)
+        return scheduled
@@ -0,0 +1,112 @@
+import hmac
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+from telegram import Update
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as WebApplication, RequestHandler
+from src.metrics import REGISTRY
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+BACKPRESSURE_RETRY_AFTER = 5
+
+class TelegramWebhookHandler(RequestHandler):
+    """Receives Telegram updates and feeds them into the PTB update queue."""
+
+    def initialize(self, bot_application, secret_token: str, accepting: Optional[Callable[[], bool]] = None):
+        self.logger = logging.getLogger(__name__)
+        # Tornado reserves self.application for its own web application
+        self.bot_application = bot_application
+        self.secret_token = secret_token
+        self.accepting = accepting
+
+    async def post(self):
+        received = self.request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            self.logger.warning("Rejected webhook request with invalid secret token")
+            self.set_status(403)
+            return
+
+        if self.accepting is not None and not self.accepting():
+            # Backpressure: Telegram keeps the update and redelivers it later
+            self.logger.warning("Backlog full, asking Telegram to redeliver the update later")
+            self.set_status(503)
+            self.set_header("Retry-After", str(BACKPRESSURE_RETRY_AFTER))
+            return
+
+        try:
+            data = json.loads(self.request.body)
+            update = Update.de_json(data, self.bot_application.bot)
+        except Exception as e:
+            self.logger.warning(f"Rejected malformed webhook payload: {str(e)}")
+            self.set_status(400)
+            return
+
+        if update is None:
+            self.set_status(400)
+            return
+
+        await self.bot_application.update_queue.put(update)
+        self.set_status(200)
+
+class HealthHandler(RequestHandler):
+    """Reports whether the bot is up, for load balancer health checks."""
+
+    def initialize(self, health: Callable[[], Dict[str, Any]]):
+        self.health = health
+
+    def get(self):
+        status = self.health()
+        self.set_status(200 if status.get("status") == "ok" else 503)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(status))
+
+class MetricsHandler(RequestHandler):
+    """Serves the process metrics in Prometheus text format."""
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(REGISTRY.render())
+
+class BotHttpServer:
+    """Embedded HTTP server serving the Telegram webhook, health and metrics endpoints.
+
+    The webhook needs ``secret_token``: without it anyone who finds the URL
+    could post updates with forged user ids.
+    """
+
+    def __init__(self, application, health: Callable[[], Dict[str, Any]], secret_token: Optional[str] = None,
+                 webhook_path: Optional[str] = "/telegram", accepting: Optional[Callable[[], bool]] = None):
+        if webhook_path and not secret_token:
+            raise ValueError("Set WEBHOOK_SECRET to serve the Telegram webhook")
+        self.logger = logging.getLogger(__name__)
+        self.application = application
+        self.health = health
+        self.secret_token = secret_token
+        self.webhook_path = webhook_path
+        self.accepting = accepting
+        self.server: Optional[HTTPServer] = None
+
+    def make_app(self) -> WebApplication:
+        routes = [
+            (r"/health", HealthHandler, {"health": self.health}),
+            (r"/metrics", MetricsHandler),
+        ]
+        if self.webhook_path:
+            routes.append((
+                self.webhook_path,
+                TelegramWebhookHandler,
+                {"bot_application": self.application, "secret_token": self.secret_token, "accepting": self.accepting}
+            ))
+        return WebApplication(routes)
+
+    def start(self, port: int, host: str = "0.0.0.0") -> None:
+        self.server = HTTPServer(self.make_app(), xheaders=True)
+        self.server.listen(port, address=host)
+        self.logger.info(f"HTTP server listening on {host}:{port}")
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.stop()
+            await self.server.close_all_connections()
+            self.server = None
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from collections import Counter
+from typing import Optional
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from src.bot.server import BotHttpServer
+from src.tenants import TenantRegistry, shard_for
+from src.metrics import REGISTRY, SHARD_UPDATES
+from src.config import (
+    TELEGRAM_TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    MAX_QUEUED_UPDATES, METRICS_PORT
+)
+
+# Updates are received by one router process and handed to SHARDS worker
+# processes, each a full ExpenseBot (agent, scheduler, Sheets clients) for the
+# households hashed to it. A household always lands on the same worker, which
+# keeps its updates in order and its Sheets writes batched together, while
+# parsing for different households runs on different cores.
+
+def run_shard(shard: int, shards: int, updates, started_at: Optional[float] = None) -> None:
+    """Entry point of a worker process"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # The router owns shutdown and tells workers to stop through the queue, once it stopped receiving
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from src.bot.main import ExpenseBot
+    bot = ExpenseBot(started_at=started_at, shard=shard, shards=shards)
+    asyncio.run(bot.serve_shard(updates))
+
+class ShardRouter:
+    """Receives Telegram updates and forwards each to the worker process that owns its household."""
+
+    def __init__(self, shards: int, tenants: Optional[TenantRegistry] = None, started_at: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.tenants = tenants or TenantRegistry.from_config()
+        # Spawned rather than forked, so workers don't inherit the router's event loop or sockets
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue() for _ in range(shards)]
+        self.processes = [
+            context.Process(target=run_shard, args=(index, shards, queue, self.started_at), name=f"shard-{index}")
+            for index, queue in enumerate(self.queues)
+        ]
+        self.forwarded = Counter()
+        self.metrics_server = None
+        # Routing is cheap, so updates are forwarded one at a time, in the order Telegram sent them
+        self.app = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+        self.app.add_handler(TypeHandler(Update, self.route))
+        REGISTRY.gauge_callback(
+            "expense_bot_shards_alive", "Shard worker processes running",
+            lambda: sum(process.is_alive() for process in self.processes)
+        )
+
+    def shard_of(self, update: Update) -> Optional[int]:
+        chat = update.effective_chat
+        tenant = self.tenants.for_chat(chat.id if chat else None)
+        if tenant is None:
+            return None
+        return shard_for(tenant.id, len(self.queues))
+
+    async def route(self, update: Update, context):
+        shard = self.shard_of(update)
+        if shard is None:
+            self.logger.warning(f"No household for update {update.update_id}, dropping it")
+            if update.effective_message:
+                await update.effective_message.reply_text("This chat isn't linked to a household yet.")
+            return
+        # Plain JSON-able dicts cross the process boundary; the worker rebuilds the Update
+        self.queues[shard].put(update.to_dict())
+        self.forwarded[shard] += 1
+        SHARD_UPDATES.inc(shard=str(shard))
+
+    async def post_init(self, application: Application):
+        for process in self.processes:
+            process.start()
+        self.logger.info(f"Started {len(self.processes)} shard workers")
+        if BOT_MODE != "webhook" and METRICS_PORT:
+            # Workers serve their own metrics on the following ports
+            self.metrics_server = BotHttpServer(self.app, self.health, webhook_path=None)
+            self.metrics_server.start(METRICS_PORT, WEBHOOK_HOST)
+
+    async def post_shutdown(self, application: Application):
+        """Let every worker finish the updates it was sent, then wait for it to exit."""
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        for queue in self.queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join)
+        self.logger.info("Shard workers stopped")
+
+    def accepting_updates(self):
+        """Turn webhook updates away while workers have a large backlog"""
+        try:
+            return max(queue.qsize() for queue in self.queues) < MAX_QUEUED_UPDATES
+        except NotImplementedError:
+            # qsize() isn't available on macOS
+            return True
+
+    def health(self):
+        alive = [process.is_alive() for process in self.processes]
+        if not self.app.running:
+            status = "starting"
+        else:
+            status = "ok" if all(alive) else "degraded"
+        return {
+            "status": status,
+            "shards": len(self.processes),
+            "shards_alive": sum(alive),
+            "forwarded": dict(self.forwarded)
+        }
+
+    def run(self):
+        if BOT_MODE == "webhook":
+            self.logger.info("Starting shard router in webhook mode...")
+            asyncio.run(self.run_webhook())
+            return
+        self.logger.info("Starting shard router polling...")
+        self.app.run_polling()
+
+    async def run_webhook(self):
+        """Serve Telegram updates from the embedded HTTP server until SIGINT/SIGTERM."""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        server = BotHttpServer(
+            self.app, self.health, secret_token=WEBHOOK_SECRET, webhook_path=WEBHOOK_PATH,
+            accepting=self.accepting_updates
+        )
+        await self.app.initialize()
+        await self.post_init(self.app)
+        await self.app.start()
+        try:
+            server.start(WEBHOOK_PORT, WEBHOOK_HOST)
+            if WEBHOOK_URL:
+                self.logger.info(f"Registering webhook {WEBHOOK_URL}{WEBHOOK_PATH}")
+                await self.app.bot.set_webhook(url=f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET)
+            await stop.wait()
+        finally:
+            self.logger.info("Stopping webhook server...")
+            await server.stop()
+            await self.app.stop()
+            await self.app.shutdown()
+            await self.post_shutdown(self.app)
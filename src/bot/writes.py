@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from src.agent.cache import normalize_message
+
+# Confirmed writes, remembered for a while so the same confirmation is never
+# written twice. A confirm is identified three ways: by the callback query id
+# (Telegram redelivering it), by the confirmation message (a second tap after
+# the first one went through) and by a hash of the pending expense's key and
+# selected items (a pending entry that outlived its write, e.g. across a
+# restart). Each written item is also fingerprinted, so a message repeating a
+# recent expense can be flagged before it is confirmed.
+
+class WriteRecord(NamedTuple):
+    written_at: float
+    count: int
+
+def confirmation_key(expense_data: Dict[str, Any]) -> str:
+    """Content hash of what confirming ``expense_data`` would write"""
+    selected = expense_data.get("selected") or [True] * len(expense_data["items"])
+    items = [item for item, keep in zip(expense_data["items"], selected) if keep]
+    raw = json.dumps([expense_data.get("key"), items], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def item_fingerprint(tenant_id: str, item: Dict[str, Any]) -> str:
+    """Same household, user, amount and description; the date is left out, as it is often re-guessed"""
+    try:
+        amount = f"{float(item.get('amount')):.2f}"
+    except (TypeError, ValueError):
+        amount = str(item.get("amount"))
+    raw = "\x00".join((
+        tenant_id, str(item.get("user") or ""), amount, str(item.get("currency") or ""),
+        normalize_message(str(item.get("description") or ""))
+    ))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def format_age(seconds: float) -> str:
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60} min"
+
+class RecentWrites:
+    """Bounded index of recent confirmed writes, with TTL eviction.
+
+    Entries live in an in-process LRU; when ``path`` is given they are also
+    kept in SQLite, so a restarted bot (or another shard) still recognizes
+    confirmations it already wrote.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 24 * 3600, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.suppressed = 0
+        self._entries: "OrderedDict[str, Tuple[float, WriteRecord]]" = OrderedDict()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS recent_writes (
+                    key TEXT PRIMARY KEY,
+                    written_at REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("DELETE FROM recent_writes WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[WriteRecord]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < now:
+            del self._entries[key]
+            entry = None
+        if entry is None and self.conn is not None:
+            row = self.conn.execute(
+                "SELECT expires_at, written_at, count FROM recent_writes WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], WriteRecord(row[1], row[2]))
+                self._store(key, entry)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def find(self, keys: Iterable[Optional[str]]) -> Optional[WriteRecord]:
+        """The write recorded under the first of ``keys`` that is known"""
+        for key in keys:
+            record = self.get(key) if key else None
+            if record is not None:
+                self.suppressed += 1
+                return record
+        return None
+
+    def record(self, keys: Iterable[Optional[str]], tenant_id: str, items: List[Dict[str, Any]]) -> WriteRecord:
+        """Remember a confirmed write under each of ``keys`` and fingerprint its items"""
+        now = time.time()
+        record = WriteRecord(now, len(items))
+        keys = [key for key in keys if key] + [f"item:{item_fingerprint(tenant_id, item)}" for item in items]
+        entry = (now + self.ttl, record)
+        for key in keys:
+            self._store(key, entry)
+        if self.conn is not None:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO recent_writes (key, written_at, count, expires_at) VALUES (?, ?, ?, ?)",
+                [(key, record.written_at, record.count, entry[0]) for key in keys]
+            )
+        return record
+
+    def duplicates(self, tenant_id: str, items: List[Dict[str, Any]], window: float) -> List[Tuple[int, float]]:
+        """``(index, written_at)`` for each item matching one written in the last ``window`` seconds"""
+        now = time.time()
+        found = []
+        for index, item in enumerate(items):
+            record = self.get(f"item:{item_fingerprint(tenant_id, item)}")
+            if record is not None and now - record.written_at <= window:
+                found.append((index, record.written_at))
+        return found
+
+    def _store(self, key: str, entry: Tuple[float, WriteRecord]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "suppressed": self.suppressed}
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
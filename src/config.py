@@ -11,4 +11,86 @@ HIS_TG_ID = os.getenv("HIS_TG_ID")
 HER_TG_ID = os.getenv("HER_TG_ID")
 LANGCHAIN_PROJECT = os.getenv("LANGCHAIN_PROJECT")
 LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2")
-LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
\ No newline at end of file
+LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
+
+# LangSmith tracing: a sample of LLM calls plus every failed one, exported in batches off the request path
+TRACING_ENABLED = (LANGCHAIN_TRACING_V2 or "").lower() in ("1", "true", "yes")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.05"))
+TRACING_BATCH_SIZE = int(os.getenv("TRACING_BATCH_SIZE", "20"))
+TRACING_FLUSH_INTERVAL = float(os.getenv("TRACING_FLUSH_INTERVAL", "5.0"))
+
+SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", "50"))
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", "1.0"))
+SHEETS_API_URL = os.getenv("SHEETS_API_URL", "https://sheets.googleapis.com/v4")
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "8"))
+SHEETS_TOKEN_REFRESH_MARGIN = float(os.getenv("SHEETS_TOKEN_REFRESH_MARGIN", "300"))
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+# An outbox entry Sheets rejects this many times is set aside as a dead letter instead of blocking the rest
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "THB")
+# Every expense is also recorded in this currency (column H), from daily rates in FX_RATES_PATH
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", DEFAULT_CURRENCY)
+FX_RATES_PATH = os.getenv("FX_RATES_PATH")
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+# Import the agent stack and build API clients in the background after the bot starts accepting updates
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "true").lower() in ("1", "true", "yes")
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "8"))
+# Beyond this many queued updates, webhook requests are turned away so Telegram redelivers them later
+MAX_QUEUED_UPDATES = int(os.getenv("MAX_QUEUED_UPDATES", "500"))
+
+# Show LLM parses as they stream by editing a placeholder message, at most once per interval
+STREAM_PREVIEW = os.getenv("STREAM_PREVIEW", "true").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# API quotas as requests (or tokens) per minute; 0 disables a limit
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+OPENAI_TOKEN_ESTIMATE = int(os.getenv("OPENAI_TOKEN_ESTIMATE", "400"))
+# Tokens one parse or correction should use over all its model calls; requests above it are logged and counted
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+SHEETS_WRITE_RPM = float(os.getenv("SHEETS_WRITE_RPM", "60"))
+SHEETS_READ_RPM = float(os.getenv("SHEETS_READ_RPM", "60"))
+
+# Model cascade, cheapest first; a result that fails validation escalates to the next model
+LLM_MODELS = [model.strip() for model in os.getenv("LLM_MODELS", "gpt-4o-mini,gpt-4o").split(",") if model.strip()]
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" or "webhook"
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public base URL, e.g. https://example.herokuapp.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8443")))
+
+PENDING_STORE = os.getenv("PENDING_STORE", "memory")  # "memory" or "sqlite"
+PENDING_PATH = os.getenv("PENDING_PATH", "pending.db")
+PENDING_TTL = float(os.getenv("PENDING_TTL", "86400"))
+PENDING_MAX_SIZE = int(os.getenv("PENDING_MAX_SIZE", "10000"))
+
+# Confirmed writes are remembered this long, so repeated confirms of the same expense are answered
+# without writing it again; kept in SQLite when RECENT_WRITES_PATH is set
+RECENT_WRITES_PATH = os.getenv("RECENT_WRITES_PATH")
+RECENT_WRITES_TTL = float(os.getenv("RECENT_WRITES_TTL", "86400"))
+RECENT_WRITES_MAX_SIZE = int(os.getenv("RECENT_WRITES_MAX_SIZE", "10000"))
+# A new expense matching one recorded this many seconds ago (same user, amount and description) is flagged
+DUPLICATE_WINDOW = float(os.getenv("DUPLICATE_WINDOW", "3600"))
+
+MIRROR_PATH = os.getenv("MIRROR_PATH", "mirror.db")
+MIRROR_SYNC_INTERVAL = float(os.getenv("MIRROR_SYNC_INTERVAL", "300"))
+
+# Households served by this bot: a JSON file mapping chats to spreadsheets and members. Without one,
+# every chat writes to GOOGLE_SHEETS_ID; with one, GOOGLE_SHEETS_ID (if set) serves chats it doesn't list
+TENANTS_PATH = os.getenv("TENANTS_PATH")
+# Open Sheets clients to keep, least recently used first out
+SHEETS_CLIENT_CACHE_SIZE = int(os.getenv("SHEETS_CLIENT_CACHE_SIZE", "32"))
+# Worker processes that households are hashed to; 0 handles everything in the receiving process
+SHARDS = int(os.getenv("SHARDS", "0"))
+
+# In webhook mode /metrics is served on the webhook port; in polling mode only if this is set
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
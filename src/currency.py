@@ -0,0 +1,194 @@
+import csv
+import logging
+import os
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+# Currency codes and FX conversion, fully offline. Expenses keep the amount
+# and currency they were paid in; ``FxTable`` adds their value in one base
+# currency from a local file of daily rates, so totals across trips add up.
+
+# Words and symbols that may stand for a currency in a message. The fast path
+# only accepts these, so keep them unambiguous in an expense description
+CURRENCY_ALIASES = {
+    "thb": "THB", "baht": "THB", "bht": "THB", "฿": "THB", "бат": "THB", "батов": "THB",
+    "usd": "USD", "$": "USD", "dollar": "USD", "dollars": "USD",
+    "eur": "EUR", "€": "EUR", "euro": "EUR", "euros": "EUR",
+    "rub": "RUB", "₽": "RUB", "руб": "RUB",
+    "uah": "UAH", "₴": "UAH", "грн": "UAH",
+}
+
+# Further names the model may put in the currency field
+CURRENCY_NAMES = {
+    "us$": "USD", "us dollar": "USD", "us dollars": "USD", "доллар": "USD", "долларов": "USD",
+    "евро": "EUR", "рубль": "RUB", "рублей": "RUB", "гривна": "UAH", "гривен": "UAH",
+    "£": "GBP", "pound": "GBP", "pounds": "GBP", "¥": "JPY", "yen": "JPY", "yuan": "CNY", "rmb": "CNY",
+    "s$": "SGD", "rm": "MYR", "ringgit": "MYR", "₫": "VND", "dong": "VND", "rp": "IDR", "rupiah": "IDR",
+    "riel": "KHR", "₭": "LAK", "kip": "LAK", "₹": "INR", "rupee": "INR", "rupees": "INR",
+    "₸": "KZT", "тенге": "KZT", "₾": "GEL", "лари": "GEL", "₺": "TRY", "lira": "TRY", "dirham": "AED",
+}
+
+# Active ISO 4217 codes; any of them is a valid expense currency, with or without an FX rate
+ISO_CURRENCIES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN BWP BYN BZD
+    CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD
+    GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT
+    LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR
+    NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP
+    STN SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF
+    XPF YER ZAR ZMW ZWL
+""".split())
+
+KNOWN_CURRENCIES = ISO_CURRENCIES | set(CURRENCY_ALIASES.values()) | set(CURRENCY_NAMES.values())
+
+SEPARATOR_RE = re.compile(r"[\s.]+")
+
+def normalize_currency(value: Any) -> Optional[str]:
+    """ISO code for a currency code, name or symbol, or None if it isn't known"""
+    text = SEPARATOR_RE.sub(" ", str(value or "")).strip().lower()
+    code = CURRENCY_ALIASES.get(text) or CURRENCY_NAMES.get(text) or text.upper()
+    return code if code in KNOWN_CURRENCIES else None
+
+class FxTable:
+    """Daily exchange rates into one base currency, as a dense (days x currencies) array.
+
+    ``rates[day, column]`` is the value in the base currency of one unit of
+    ``currencies[column]`` on ``start + day``. Days without a quote (weekends,
+    holidays) carry the previous rate forward; dates outside the table use its
+    first or last day, so a stale file still converts recent expenses.
+    """
+
+    def __init__(self, base: str, start: np.datetime64, currencies: Sequence[str], rates: np.ndarray):
+        self.logger = logging.getLogger(__name__)
+        self.base = base
+        self.start = np.datetime64(start, "D")
+        self.currencies = list(currencies)
+        self.index: Dict[str, int] = {currency: column for column, currency in enumerate(self.currencies)}
+        self.rates = rates
+        if base not in self.index:
+            self.index[base] = len(self.currencies)
+            self.currencies.append(base)
+            self.rates = np.hstack([rates, np.ones((len(rates), 1))])
+
+    @classmethod
+    def from_quotes(cls, base: str, quotes: Iterable[tuple]) -> "FxTable":
+        """Build from ``(date, currency, rate)`` quotes; later quotes for the same day win"""
+        quotes = [(np.datetime64(day, "D"), normalize_currency(currency), float(rate)) for day, currency, rate in quotes]
+        quotes = [quote for quote in quotes if quote[1] is not None and quote[2] > 0]
+        if not quotes:
+            return cls(base, np.datetime64(date.today(), "D"), [], np.ones((1, 0)))
+        days = np.array([quote[0] for quote in quotes])
+        start = days.min()
+        currencies = sorted({quote[1] for quote in quotes})
+        columns = {currency: column for column, currency in enumerate(currencies)}
+        rates = np.full(((days.max() - start).astype(int) + 1, len(currencies)), np.nan)
+        rates[(days - start).astype(int), [columns[quote[1]] for quote in quotes]] = [quote[2] for quote in quotes]
+        return cls(base, start, currencies, _fill_gaps(rates))
+
+    @classmethod
+    def load(cls, path: Optional[str], base: str) -> "FxTable":
+        """Read a CSV with a ``date`` column and one column of rates per currency, e.g.
+
+        ``date,USD,EUR`` / ``2024-01-02,35.1,38.4`` for THB as the base. Empty cells are
+        missing quotes. Without a path, or if the file doesn't exist, the table only knows the base currency.
+        """
+        quotes = []
+        if path and not os.path.exists(path):
+            logging.getLogger(__name__).warning(f"FX rates file {path} not found, only {base} amounts will be converted")
+        elif path:
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                for row in reader:
+                    if not row or not row[0].strip():
+                        continue
+                    for currency, cell in zip(header[1:], row[1:]):
+                        if cell.strip():
+                            quotes.append((row[0].strip(), currency, cell))
+        table = cls.from_quotes(base, quotes)
+        table.logger.info(
+            f"Loaded FX rates for {len(table.currencies) - 1} currencies over {len(table.rates)} days "
+            f"(base {base})"
+        )
+        return table
+
+    @property
+    def end(self) -> np.datetime64:
+        return self.start + len(self.rates) - 1
+
+    def rate(self, currency: Any, day: Union[str, date]) -> Optional[float]:
+        """Base-currency value of one unit of ``currency`` on ``day``, or None if there is no rate"""
+        column = self.index.get(normalize_currency(currency))
+        if column is None:
+            return None
+        offset = int(np.clip((np.datetime64(day, "D") - self.start).astype(int), 0, len(self.rates) - 1))
+        value = self.rates[offset, column]
+        return None if np.isnan(value) else float(value)
+
+    def convert(self, amount: float, currency: Any, day: Union[str, date]) -> Optional[float]:
+        rate = self.rate(currency, day)
+        return None if rate is None else round(float(amount) * rate, 2)
+
+    def convert_many(self, amounts: Sequence[float], currencies: Sequence[str],
+                     days: Sequence[Union[str, date]]) -> np.ndarray:
+        """Convert whole columns at once; entries without a rate come back as NaN.
+
+        Currency strings are canonicalized and dates parsed once per distinct
+        value, so the per-row work is a dict lookup, a gather and a multiply.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not len(amounts):
+            return amounts
+        columns = per_distinct(currencies, lambda code: self.index.get(normalize_currency(code), -1))
+        offsets = day_numbers(days) - self.start.astype(np.int64)
+        np.clip(offsets, 0, len(self.rates) - 1, out=offsets)
+        rates = self.rates[offsets, np.maximum(columns, 0)]
+        return np.where(columns >= 0, amounts * rates, np.nan)
+
+    def base_amounts(self, amounts: Sequence[float], currencies: Sequence[str], days: Sequence[Union[str, date]],
+                     recorded: Optional[Sequence[Optional[float]]] = None) -> np.ndarray:
+        """``convert_many``, keeping amounts already recorded in the base currency where there are some"""
+        converted = self.convert_many(amounts, currencies, days)
+        if recorded is None:
+            return converted
+        recorded = np.array(recorded, dtype=np.float64)
+        return np.where(np.isnan(recorded), converted, recorded)
+
+    def total(self, amounts: Sequence[float], currencies: Sequence[str], days: Sequence[Union[str, date]],
+              recorded: Optional[Sequence[Optional[float]]] = None) -> Tuple[float, int]:
+        """Sum in the base currency, and how many amounts had no rate and were left out"""
+        base = self.base_amounts(amounts, currencies, days, recorded)
+        missing = np.isnan(base)
+        return round(float(base[~missing].sum()), 2), int(missing.sum())
+
+    def annotate(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copies of expense dicts with ``base_amount`` set (None when the currency has no rate)"""
+        return [
+            dict(item, base_amount=self.convert(item["amount"], item["currency"], item["date"]))
+            for item in items
+        ]
+
+def per_distinct(values: Sequence[Any], convert) -> np.ndarray:
+    """``convert`` applied to a column as integers, calling it once per distinct value"""
+    converted = {value: convert(value) for value in set(values)}
+    return np.fromiter(map(converted.__getitem__, values), np.int64, len(values))
+
+def day_numbers(days: Sequence[Union[str, date]]) -> np.ndarray:
+    """Days since 1970-01-01 for a column of ISO date strings or dates"""
+    if isinstance(days, np.ndarray) and days.dtype.kind == "M":
+        return days.astype("datetime64[D]").astype(np.int64)
+    # A column spans few days, and parsing each string through numpy is the slow part
+    return per_distinct(days, lambda day: np.datetime64(day, "D").astype(np.int64))
+
+def _fill_gaps(rates: np.ndarray) -> np.ndarray:
+    """Carry each column's last quote forward over missing days, and its first quote back to the start"""
+    missing = np.isnan(rates)
+    days = np.arange(len(rates))[:, None]
+    last = np.maximum.accumulate(np.where(missing, 0, days), axis=0)
+    filled = np.take_along_axis(rates, last, axis=0)
+    first = np.argmax(~missing, axis=0)
+    leading = days < first
+    filled[leading] = np.broadcast_to(rates[first, np.arange(rates.shape[1])], rates.shape)[leading]
+    return filled
@@ -0,0 +1,210 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Minimal in-process metrics with Prometheus text exposition. Metrics are
+# module-level singletons, so any module can import and update them; the
+# HTTP server renders REGISTRY on /metrics.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [
+                f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in sorted(self.values.items())
+            ]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[Tuple[str, ...], List[int]] = {}
+        self.sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-1] += 1
+            self.sums[key] = self.sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        counts = self.counts.get(self._key(labels))
+        return counts[-1] if counts else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            for key in sorted(self.counts):
+                counts = self.counts[key]
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(self.sums[key])}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {counts[-1]}")
+        return lines
+
+class CallbackGauge(Metric):
+    """Gauge (or counter) whose value is read from a callback at scrape time, e.g. a queue depth."""
+
+    def __init__(self, name, help, callback: Callable[[], float], type: str = "gauge"):
+        super().__init__(name, help)
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        try:
+            return [f"{self.name} {_format_value(self.callback())}"]
+        except Exception:
+            return []
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering a name replaces it, so a rebuilt component rebinds its callbacks
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name, help, callback, type="gauge") -> CallbackGauge:
+        return self.register(CallbackGauge(name, help, callback, type))
+
+    def get(self, name) -> Optional[Metric]:
+        return self.metrics.get(name)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+NODE_SECONDS = REGISTRY.histogram(
+    "expense_bot_node_seconds", "Time spent in each LangGraph node", ["node"]
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "expense_bot_llm_seconds", "ChatOpenAI call latency"
+)
+LLM_TOKENS = REGISTRY.counter(
+    "expense_bot_llm_tokens_total", "Tokens used by ChatOpenAI calls", ["kind"]
+)
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "expense_bot_llm_prompt_tokens", "Measured prompt size per request, before it is sent", ["prompt"], buckets=TOKEN_BUCKETS
+)
+LLM_REQUEST_TOKENS = REGISTRY.histogram(
+    "expense_bot_llm_request_tokens", "Tokens reported by the provider per request, over all its model calls", ["prompt"],
+    buckets=TOKEN_BUCKETS
+)
+LLM_OVER_BUDGET = REGISTRY.counter(
+    "expense_bot_llm_over_budget_total", "Requests that used more tokens than PROMPT_TOKEN_BUDGET", ["prompt"]
+)
+LLM_TIER_SECONDS = REGISTRY.histogram(
+    "expense_bot_llm_tier_seconds", "Time spent in each model tier, including validation", ["tier"]
+)
+LLM_TIER_RESULTS = REGISTRY.counter(
+    "expense_bot_llm_tier_results_total", "Model tier results by outcome (accepted or rejected)", ["tier", "outcome"]
+)
+LLM_ESCALATIONS = REGISTRY.counter(
+    "expense_bot_llm_escalations_total", "Results rejected by a tier and passed to the next one", ["tier"]
+)
+MESSAGES = REGISTRY.counter(
+    "expense_bot_messages_total", "Processed messages by the parser that handled them", ["parser"]
+)
+CATEGORIZED = REGISTRY.counter(
+    "expense_bot_categorized_total", "Expenses categorized, by how the category was found", ["source"]
+)
+CORRECTIONS = REGISTRY.counter(
+    "expense_bot_corrections_total", "Applied corrections by how they were handled (patch or llm)", ["parser"]
+)
+SHEETS_APPEND_SECONDS = REGISTRY.histogram(
+    "expense_bot_sheets_append_seconds", "Google Sheets append request latency"
+)
+SHEETS_ROWS = REGISTRY.counter(
+    "expense_bot_sheets_rows_total", "Rows appended to the Actual sheet"
+)
+UPDATE_SECONDS = REGISTRY.histogram(
+    "expense_bot_update_seconds", "Time to handle a Telegram update", ["handler"]
+)
+TELEGRAM_REPLY_SECONDS = REGISTRY.histogram(
+    "expense_bot_telegram_reply_seconds", "Latency of Telegram send/edit calls", ["method"]
+)
+FIRST_FEEDBACK_SECONDS = REGISTRY.histogram(
+    "expense_bot_first_feedback_seconds", "Time from receiving a message to the first reply or preview shown for it"
+)
+QUOTA_WAIT_SECONDS = REGISTRY.histogram(
+    "expense_bot_quota_wait_seconds", "Time spent waiting for API quota", ["bucket"]
+)
+SHARD_UPDATES = REGISTRY.counter(
+    "expense_bot_shard_updates_total", "Updates forwarded by the router to each shard worker", ["shard"]
+)
+DUPLICATE_CONFIRMS = REGISTRY.counter(
+    "expense_bot_duplicate_confirms_total", "Confirms answered from the recent-writes index instead of writing again"
+)
+DUPLICATES_FLAGGED = REGISTRY.counter(
+    "expense_bot_duplicates_flagged_total", "New expenses flagged as matching one recorded recently"
+)
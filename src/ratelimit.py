@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from src.metrics import QUOTA_WAIT_SECONDS
+
+# Lower runs first. Confirmations finish work the user already approved, so they
+# go ahead of new parses; background syncs yield to both.
+PRIORITY_CONFIRM = 0
+PRIORITY_PARSE = 1
+PRIORITY_BACKGROUND = 2
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header given as seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+class TokenBucket:
+    """Refills at ``rate`` tokens per second up to ``capacity``.
+
+    The level may go negative when a caller is charged after the fact (e.g. for
+    actual LLM token usage above its estimate); later callers then wait for
+    the debt to refill.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters: List[Tuple[int, int]] = []
+        self.condition = asyncio.Condition()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost: float, now: Optional[float] = None) -> float:
+        """Seconds until ``cost`` tokens are available and no Retry-After pause is active."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        # A cost above capacity only needs a full bucket, then runs into debt
+        missing = min(cost, self.capacity) - self.tokens
+        if missing > 0:
+            wait = max(wait, missing / self.rate)
+        return wait
+
+    def take(self, cost: float) -> None:
+        self._refill(time.monotonic())
+        self.tokens -= cost
+
+    def pause(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class QuotaScheduler:
+    """Token buckets for external APIs, shared by every caller in the process.
+
+    ``limits`` maps a bucket name to ``(per_minute, burst)``. Callers wait in
+    ``acquire`` until their cost fits, so bursts queue up at the quota ceiling
+    instead of failing. Waiters on a bucket are served by priority, then in
+    arrival order. Unknown bucket names are not limited.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        self.logger = logging.getLogger(__name__)
+        self.buckets = {
+            name: TokenBucket(per_minute / 60.0, burst)
+            for name, (per_minute, burst) in limits.items() if per_minute > 0
+        }
+        self._sequence = itertools.count()
+        self.waited: Dict[str, float] = {name: 0.0 for name in self.buckets}
+
+    def waiting(self, name: str) -> int:
+        bucket = self.buckets.get(name)
+        return len(bucket.waiters) if bucket else 0
+
+    async def acquire(self, name: str, cost: float = 1.0, priority: int = PRIORITY_PARSE) -> float:
+        """Wait until ``cost`` tokens can be taken from the bucket; returns the time spent waiting."""
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return 0.0
+        start = time.monotonic()
+        entry = (priority, next(self._sequence))
+        async with bucket.condition:
+            heapq.heappush(bucket.waiters, entry)
+            # A more urgent waiter may now be at the head
+            bucket.condition.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if bucket.waiters[0] == entry:
+                        timeout = bucket.delay(cost)
+                        if timeout <= 0:
+                            heapq.heappop(bucket.waiters)
+                            bucket.take(cost)
+                            bucket.condition.notify_all()
+                            break
+                    try:
+                        await asyncio.wait_for(bucket.condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in bucket.waiters:
+                    bucket.waiters.remove(entry)
+                    heapq.heapify(bucket.waiters)
+                    bucket.condition.notify_all()
+                raise
+        waited = time.monotonic() - start
+        self.waited[name] += waited
+        QUOTA_WAIT_SECONDS.observe(waited, bucket=name)
+        return waited
+
+    def charge(self, name: str, cost: float) -> None:
+        """Adjust a bucket without waiting, e.g. by actual usage minus what was acquired up front."""
+        bucket = self.buckets.get(name)
+        if bucket is not None:
+            bucket.take(cost)
+            bucket.tokens = min(bucket.tokens, bucket.capacity)
+
+    def pause(self, name: str, seconds: float) -> None:
+        """Hold every caller of a bucket for ``seconds``, e.g. after a 429 with Retry-After."""
+        bucket = self.buckets.get(name)
+        if bucket is not None:
+            self.logger.warning(f"Pausing {name} for {seconds:.1f}s after hitting its quota")
+            bucket.pause(seconds)
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from pydantic import BaseModel
 
 class ExpenseSchema(BaseModel):
@@ -7,3 +8,9 @@ class ExpenseSchema(BaseModel):
     currency: str
     cash: bool
     user: str
+    # Assigned locally by the categorizer, not by the model
+    category: Optional[str] = None
+
+class ExpenseListSchema(BaseModel):
+    """Structured-output schema: every expense mentioned in one message"""
+    expenses: List[ExpenseSchema]
@@ -0,0 +1,65 @@
+"""Fill the base amount column of Actual rows written before it existed.
+
+Usage: python -m src.sheets.backfill [--start-row N] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import math
+from typing import Optional
+from src.sheets.mirror import parse_row
+
+def backfill_base_amounts(sheets_client, fx, start_row: int = 1, dry_run: bool = False) -> int:
+    """Convert every row from ``start_row`` down that has no base amount, in one batch (blocking).
+
+    The column is rewritten in a single update; rows that already have a base
+    amount, and rows that aren't expenses (headers, notes), keep their cell.
+    Returns the number of rows filled in.
+    """
+    logger = logging.getLogger(__name__)
+    rows = sheets_client.read_rows(start_row)
+    parsed = [parse_row(row) for row in rows]
+    missing = [index for index, values in enumerate(parsed) if values is not None and values[7] is None]
+    if not missing:
+        logger.info("Every row already has a base amount")
+        return 0
+    converted = fx.convert_many(
+        [parsed[index][2] for index in missing],
+        [parsed[index][3] for index in missing],
+        [parsed[index][0] for index in missing]
+    )
+    column = [row[7] if len(row) > 7 else "" for row in rows]
+    filled = 0
+    for index, value in zip(missing, converted):
+        if not math.isnan(value):
+            column[index] = round(float(value), 2)
+            filled += 1
+    logger.info(f"Converted {filled} of {len(missing)} rows without a base amount to {fx.base}")
+    if filled and not dry_run:
+        sheets_client.write_base_amounts(start_row, column)
+    return filled
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spreadsheet", default=None, help="Spreadsheet id (default: GOOGLE_SHEETS_ID)")
+    parser.add_argument("--start-row", type=int, default=1, help="First sheet row to convert")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would be filled")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> Optional[int]:
+    from src.config import GOOGLE_SHEETS_ID, BASE_CURRENCY, FX_RATES_PATH
+    from src.currency import FxTable
+    from src.sheets.client import SheetsClient
+    args = parse_args(argv)
+    fx = FxTable.load(FX_RATES_PATH, BASE_CURRENCY)
+    client = SheetsClient(args.spreadsheet or GOOGLE_SHEETS_ID)
+    try:
+        filled = backfill_base_amounts(client, fx, args.start_row, args.dry_run)
+    finally:
+        asyncio.run(client.close())
+    print(f"{'Would fill' if args.dry_run else 'Filled'} {filled} rows")
+    return filled
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,54 +1,135 @@
-import json
+import asyncio
 import logging
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from src.config import GOOGLE_CREDENTIALS
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config import (
+    GOOGLE_CREDENTIALS, SHEETS_BATCH_SIZE, SHEETS_FLUSH_INTERVAL, SHEETS_API_URL, SHEETS_POOL_SIZE,
+    SHEETS_TOKEN_REFRESH_MARGIN
+)
+from src.sheets.writer import BatchWriter
+from src.sheets.transport import SheetsTransport, get_token_provider
+from src.metrics import REGISTRY, SHEETS_APPEND_SECONDS, SHEETS_ROWS
+
+ACTUAL_SHEET = 'Actual'
+# Date, description, amount, currency, cash, user, category, amount in BASE_CURRENCY
+ACTUAL_RANGE = 'Actual!A:H'
+BASE_AMOUNT_COLUMN = 'H'
 
 class SheetsClient:
-    def __init__(self, spreadsheet_id):
+    def __init__(self, spreadsheet_id, batch_size=SHEETS_BATCH_SIZE, flush_interval=SHEETS_FLUSH_INTERVAL, lazy=False,
+                 transport=None, quota=None):
         self.logger = logging.getLogger(__name__)
         self.spreadsheet_id = spreadsheet_id
         self.logger.info("Initializing SheetsClient...")
-        self.service = self.get_sheets_service()
-    
-    def get_sheets_service(self):
-        try:
-            self.logger.info("Loading Google credentials...")
-            credentials_string = GOOGLE_CREDENTIALS.strip()
-            if credentials_string.startswith('"') and credentials_string.endswith('"'):
-                credentials_string = credentials_string[1:-1]
-            if credentials_string.startswith("'") and credentials_string.endswith("'"):
-                credentials_string = credentials_string[1:-1]
-                
-            credentials_info = json.loads(credentials_string)
-            
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON parsing error: {str(e)}")
-            self.logger.error(f"Received GOOGLE_CREDENTIALS: {GOOGLE_CREDENTIALS[:100]}...")
-            raise
-            
-        creds = service_account.Credentials.from_service_account_info(
-            credentials_info,
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
+        self._transport = transport
+        self._transport_lock = threading.Lock()
+        if not lazy and transport is None:
+            self._transport = self.create_transport()
+        self.quota = quota
+        self.writer = BatchWriter(self.append_rows, batch_size=batch_size, flush_interval=flush_interval, quota=quota)
+        # Reads run here, in parallel with the writer's ordered appends
+        self.executor = ThreadPoolExecutor(max_workers=SHEETS_POOL_SIZE, thread_name_prefix="sheets-io")
+        # Called with (rows, response) after every successful append, from the writer thread
+        self.append_listeners = []
+        REGISTRY.gauge_callback(
+            "expense_bot_sheets_queued_rows", "Rows waiting for the next Sheets batch",
+            lambda: self.writer.pending_rows
         )
-        self.logger.info("Google Sheets service initialized.")
-        return build('sheets', 'v4', credentials=creds, cache_discovery=False)
     
-    async def append_expense(self, date, description, amount, currency, cash=False, user='default_user'):
-        """Append expense to Google Sheet"""
-        self.logger.info(f"Appending expense: {date}, {description}, {amount}, {currency}, {cash}, {user}")
-        values = [[date, description, amount, currency, cash, user]]
-        body = {'values': values}
-        range_name = 'Actual!A:F'
+    @property
+    def transport(self):
+        """The Sheets transport, built on first use when the client is lazy."""
+        if self._transport is None:
+            with self._transport_lock:
+                if self._transport is None:
+                    self._transport = self.create_transport()
+        return self._transport
+
+    def create_transport(self):
+        self.logger.info("Loading Google credentials...")
+        token_provider = get_token_provider(GOOGLE_CREDENTIALS, SHEETS_TOKEN_REFRESH_MARGIN)
+        self.logger.info("Google Sheets transport initialized.")
+        return SheetsTransport(token_provider, base_url=SHEETS_API_URL, pool_size=SHEETS_POOL_SIZE)
+    
+    def append_expense(self, date, description, amount, currency, cash=False, user='default_user', category=None,
+                       base_amount=None):
+        """Queue an expense for the next batched append to the Google Sheet.
+
+        Returns an awaitable that resolves once the row's batch is committed.
+        """
+        self.logger.debug(
+            "Queueing expense: %s, %s, %s, %s, %s, %s, %s", date, description, amount, currency, cash, user, category
+        )
+        row = [date, description, amount, currency, cash, user]
+        if category is not None or base_amount is not None:
+            row.append(category or '')
+        if base_amount is not None:
+            row.append(base_amount)
+        return self.writer.submit([row])
+
+    def append_expenses(self, expenses):
+        """Queue several expense dicts as one batch and return an awaitable for their commit."""
+        self.logger.info(f"Queueing {len(expenses)} expenses")
+        rows = [
+            [
+                e['date'], e['description'], e['amount'], e['currency'], e.get('cash', False),
+                e.get('user', 'default_user'), e.get('category') or '',
+                '' if e.get('base_amount') is None else e['base_amount']
+            ]
+            for e in expenses
+        ]
+        return self.writer.submit(rows)
+
+    def append_rows(self, rows):
+        """Append rows to the Actual sheet in a single request.
+
+        This call blocks on the network and is meant to run on the writer's executor.
+        """
         try:
-            # Use execute() directly since it's not an async operation
-            self.service.spreadsheets().values().append(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='USER_ENTERED',
-                body=body
-            ).execute()
-            self.logger.info("Expense appended successfully.")
+            with SHEETS_APPEND_SECONDS.time():
+                result = self.transport.append_values(self.spreadsheet_id, ACTUAL_RANGE, rows)
+            SHEETS_ROWS.inc(len(rows))
+            self.logger.info(f"Appended {len(rows)} rows successfully.")
         except Exception as e:
-            self.logger.error(f"Failed to append expense: {str(e)}")
+            self.logger.error(f"Failed to append rows: {str(e)}")
             raise
+        for listener in self.append_listeners:
+            try:
+                listener(rows, result)
+            except Exception as e:
+                self.logger.error(f"Append listener failed: {str(e)}")
+        return result
+
+    def read_rows(self, start_row=1):
+        """Read Actual sheet rows from ``start_row`` to the end (blocking)."""
+        result = self.transport.get_values(
+            self.spreadsheet_id,
+            f'{ACTUAL_SHEET}!A{start_row}:H',
+            valueRenderOption='UNFORMATTED_VALUE',
+            dateTimeRenderOption='FORMATTED_STRING'
+        )
+        return result.get('values', [])
+
+    def write_base_amounts(self, start_row, values):
+        """Overwrite the base amount column from ``start_row`` down, one value per row (blocking)."""
+        end_row = start_row + len(values) - 1
+        return self.transport.update_values(
+            self.spreadsheet_id,
+            f'{ACTUAL_SHEET}!{BASE_AMOUNT_COLUMN}{start_row}:{BASE_AMOUNT_COLUMN}{end_row}',
+            [[value] for value in values]
+        )
+
+    def run_blocking(self, func, *args):
+        """Run a blocking Sheets call on the I/O pool and return an awaitable.
+
+        The transport is thread-safe, so reads run in parallel with each other and with appends.
+        """
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def close(self):
+        """Flush queued rows before shutdown."""
+        await self.writer.close()
+        # Waits for in-flight reads, which can take a request timeout; not on the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+        if self._transport is not None:
+            self._transport.close()
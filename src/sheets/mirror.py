@@ -0,0 +1,146 @@
+import logging
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Any, List, Optional, Tuple
+
+RANGE_START_RE = re.compile(r"![A-Z]+(\d+)")
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%d/%m/%Y")
+
+def parse_row_date(value: Any) -> Optional[str]:
+    """Normalize a sheet date cell to ISO format, or None if it isn't a date."""
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def parse_base_amount(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+def parse_row(row: List[Any]) -> Optional[Tuple]:
+    """Turn an Actual!A:H row into (date, description, amount, currency, cash, user, category, base_amount),
+    skipping headers and junk. ``base_amount`` is None for rows written without one."""
+    row = list(row) + [""] * (8 - len(row))
+    row_date = parse_row_date(row[0])
+    try:
+        amount = float(str(row[2]).replace(",", ""))
+    except ValueError:
+        return None
+    if row_date is None:
+        return None
+    cash = row[4] is True or str(row[4]).strip().upper() == "TRUE"
+    return (
+        row_date, str(row[1]), amount, str(row[3]).upper(), int(cash), str(row[5]), str(row[6]).strip(),
+        parse_base_amount(row[7])
+    )
+
+class SheetMirror:
+    """Local SQLite copy of the Actual sheet used to answer reports.
+
+    The mirror bootstraps from one full read, then only fetches rows past the
+    last row it has seen. Rows this bot appends are recorded straight from the
+    append response, so reports include them without another read.
+    """
+
+    def __init__(self, path: str, sheets_client):
+        self.logger = logging.getLogger(__name__)
+        self.sheets_client = sheets_client
+        # Appends are recorded from the Sheets writer thread while syncs run on the I/O pool
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS actual (
+                row INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                description TEXT NOT NULL,
+                amount REAL NOT NULL,
+                currency TEXT NOT NULL,
+                cash INTEGER NOT NULL,
+                user TEXT NOT NULL,
+                category TEXT NOT NULL DEFAULT '',
+                base_amount REAL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(actual)")}
+        for column, definition in (("category", "TEXT NOT NULL DEFAULT ''"), ("base_amount", "REAL")):
+            if column not in columns:
+                # Mirror created before this column: add it and re-read the whole sheet to fill it
+                self.conn.execute(f"ALTER TABLE actual ADD COLUMN {column} {definition}")
+                self.conn.execute("DELETE FROM meta WHERE key = 'last_row'")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS actual_date ON actual (date)")
+        sheets_client.append_listeners.append(self.record_append)
+
+    @property
+    def last_row(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_row'").fetchone()
+        return row[0] if row else 0
+
+    def _store(self, first_row: int, rows: List[List[Any]]) -> None:
+        parsed = [(first_row + offset, parse_row(row)) for offset, row in enumerate(rows)]
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO actual (row, date, description, amount, currency, cash, user, category, base_amount) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(row_number,) + values for row_number, values in parsed if values is not None]
+            )
+            last_row = first_row + len(rows) - 1
+            if first_row <= self.last_row + 1 and last_row > self.last_row:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_row', ?)", (last_row,))
+
+    def sync(self, sheets_client=None) -> int:
+        """Fetch rows appended since the last sync (blocking). Bootstraps with a full read on first use.
+
+        On a worker thread, pass the client resolved on the event loop: a
+        ``SpreadsheetHandle`` looks it up in the client cache, which isn't thread-safe.
+        """
+        start_row = self.last_row + 1
+        rows = (sheets_client or self.sheets_client).read_rows(start_row)
+        if rows:
+            with self.lock:
+                self._store(start_row, rows)
+        self.logger.info(f"Mirror synced {len(rows)} rows starting at row {start_row}")
+        return len(rows)
+
+    def record_append(self, rows: List[List[Any]], response: Optional[dict]) -> None:
+        """Record rows we appended, using the range reported by the append response."""
+        updated_range = ((response or {}).get("updates") or {}).get("updatedRange", "")
+        match = RANGE_START_RE.search(updated_range)
+        if not match:
+            return
+        with self.lock:
+            self._store(int(match.group(1)), rows)
+
+    def totals(self, start: date, end: date, by_user: bool = False, by_category: bool = False) -> List[Tuple]:
+        """Sum amounts per currency (and per user or category) for dates in [start, end]."""
+        group = "user, currency" if by_user else "category, currency" if by_category else "currency"
+        return self.conn.execute(
+            f"SELECT {group}, SUM(amount), COUNT(*) FROM actual WHERE date BETWEEN ? AND ? "
+            f"GROUP BY {group} ORDER BY {group}",
+            (start.isoformat(), end.isoformat())
+        ).fetchall()
+
+    def amounts(self, start: date, end: date) -> List[Tuple[str, float, str, Optional[float]]]:
+        """(date, amount, currency, base_amount) of every row dated in [start, end], for converting in one batch."""
+        return self.conn.execute(
+            "SELECT date, amount, currency, base_amount FROM actual WHERE date BETWEEN ? AND ? ORDER BY row",
+            (start.isoformat(), end.isoformat())
+        ).fetchall()
+
+    def labeled_rows(self) -> List[Tuple[str, str]]:
+        """(description, category) of every row that has a category, oldest first."""
+        return self.conn.execute(
+            "SELECT description, category FROM actual WHERE category != '' ORDER BY row"
+        ).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+from src.tenants import DEFAULT_TENANT_ID, tenant_path
+
+class OutboxEntry(NamedTuple):
+    id: int
+    key: str
+    expense: Dict[str, Any]
+    attempts: int
+
+class Outbox:
+    """SQLite WAL journal of confirmed expenses that still have to reach Sheets.
+
+    Every entry carries an idempotency key, so enqueueing the same confirmation
+    twice stores it once. Entries stay in the journal until the sync worker
+    marks them as sent, which lets a restarted bot replay anything it missed.
+    Entries the API keeps rejecting are set aside as dead letters, so they
+    don't block the ones behind them.
+    """
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.listeners: List[Callable[[], None]] = []
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                expense TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                sent_at REAL,
+                dead_at REAL
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+        if "dead_at" not in columns:
+            self.conn.execute("ALTER TABLE outbox ADD COLUMN dead_at REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_unsent ON outbox (id) WHERE sent_at IS NULL")
+        self.logger.info(f"Outbox opened at {path} with {self.pending_count()} unsent entries")
+
+    def enqueue(self, key: str, expense: Dict[str, Any]) -> bool:
+        """Durably record a confirmed expense. Returns False if the key was already recorded."""
+        return self.enqueue_many([(key, expense)]) == 1
+
+    def enqueue_many(self, entries: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Record several expenses in one transaction and return how many were new."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            inserted = sum(
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO outbox (key, expense, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(expense), now)
+                ).rowcount
+                for key, expense in entries
+            )
+        if inserted:
+            for listener in self.listeners:
+                listener()
+        return inserted
+
+    def pending(self, limit: int = 100) -> List[OutboxEntry]:
+        """Return unsent entries in the order they were confirmed."""
+        rows = self.conn.execute(
+            "SELECT id, key, expense, attempts FROM outbox WHERE sent_at IS NULL AND dead_at IS NULL ORDER BY id LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [OutboxEntry(row[0], row[1], json.loads(row[2]), row[3]) for row in rows]
+
+    def pending_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL AND dead_at IS NULL").fetchone()[0]
+
+    def dead_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE dead_at IS NOT NULL").fetchone()[0]
+
+    def mark_sent(self, ids: List[int]) -> None:
+        self.conn.executemany(
+            "UPDATE outbox SET sent_at = ?, last_error = NULL WHERE id = ?",
+            [(time.time(), entry_id) for entry_id in ids]
+        )
+
+    def mark_failed(self, ids: List[int], error: str) -> None:
+        self.conn.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+            [(error, entry_id) for entry_id in ids]
+        )
+
+    def mark_dead(self, ids: List[int]) -> None:
+        """Stop retrying entries; they stay in the journal with their last error"""
+        self.conn.executemany("UPDATE outbox SET dead_at = ? WHERE id = ?", [(time.time(), entry_id) for entry_id in ids])
+
+    def requeue_dead(self) -> int:
+        """Retry every dead letter, e.g. after fixing the sheet; returns how many were requeued"""
+        count = self.conn.execute("UPDATE outbox SET dead_at = NULL, attempts = 0 WHERE dead_at IS NOT NULL").rowcount
+        if count:
+            for listener in self.listeners:
+                listener()
+        return count
+
+    def purge_sent(self, max_age: float) -> int:
+        """Drop sent entries older than ``max_age`` seconds and return how many were removed."""
+        cursor = self.conn.execute(
+            "DELETE FROM outbox WHERE sent_at IS NOT NULL AND sent_at < ?",
+            (time.time() - max_age,)
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.conn.close()
+
+def is_rejected(error: Exception) -> bool:
+    """Whether the API refused the values sent (a 400), as opposed to the sheet or the connection failing.
+
+    A 403 or 404 means the spreadsheet or its tab can't be reached, which
+    holds for every entry alike, so those are retried like any other outage.
+    """
+    return getattr(error, "status", None) == 400
+
+class OutboxWorker:
+    """Drains the outbox to Sheets in the background with exponential backoff.
+
+    A batch the API rejects is split until the entries causing it are isolated.
+    An entry only counts as rejected when the rest of its batch went through,
+    or when it was sent on its own; one rejected ``max_attempts`` times
+    becomes a dead letter. If every part of a batch is rejected, the sheet
+    itself is at fault and the whole batch is retried with backoff.
+    """
+
+    def __init__(self, outbox: Outbox, sheets_client, batch_size: int = 50,
+                 base_delay: float = 1.0, max_delay: float = 300.0, retention: float = 7 * 24 * 3600,
+                 max_attempts: int = 5):
+        self.logger = logging.getLogger(__name__)
+        self.outbox = outbox
+        self.max_attempts = max_attempts
+        self.sheets_client = sheets_client
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retention = retention
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task = None
+        outbox.listeners.append(self.notify)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Start syncing, replaying anything left over from a previous run."""
+        if self._task is None:
+            # Sent entries are only kept around to reject duplicate keys
+            purged = self.outbox.purge_sent(self.retention)
+            self.logger.info(f"Starting outbox worker with {self.outbox.pending_count()} entries to replay, purged {purged}")
+            self._wakeup.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        delay = self.base_delay
+        while not self._stopping.is_set():
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                await self.drain()
+                delay = self.base_delay
+            except Exception as e:
+                self.logger.warning(f"Outbox sync failed, retrying in {delay:.1f}s: {str(e)}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay * random.uniform(0.8, 1.2))
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, self.max_delay)
+                self._wakeup.set()
+
+    async def drain(self) -> int:
+        """Write all unsent entries to Sheets and return how many were sent."""
+        sent = 0
+        while True:
+            entries = self.outbox.pending(self.batch_size)
+            if not entries:
+                return sent
+            sent += await self._write(entries)
+
+    async def _write(self, entries: List[OutboxEntry]) -> int:
+        """Append entries in order and return how many were sent"""
+        try:
+            await self.sheets_client.append_expenses([entry.expense for entry in entries])
+        except Exception as e:
+            if not is_rejected(e):
+                self.outbox.mark_failed([entry.id for entry in entries], str(e))
+                raise
+            if len(entries) == 1:
+                sent, rejected = 0, [(entries[0], e)]
+            else:
+                sent, rejected = await self._bisect(entries)
+                if not sent:
+                    self.outbox.mark_failed([entry.id for entry in entries], str(e))
+                    raise
+            if not all([self._reject(entry, error) for entry, error in rejected]):
+                raise rejected[0][1]
+            return sent
+        self.outbox.mark_sent([entry.id for entry in entries])
+        self.logger.info(f"Synced {len(entries)} outbox entries to Sheets")
+        return len(entries)
+
+    async def _bisect(self, entries: List[OutboxEntry]) -> Tuple[int, List[Tuple[OutboxEntry, Exception]]]:
+        """Write halves of a rejected batch; returns how many were sent and the entries still rejected"""
+        if len(entries) == 1:
+            try:
+                await self.sheets_client.append_expenses([entries[0].expense])
+            except Exception as e:
+                if not is_rejected(e):
+                    self.outbox.mark_failed([entries[0].id], str(e))
+                    raise
+                return 0, [(entries[0], e)]
+            self.outbox.mark_sent([entries[0].id])
+            return 1, []
+        middle = len(entries) // 2
+        sent, rejected = await self._bisect(entries[:middle])
+        more_sent, more_rejected = await self._bisect(entries[middle:])
+        return sent + more_sent, rejected + more_rejected
+
+    def _reject(self, entry: OutboxEntry, error: Exception) -> bool:
+        """Count a rejection against one entry; returns whether it became a dead letter"""
+        self.outbox.mark_failed([entry.id], str(error))
+        if entry.attempts + 1 < self.max_attempts:
+            self.logger.warning(f"Sheets rejected outbox entry {entry.key} ({entry.attempts + 1} attempts): {str(error)}")
+            return False
+        self.outbox.mark_dead([entry.id])
+        self.logger.error(
+            f"Gave up on outbox entry {entry.key} after {entry.attempts + 1} attempts: {str(error)}; "
+            f"moved to dead letters ({entry.expense})"
+        )
+        return True
+
+    async def stop(self) -> None:
+        """Stop the worker after one last attempt to drain the outbox."""
+        if self._task is not None:
+            # Let an in-flight batch finish so it is marked as sent and not replayed.
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        try:
+            await self.drain()
+        except Exception as e:
+            self.logger.warning(f"Leaving {self.outbox.pending_count()} entries in outbox: {str(e)}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Retry the outbox entries Sheets kept rejecting")
+    parser.add_argument("command", choices=["requeue"])
+    parser.add_argument("--household", default=DEFAULT_TENANT_ID, help="Household id (default: the GOOGLE_SHEETS_ID one)")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    """``python -m src.sheets.outbox requeue [--household ID]``, e.g. after fixing the sheet"""
+    from src.config import OUTBOX_PATH
+    args = parse_args(argv)
+    outbox = Outbox(tenant_path(OUTBOX_PATH, args.household))
+    try:
+        count = outbox.requeue_dead()
+    finally:
+        outbox.close()
+    print(f"Requeued {count} dead letters")
+    return count
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
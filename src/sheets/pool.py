@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, Set
+from src.metrics import REGISTRY
+
+class SheetsClientCache:
+    """Open ``SheetsClient``s keyed by spreadsheet id, at most ``max_size`` at a time.
+
+    Each client owns a batch writer thread, an I/O pool and a connection pool,
+    so with many households only the recently used ones are kept open. The
+    least recently used client is evicted and closed in the background, which
+    flushes its queued rows first. Append listeners are kept per spreadsheet
+    and handed to every client built for it, so a mirror stays attached
+    across evictions.
+    """
+
+    def __init__(self, factory: Callable[[str], object], max_size: int = 32):
+        self.logger = logging.getLogger(__name__)
+        self.factory = factory
+        self.max_size = max_size
+        self.clients: "OrderedDict[str, object]" = OrderedDict()
+        self.listeners: Dict[str, List[Callable]] = defaultdict(list)
+        self.evictions = 0
+        self._closing: Set[asyncio.Task] = set()
+        REGISTRY.gauge_callback(
+            "expense_bot_sheets_clients_open", "Sheets clients currently open",
+            lambda: len(self.clients)
+        )
+        REGISTRY.gauge_callback(
+            "expense_bot_sheets_client_evictions_total", "Sheets clients closed to make room for another spreadsheet",
+            lambda: self.evictions, type="counter"
+        )
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def get(self, spreadsheet_id: str):
+        client = self.clients.get(spreadsheet_id)
+        if client is not None:
+            self.clients.move_to_end(spreadsheet_id)
+            return client
+        client = self.factory(spreadsheet_id)
+        client.append_listeners = self.listeners[spreadsheet_id]
+        self.clients[spreadsheet_id] = client
+        # Each client registers its own queue gauge; report the total over all open clients instead
+        REGISTRY.gauge_callback(
+            "expense_bot_sheets_queued_rows", "Rows waiting for the next Sheets batch",
+            lambda: sum(client.writer.pending_rows for client in list(self.clients.values()))
+        )
+        self._evict()
+        return client
+
+    def handle(self, spreadsheet_id: str) -> "SpreadsheetHandle":
+        return SpreadsheetHandle(self, spreadsheet_id)
+
+    def _evict(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Closing flushes through the event loop; evict on the next call from inside it
+            return
+        while len(self.clients) > self.max_size:
+            spreadsheet_id, client = self.clients.popitem(last=False)
+            self.evictions += 1
+            self.logger.info(f"Closing Sheets client for {spreadsheet_id} (least recently used)")
+            task = loop.create_task(client.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def close(self) -> None:
+        """Flush and close every open client."""
+        clients = list(self.clients.values())
+        self.clients.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                self.logger.error(f"Failed to close Sheets client: {str(e)}")
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+class SpreadsheetHandle:
+    """Stands in for the ``SheetsClient`` of one spreadsheet, fetching it from the cache on every use.
+
+    Long-lived owners (outbox worker, mirror, agent) hold a handle rather than
+    a client, so they never keep an evicted client alive.
+    """
+
+    def __init__(self, cache: SheetsClientCache, spreadsheet_id: str):
+        self.cache = cache
+        self.spreadsheet_id = spreadsheet_id
+        self.append_listeners = cache.listeners[spreadsheet_id]
+
+    @property
+    def client(self):
+        return self.cache.get(self.spreadsheet_id)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def close(self) -> None:
+        # The cache owns the client's lifetime
+        return None
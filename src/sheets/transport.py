@@ -0,0 +1,177 @@
+import functools
+import json
+import logging
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+from src.ratelimit import parse_retry_after
+
+SHEETS_SCOPES = ('https://www.googleapis.com/auth/spreadsheets',)
+DEFAULT_BASE_URL = 'https://sheets.googleapis.com/v4'
+
+class SheetsApiError(Exception):
+    """A Sheets API request failed with an HTTP error status."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Sheets API error {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_credentials_string(raw: str) -> Dict[str, Any]:
+    """Parse service account JSON from an env var, tolerating surrounding quotes."""
+    logger = logging.getLogger(__name__)
+    credentials_string = raw.strip()
+    if credentials_string.startswith('"') and credentials_string.endswith('"'):
+        credentials_string = credentials_string[1:-1]
+    if credentials_string.startswith("'") and credentials_string.endswith("'"):
+        credentials_string = credentials_string[1:-1]
+    try:
+        return json.loads(credentials_string)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parsing error: {str(e)}")
+        logger.error(f"Received GOOGLE_CREDENTIALS: {raw[:100]}...")
+        raise
+
+class TokenProvider:
+    """Caches an OAuth access token and refreshes it ahead of expiry.
+
+    After each refresh a timer schedules the next one ``refresh_margin``
+    seconds before the token expires, so requests normally find a valid
+    token. A request only waits for a refresh when there is no usable token
+    at all, e.g. on first use.
+    """
+
+    def __init__(self, credentials, refresh_margin: float = 300.0):
+        self.logger = logging.getLogger(__name__)
+        self.credentials = credentials
+        self.refresh_margin = refresh_margin
+        self.lock = threading.Lock()
+        self.timer: Optional[threading.Timer] = None
+        self.refreshes = 0
+
+    def seconds_left(self) -> float:
+        """Seconds until the cached token expires; 0 when there is none."""
+        if not self.credentials.token:
+            return 0.0
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return float("inf")
+        # google-auth keeps expiry as naive UTC
+        return expiry.replace(tzinfo=timezone.utc).timestamp() - time.time()
+
+    def token(self) -> str:
+        if self.seconds_left() <= 0:
+            self.refresh(force=False)
+        return self.credentials.token
+
+    def refresh(self, force: bool = True) -> None:
+        """Fetch a new token (blocking) and schedule the next refresh."""
+        with self.lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not force and self.seconds_left() > 0:
+                return
+            from google.auth.transport.requests import Request
+            self.credentials.refresh(Request())
+            self.refreshes += 1
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+        delay = self.seconds_left() - self.refresh_margin
+        if delay == float("inf"):
+            return
+        self.timer = threading.Timer(max(delay, 1.0), self._refresh_ahead)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _refresh_ahead(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            # The next request will refresh inline once the token is actually gone
+            self.logger.warning(f"Background token refresh failed: {str(e)}")
+
+    def close(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+@functools.lru_cache(maxsize=None)
+def get_token_provider(raw_credentials: str, refresh_margin: float = 300.0) -> TokenProvider:
+    """Token provider for a service account JSON string, parsed once per process."""
+    from google.oauth2 import service_account
+    credentials = service_account.Credentials.from_service_account_info(
+        parse_credentials_string(raw_credentials),
+        scopes=list(SHEETS_SCOPES)
+    )
+    return TokenProvider(credentials, refresh_margin)
+
+class SheetsTransport:
+    """Minimal Sheets REST client over a pooled keep-alive ``requests`` session.
+
+    Unlike the httplib2-based discovery service, one transport can be shared
+    by any number of threads: requests draws connections from a thread-safe
+    urllib3 pool and carries no per-request state on the session. Point
+    ``base_url`` at a local fake server to test without Google.
+    """
+
+    def __init__(self, token_provider: Optional[TokenProvider] = None, base_url: str = DEFAULT_BASE_URL,
+                 pool_size: int = 8, timeout: float = 30.0):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.token_provider = token_provider
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _headers(self) -> Dict[str, str]:
+        if self.token_provider is None:
+            return {}
+        return {'Authorization': f'Bearer {self.token_provider.token()}'}
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = f"{self.base_url}{path}"
+        response = self.session.request(method, url, params=params, json=body, headers=self._headers(), timeout=self.timeout)
+        if response.status_code == 401 and self.token_provider is not None:
+            # Token revoked or clock skew: refresh once and retry
+            self.token_provider.refresh()
+            response = self.session.request(method, url, params=params, json=body, headers=self._headers(), timeout=self.timeout)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('error', {}).get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise SheetsApiError(response.status_code, message, parse_retry_after(response.headers.get('Retry-After')))
+        return response.json() if response.content else {}
+
+    def append_values(self, spreadsheet_id: str, range: str, rows: List[List[Any]],
+                      value_input_option: str = 'USER_ENTERED') -> Dict[str, Any]:
+        return self.request(
+            'POST',
+            f"/spreadsheets/{spreadsheet_id}/values/{quote(range)}:append",
+            params={'valueInputOption': value_input_option},
+            body={'values': rows}
+        )
+
+    def update_values(self, spreadsheet_id: str, range: str, rows: List[List[Any]],
+                      value_input_option: str = 'USER_ENTERED') -> Dict[str, Any]:
+        return self.request(
+            'PUT',
+            f"/spreadsheets/{spreadsheet_id}/values/{quote(range)}",
+            params={'valueInputOption': value_input_option},
+            body={'values': rows}
+        )
+
+    def get_values(self, spreadsheet_id: str, range: str, **params) -> Dict[str, Any]:
+        return self.request('GET', f"/spreadsheets/{spreadsheet_id}/values/{quote(range)}", params=params)
+
+    def close(self) -> None:
+        self.session.close()
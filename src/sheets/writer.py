@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+from src.ratelimit import PRIORITY_CONFIRM
+
+class BatchWriter:
+    """Buffers rows from all chats and writes them to Sheets in batches.
+
+    Rows are flushed with a single ``write_rows`` call once ``batch_size`` rows
+    are waiting or ``flush_interval`` seconds after the first buffered row.
+    The blocking call runs on a dedicated single-thread executor, so the event
+    loop never waits on Sheets I/O and batches are committed in order.
+
+    With a ``quota`` scheduler every write first takes a token from its
+    ``sheets_write`` bucket, and a write rejected for quota (429/503) pauses
+    the bucket for the server's Retry-After and is retried instead of failing.
+    """
+
+    def __init__(self, write_rows: Callable[[List[list]], Any], batch_size: int = 50, flush_interval: float = 1.0,
+                 quota=None, max_retries: int = 3):
+        self.logger = logging.getLogger(__name__)
+        self.write_rows = write_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.quota = quota
+        self.max_retries = max_retries
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-writer")
+        self._buffer: List[Tuple[List[list], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes = set()
+
+    @property
+    def pending_rows(self) -> int:
+        return sum(len(rows) for rows, _ in self._buffer)
+
+    def submit(self, rows: List[list]) -> asyncio.Future:
+        """Queue rows for the next batch.
+
+        Returns a future that resolves to the Sheets response once the batch
+        containing these rows has been committed, or fails with its error.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._buffer.append((rows, future))
+
+        if self.pending_rows >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._start_flush)
+        return future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[List[list], asyncio.Future]]) -> None:
+        rows = [row for batch_rows, _ in batch for row in batch_rows]
+        self.logger.info(f"Flushing {len(rows)} rows from {len(batch)} requests to Sheets")
+        try:
+            result = await self._write(rows)
+        except Exception as e:
+            self.logger.error(f"Batch write failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _write(self, rows: List[list]) -> Any:
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            if self.quota is not None:
+                await self.quota.acquire("sheets_write", priority=PRIORITY_CONFIRM)
+            try:
+                return await loop.run_in_executor(self.executor, self.write_rows, rows)
+            except Exception as e:
+                if self.quota is None or getattr(e, "status", None) not in (429, 503) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                retry_after = getattr(e, "retry_after", None)
+                self.quota.pause("sheets_write", retry_after if retry_after is not None else 2 ** attempt)
+
+    async def flush(self) -> None:
+        """Write everything buffered so far and wait for in-flight batches."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Flush remaining rows and shut down the executor."""
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+DEFAULT_TENANT_ID = "default"
+
+class Tenant(NamedTuple):
+    """A household: its spreadsheet, its two members and the chats it is served in."""
+    id: str
+    spreadsheet_id: Optional[str]
+    his_id: Optional[str] = None
+    her_id: Optional[str] = None
+    chats: Tuple[int, ...] = ()
+
+def shard_for(tenant_id: str, shards: int) -> int:
+    """Worker process that owns a tenant; stable across restarts and processes, unlike hash()."""
+    return zlib.crc32(tenant_id.encode()) % shards if shards > 1 else 0
+
+def tenant_path(path: str, tenant_id: str) -> str:
+    """Per-tenant variant of a database path, e.g. outbox.db -> outbox.smiths.db. The default tenant keeps the path."""
+    if tenant_id == DEFAULT_TENANT_ID:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{tenant_id}{ext}"
+
+class TenantRegistry:
+    """Maps chat ids to tenants.
+
+    Chats not listed by any tenant go to ``default``, if there is one; this is
+    how a single-household deployment configured only through
+    ``GOOGLE_SHEETS_ID``/``HIS_TG_ID``/``HER_TG_ID`` keeps working.
+    """
+
+    def __init__(self, tenants: List[Tenant], default: Optional[Tenant] = None):
+        self.logger = logging.getLogger(__name__)
+        self.default = default
+        self.tenants: Dict[str, Tenant] = {}
+        self.chats: Dict[int, Tenant] = {}
+        for tenant in ([default] if default else []) + list(tenants):
+            if tenant.id in self.tenants and tenant is not default:
+                raise ValueError(f"Duplicate tenant id {tenant.id!r}")
+            self.tenants[tenant.id] = tenant
+            for chat_id in tenant.chats:
+                if chat_id in self.chats and self.chats[chat_id].id != tenant.id:
+                    raise ValueError(f"Chat {chat_id} belongs to both {self.chats[chat_id].id!r} and {tenant.id!r}")
+                self.chats[chat_id] = tenant
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(self.tenants.values())
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+    def get(self, tenant_id: str) -> Optional[Tenant]:
+        return self.tenants.get(tenant_id)
+
+    def for_chat(self, chat_id: Optional[int]) -> Optional[Tenant]:
+        if chat_id is None:
+            return self.default
+        return self.chats.get(chat_id, self.default)
+
+    @staticmethod
+    def parse(data: Dict) -> List[Tenant]:
+        """Tenants from ``{"households": [{"id", "spreadsheet_id", "his_id", "her_id", "chats"}]}``.
+
+        ``chats`` defaults to the members' private chats, whose ids are their user ids.
+        """
+        tenants = []
+        for entry in data.get("households", []):
+            his_id = str(entry["his_id"]) if entry.get("his_id") else None
+            her_id = str(entry["her_id"]) if entry.get("her_id") else None
+            chats = entry.get("chats") or [member for member in (his_id, her_id) if member]
+            tenants.append(Tenant(
+                id=str(entry["id"]),
+                spreadsheet_id=entry["spreadsheet_id"],
+                his_id=his_id,
+                her_id=her_id,
+                chats=tuple(int(chat) for chat in chats)
+            ))
+        return tenants
+
+    @classmethod
+    def load(cls, path: Optional[str], default: Optional[Tenant] = None) -> "TenantRegistry":
+        tenants = []
+        if path:
+            with open(path) as f:
+                tenants = cls.parse(json.load(f))
+        registry = cls(tenants, default)
+        registry.logger.info(
+            f"Loaded {len(tenants)} households" + (" plus the default household" if default else "")
+        )
+        return registry
+
+    @classmethod
+    def from_config(cls) -> "TenantRegistry":
+        from src.config import TENANTS_PATH, GOOGLE_SHEETS_ID, HIS_TG_ID, HER_TG_ID
+        default = None
+        if GOOGLE_SHEETS_ID or not TENANTS_PATH:
+            default = Tenant(DEFAULT_TENANT_ID, GOOGLE_SHEETS_ID, HIS_TG_ID, HER_TG_ID)
+        return cls.load(TENANTS_PATH, default)
@@ -0,0 +1,275 @@
+import json
+from datetime import date
+import httpx
+import openai
+import pytest
+from unittest.mock import MagicMock, patch
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from src.agent.main import ExpenseTrackingAgent, make_tier
+from src.agent.prompts import PARSE_PROMPT
+from src.currency import FxTable
+from src.metrics import LLM_ESCALATIONS, LLM_SECONDS, LLM_TIER_RESULTS, MESSAGES, NODE_SECONDS
+from src.ratelimit import QuotaScheduler
+
+def llm_reply(*items):
+    return json.dumps({"expenses": list(items)})
+
+ITEM = {
+    "date": "2024-01-01",
+    "description": "Groceries",
+    "amount": 300,
+    "currency": "THB",
+    "cash": False,
+    "user": "42"
+}
+
+@pytest.fixture
+@patch('src.agent.main.ChatOpenAI')
+def agent(mock_chat_openai):
+    return ExpenseTrackingAgent(MagicMock())
+
+@pytest.mark.asyncio
+async def test_fast_path_skips_llm(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[]))]
+    result = await agent.process_message("coffee 80 cash", user="42")
+
+    assert result["parser"] == "fast_path"
+    assert result["items"][0]["description"] == "Coffee"
+    assert agent.parser_stats["fast_path"] == 1
+
+@pytest.mark.asyncio
+async def test_expenses_are_categorized_locally(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[]))]
+    result = await agent.process_message("taxi 150 cash", user="42")
+
+    assert result["items"][0]["category"] == "Transport"
+    assert "Transport" in result["summary"]
+
+@pytest.mark.asyncio
+async def test_llm_extracts_multiple_expenses_in_one_call(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[
+        llm_reply(ITEM, dict(ITEM, description="Pharmacy", amount=120))
+    ]))]
+    result = await agent.process_message("groceries at the market 300 and then pharmacy for 120", user="42")
+
+    assert result["parser"] == "llm"
+    assert [item["description"] for item in result["items"]] == ["Groceries", "Pharmacy"]
+    assert result["selected"] == [True, True]
+
+@pytest.mark.asyncio
+async def test_streaming_reports_partial_expenses(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[llm_reply(ITEM)]))]
+    progress = []
+
+    result = await agent.process_message("spent 300 on groceries at the floating market", user="42",
+                                         on_progress=progress.append)
+
+    assert result["items"][0]["description"] == "Groceries"
+    assert progress[0] == []
+    # Fields appear as they stream in
+    assert "amount" not in progress[1][0]
+    assert progress[-1][0]["description"] == "Groceries"
+
+@pytest.mark.asyncio
+async def test_streamed_reply_wrapped_in_prose_is_accepted(agent):
+    fenced = f"Here are the expenses:\n```json\n{llm_reply(ITEM)}\n```"
+    agent.tiers = [
+        make_tier("cheap", FakeListChatModel(responses=[fenced])),
+        make_tier("strong", FakeListChatModel(responses=[])),
+    ]
+    result = await agent.process_message("spent 300 on groceries at the night market", user="42",
+                                         on_progress=lambda items: None)
+    assert result["model"] == "cheap"
+
+    agent.tiers = [make_tier("cheap", FakeListChatModel(responses=[f"Sure! {llm_reply(ITEM)} Anything else?"]))]
+    result = await agent.process_message("spent 300 on groceries at the flower market", user="42",
+                                         on_progress=lambda items: None)
+    assert result["items"][0]["description"] == "Groceries"
+
+def test_openai_tiers_stream_in_json_mode():
+    from langchain_openai import ChatOpenAI
+    tier = make_tier("gpt-4o-mini", ChatOpenAI(model="gpt-4o-mini", api_key="test"))
+    assert tier.structured
+    assert tier.streaming.kwargs == {"response_format": {"type": "json_object"}}
+
+@pytest.mark.asyncio
+async def test_fast_path_reports_no_progress(agent):
+    progress = []
+    await agent.process_message("coffee 80 cash", user="42", on_progress=progress.append)
+    assert progress == []
+
+@pytest.mark.asyncio
+async def test_repeated_message_hits_cache(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[llm_reply(ITEM)]))]
+    message = "spent 300 on groceries at the big market"
+    await agent.process_message(message, user="42")
+    result = await agent.process_message(message, user="42")
+
+    assert result["parser"] == "cache"
+    assert agent.extraction_cache.hits == 1
+
+@pytest.mark.asyncio
+async def test_llm_path_records_metrics(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[llm_reply(ITEM)]))]
+    llm_calls = LLM_SECONDS.count()
+    parse_nodes = NODE_SECONDS.count(node="parse_expense")
+    llm_messages = MESSAGES.get(parser="llm")
+
+    await agent.process_message("spent 300 on groceries at the night market", user="42")
+
+    assert LLM_SECONDS.count() == llm_calls + 1
+    assert NODE_SECONDS.count(node="parse_expense") == parse_nodes + 1
+    assert MESSAGES.get(parser="llm") == llm_messages + 1
+
+@pytest.mark.asyncio
+async def test_invalid_cheap_output_escalates_to_next_tier(agent):
+    cheap = FakeListChatModel(responses=[llm_reply(dict(ITEM, amount=-300, currency="XYZ"))])
+    strong = FakeListChatModel(responses=[llm_reply(ITEM)])
+    agent.tiers = [make_tier("cheap", cheap), make_tier("strong", strong)]
+    escalations = LLM_ESCALATIONS.get(tier="cheap")
+    accepted = LLM_TIER_RESULTS.get(tier="strong", outcome="accepted")
+
+    result = await agent.process_message("spent 300 on groceries at the weekend market", user="42")
+
+    assert result["items"][0]["amount"] == 300
+    assert result["model"] == "strong"
+    assert LLM_ESCALATIONS.get(tier="cheap") == escalations + 1
+    assert LLM_TIER_RESULTS.get(tier="strong", outcome="accepted") == accepted + 1
+    assert agent.escalation_rate == 1.0
+
+@pytest.mark.asyncio
+async def test_valid_cheap_output_is_not_escalated(agent):
+    strong = MagicMock()
+    agent.tiers = [
+        make_tier("cheap", FakeListChatModel(responses=[llm_reply(dict(ITEM, currency="baht"))])),
+        make_tier("strong", strong)
+    ]
+
+    result = await agent.process_message("spent 300 on groceries at the flower market", user="42")
+
+    assert result["model"] == "cheap"
+    assert result["items"][0]["currency"] == "THB"
+    assert agent.escalation_rate == 0.0
+    strong.ainvoke.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_rate_limited_llm_call_waits_and_retries(agent):
+    agent.quota = QuotaScheduler({"openai_requests": (6000, 10), "openai_tokens": (600000, 10000)})
+    replies = [
+        openai.RateLimitError(
+            "Rate limit reached",
+            response=httpx.Response(429, headers={"retry-after": "0.05"}, request=httpx.Request("POST", "https://api.openai.com")),
+            body=None
+        ),
+        llm_reply(ITEM),
+    ]
+
+    def llm(prompt):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    agent.tiers = [make_tier("fake", RunnableLambda(llm))]
+    result = await agent.process_message("spent 300 on groceries at the corner shop", user="42")
+
+    assert result["items"][0]["description"] == "Groceries"
+    assert replies == []
+
+@pytest.mark.asyncio
+async def test_short_correction_is_patched_without_llm(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[]))]
+    pending = {"key": "abc", "items": [ITEM], "selected": [True], "summary": ""}
+
+    result = await agent.process_correction(pending, "actually 150, card", user="42")
+
+    assert result["parser"] == "patch"
+    assert result["key"] == "abc"
+    assert result["items"] == [dict(ITEM, amount=150.0)]
+    assert "150.0" in result["summary"]
+
+@pytest.mark.asyncio
+async def test_free_form_correction_sends_records_and_delta_to_llm(agent):
+    prompts = []
+
+    def llm(prompt):
+        prompts.append(prompt.to_string())
+        return json.dumps({"changes": [{"index": 1, "description": "Pharmacy", "amount": 95}]})
+
+    agent.tiers = [make_tier("fake", RunnableLambda(llm))]
+    pending = {"key": "abc", "items": [ITEM, dict(ITEM, description="Drugstore")], "selected": [True, False], "summary": ""}
+
+    result = await agent.process_correction(pending, "the second one was the pharmacy, 95", user="42")
+
+    assert result["parser"] == "llm"
+    # The renamed item is re-categorized
+    assert result["items"] == [ITEM, dict(ITEM, description="Pharmacy", amount=95.0, category="Health")]
+    assert result["selected"] == [True, False]
+    assert '"description": "Drugstore"' in prompts[0]
+    assert "the second one was the pharmacy, 95" in prompts[0]
+
+@pytest.mark.asyncio
+async def test_relative_dates_are_resolved_before_the_llm_call(agent):
+    prompts = []
+
+    def llm(prompt):
+        prompts.append(prompt.to_messages())
+        return llm_reply(dict(ITEM, date="2024-05-03"))
+
+    agent.tiers = [make_tier("fake", RunnableLambda(llm))]
+    with patch("src.agent.main.local_today", return_value=date(2024, 5, 10)):
+        await agent.process_message("dinner with friends 300 last friday", user="42")
+
+    system, context, message = prompts[0]
+    assert system.content == PARSE_PROMPT.instructions
+    assert context.content == 'Today is 2024-05-10 (Friday). In the message, "last friday" is 2024-05-03. The sender is 42.'
+    assert message.content == "dinner with friends 300 last friday"
+
+@pytest.mark.asyncio
+async def test_invalid_correction_returns_none(agent):
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[json.dumps({"changes": [{"index": 5, "amount": 1}]})]))]
+    pending = {"key": "abc", "items": [ITEM], "selected": [True], "summary": ""}
+
+    assert await agent.process_correction(pending, "make it something else entirely") is None
+
+@pytest.mark.asyncio
+async def test_confirmed_category_correction_is_learned(agent):
+    async def committed(expenses):
+        return None
+    agent.sheets_client.append_expenses.side_effect = committed
+    agent.tiers = [make_tier("fake", FakeListChatModel(responses=[]))]
+    pending = await agent.process_message("vet 900 card", user="42")
+    assert pending["items"][0]["category"] == "Other"
+
+    corrected = await agent.process_correction(pending, "it was health", user="42")
+    await agent.write_expense(corrected)
+
+    assert agent.sheets_client.append_expenses.call_args[0][0][0]["category"] == "Health"
+    assert agent.categorizer.classify("Vet") == "Health"
+
+@pytest.mark.asyncio
+async def test_write_expense_appends_selected_items_in_one_batch(agent):
+    async def committed(expenses):
+        return None
+    agent.sheets_client.append_expenses.side_effect = committed
+
+    await agent.write_expense({
+        "key": "abc",
+        "items": [ITEM, dict(ITEM, description="Pharmacy"), dict(ITEM, description="Taxi")],
+        "selected": [True, False, True]
+    })
+
+    written = agent.sheets_client.append_expenses.call_args[0][0]
+    assert [item["description"] for item in written] == ["Groceries", "Taxi"]
+
+@pytest.mark.asyncio
+async def test_write_expense_records_base_amount(agent):
+    async def committed(expenses):
+        return None
+    agent.sheets_client.append_expenses.side_effect = committed
+    agent.fx = FxTable.from_quotes("THB", [("2024-01-01", "USD", 35.0)])
+
+    await agent.write_expense({"key": "abc", "items": [dict(ITEM, amount=10, currency="USD", date="2024-01-02")]})
+
+    assert agent.sheets_client.append_expenses.call_args[0][0][0]["base_amount"] == 350.0
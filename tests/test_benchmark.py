@@ -0,0 +1,23 @@
+import pytest
+from benchmarks.bench_bot import main, parse_args, percentile
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+
+@pytest.mark.asyncio
+async def test_benchmark_smoke_run(tmp_path):
+    args = parse_args([
+        "--chats", "2", "--concurrency", "2", "--messages", "3",
+        "--llm-latency", "0", "--sheets-latency", "0", "--reply-latency", "0",
+        "--flush-interval", "0.01", "--output", str(tmp_path / "results.json")
+    ])
+    results = await main(args)
+
+    run = results["runs"][0]
+    assert run["messages"] == 6
+    assert run["rows_written"] >= 6
+    assert {"handle_message", "handle_button", "sheets_append", "first_feedback"} <= set(run["stages"])
+    assert "p99_ms" in run["stages"]["handle_message"]
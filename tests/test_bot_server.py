@@ -0,0 +1,115 @@
+import asyncio
+import json
+import socket
+import httpx
+import pytest
+import pytest_asyncio
+from unittest.mock import MagicMock
+from src.bot.server import BotHttpServer, SECRET_TOKEN_HEADER
+
+# A message update as recorded from Telegram's getUpdates
+RECORDED_UPDATE = {
+    "update_id": 10001,
+    "message": {
+        "message_id": 42,
+        "date": 1704067200,
+        "chat": {"id": 123, "type": "private", "first_name": "Test"},
+        "from": {"id": 123, "is_bot": False, "first_name": "Test"},
+        "text": "coffee 80 cash"
+    }
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest_asyncio.fixture
+async def server():
+    application = MagicMock()
+    application.bot = None
+    application.update_queue = asyncio.Queue()
+    server = BotHttpServer(application, lambda: {"status": "ok"}, secret_token="s3cret")
+    port = free_port()
+    server.start(port, "127.0.0.1")
+    server.base_url = f"http://127.0.0.1:{port}"
+    yield server
+    await server.stop()
+
+@pytest.mark.asyncio
+async def test_webhook_enqueues_recorded_update(server):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{server.base_url}/telegram",
+            content=json.dumps(RECORDED_UPDATE),
+            headers={SECRET_TOKEN_HEADER: "s3cret"}
+        )
+
+    assert response.status_code == 200
+    update = server.application.update_queue.get_nowait()
+    assert update.update_id == 10001
+    assert update.message.text == "coffee 80 cash"
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret(server):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{server.base_url}/telegram",
+            content=json.dumps(RECORDED_UPDATE),
+            headers={SECRET_TOKEN_HEADER: "wrong"}
+        )
+
+    assert response.status_code == 403
+    assert server.application.update_queue.empty()
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_malformed_payload(server):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{server.base_url}/telegram",
+            content="not json",
+            headers={SECRET_TOKEN_HEADER: "s3cret"}
+        )
+
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_health_endpoint(server):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{server.base_url}/health")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(server):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{server.base_url}/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE expense_bot_node_seconds histogram" in response.text
+
+@pytest.mark.asyncio
+async def test_webhook_turns_updates_away_when_backlog_is_full():
+    application = MagicMock()
+    application.update_queue = asyncio.Queue()
+    server = BotHttpServer(application, lambda: {"status": "ok"}, secret_token="s3cret", accepting=lambda: False)
+    port = free_port()
+    server.start(port, "127.0.0.1")
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"http://127.0.0.1:{port}/telegram", content=json.dumps(RECORDED_UPDATE),
+                headers={SECRET_TOKEN_HEADER: "s3cret"}
+            )
+    finally:
+        await server.stop()
+
+    assert response.status_code == 503
+    assert application.update_queue.empty()
+
+def test_webhook_needs_secret():
+    with pytest.raises(ValueError):
+        BotHttpServer(MagicMock(), lambda: {"status": "ok"})
+    BotHttpServer(MagicMock(), lambda: {"status": "ok"}, webhook_path=None)
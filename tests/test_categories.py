@@ -0,0 +1,38 @@
+from src.agent.categories import Categorizer, KeywordTrie, tokenize
+
+def test_trie_prefers_longest_match():
+    trie = KeywordTrie()
+    trie.insert(["market"], "Groceries")
+    trie.insert(["night", "market"], "Food")
+    assert trie.match(tokenize("Dinner at the night market")) == "Food"
+    assert trie.match(tokenize("market run")) == "Groceries"
+    assert trie.match(tokenize("nothing here")) is None
+
+def test_keywords_then_similarity_then_default():
+    categorizer = Categorizer()
+    assert categorizer.explain("Big C groceries") == ("Groceries", "keyword")
+    assert categorizer.explain("groceris") == ("Groceries", "similarity")
+    assert categorizer.explain("xyz") == ("Other", "default")
+
+def test_learns_corrected_categories():
+    categorizer = Categorizer()
+    assert categorizer.classify("Vet for the cat") == "Other"
+
+    categorizer.learn("Vet for the cat", "pets")
+
+    assert "Pets" in categorizer.categories
+    assert categorizer.classify("Vet for the cat") == "Pets"
+    # Similar descriptions follow through the learned centroid
+    assert categorizer.classify("cat vet") == "Pets"
+
+def test_train_from_rows():
+    categorizer = Categorizer()
+    assert categorizer.train([("Gym membership", "Sport"), ("Random", "")]) == 1
+    assert categorizer.trained
+    assert categorizer.classify("gym") == "Sport"
+
+def test_categorize_copies_items():
+    categorizer = Categorizer()
+    items = [{"description": "Taxi"}]
+    assert categorizer.categorize(items) == [{"description": "Taxi", "category": "Transport"}]
+    assert "category" not in items[0]
@@ -0,0 +1,38 @@
+import pytest
+from datetime import date
+from src.agent.corrections import apply_changes, parse_correction_fast
+
+TODAY = date(2024, 5, 2)
+
+@pytest.mark.parametrize("message, count, expected", [
+    ("actually 150", 1, (0, {"amount": 150.0})),
+    ("it was card", 1, (0, {"cash": False})),
+    ("No, yesterday", 1, (0, {"date": "2024-05-01"})),
+    ("20 usd", 1, (0, {"amount": 20.0, "currency": "USD"})),
+    ("item 2 150 cash", 2, (1, {"amount": 150.0, "cash": True})),
+    ("the last one was 2024-04-30", 3, (2, {"date": "2024-04-30"})),
+    ("#1 hers", 2, (0, {"user": "hers"})),
+    ("description: Night market", 1, (0, {"description": "Night market"})),
+])
+def test_parses_short_corrections(message, count, expected):
+    assert parse_correction_fast(message, count, TODAY) == expected
+
+@pytest.mark.parametrize("message, count", [
+    ("150", 2),  # Which of the two?
+    ("item 3 150", 2),
+    ("it was for lunch with friends", 1),
+    ("not cash", 1),
+    ("150 or 200", 1),
+])
+def test_leaves_the_rest_to_the_model(message, count):
+    assert parse_correction_fast(message, count, TODAY) is None
+
+def test_apply_changes_copies_items():
+    items = [{"amount": 100.0}, {"amount": 200.0}]
+    patched = apply_changes(items, [(1, {"amount": 250.0})])
+    assert patched == [{"amount": 100.0}, {"amount": 250.0}]
+    assert items[1]["amount"] == 200.0
+
+def test_category_names_are_corrections():
+    assert parse_correction_fast("it was transport", 1, TODAY, ["Food", "Transport"]) == (0, {"category": "Transport"})
+    assert parse_correction_fast("it was transport", 1, TODAY) is None
@@ -0,0 +1,101 @@
+import math
+import time
+from datetime import date
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+from src.currency import FxTable, day_numbers, normalize_currency
+from src.sheets.backfill import backfill_base_amounts
+
+RATES_CSV = """date,USD,EUR
+2024-01-01,35.0,38.0
+2024-01-02,,38.5
+2024-01-04,36.0,
+"""
+
+@pytest.fixture
+def fx(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text(RATES_CSV)
+    return FxTable.load(str(path), "THB")
+
+@pytest.mark.parametrize("value,expected", [
+    ("thb", "THB"), (" usd ", "USD"), ("US$", "USD"), ("U.S. dollars", None), ("us dollars", "USD"),
+    ("€", "EUR"), ("£", "GBP"), ("rm", "MYR"), ("gbp", "GBP"), ("chf", "CHF"), ("KRW", "KRW"), ("doubloons", None),
+    ("XYZ", None), (None, None),
+])
+def test_normalize_currency(value, expected):
+    assert normalize_currency(value) == expected
+
+def test_missing_days_carry_the_last_rate_forward(fx):
+    assert fx.rate("USD", "2024-01-01") == 35.0
+    assert fx.rate("USD", "2024-01-03") == 35.0  # No quote on the 2nd or 3rd
+    assert fx.rate("EUR", "2024-01-04") == 38.5
+    assert fx.rate("THB", "2024-01-02") == 1.0
+    assert fx.rate("GBP", "2024-01-02") is None
+
+def test_dates_outside_the_table_use_its_edges(fx):
+    assert fx.rate("usd", "2023-06-01") == 35.0
+    assert fx.rate("usd", "2025-06-01") == 36.0
+
+def test_convert_many_matches_convert(fx):
+    amounts = [10, 20, 30, 40]
+    currencies = ["USD", "eur", "THB", "GBP"]
+    days = ["2024-01-01", "2024-01-03", "2024-01-04", "2024-01-04"]
+    converted = fx.convert_many(amounts, currencies, days)
+
+    assert converted[:3].tolist() == [350.0, 770.0, 30.0]
+    assert math.isnan(converted[3])
+    assert [fx.convert(*args) for args in zip(amounts, currencies, days)][:3] == [350.0, 770.0, 30.0]
+
+def test_total_prefers_recorded_base_amounts(fx):
+    total, missing = fx.total(
+        [10, 10, 5], ["USD", "USD", "GBP"], ["2024-01-01"] * 3, recorded=[340.0, None, None]
+    )
+    assert (total, missing) == (690.0, 1)
+
+def test_without_rates_only_the_base_currency_converts():
+    fx = FxTable.load(None, "THB")
+    items = fx.annotate([
+        {"date": "2024-01-01", "amount": 80, "currency": "THB"},
+        {"date": "2024-01-01", "amount": 5, "currency": "USD"},
+    ])
+    assert [item["base_amount"] for item in items] == [80.0, None]
+
+def test_convert_many_scales_to_large_columns(fx):
+    count = 200_000
+    rng = np.random.default_rng(1)
+    amounts = rng.uniform(1, 1000, count)
+    currencies = [str(code) for code in rng.choice(["USD", "EUR", "THB"], count)]
+    # As the mirror returns them: ISO strings
+    days = [str(day) for day in np.datetime64("2024-01-01") + rng.integers(0, 4, count)]
+
+    start = time.perf_counter()
+    converted = fx.convert_many(amounts, currencies, days)
+    elapsed = time.perf_counter() - start
+
+    assert not np.isnan(converted).any()
+    assert elapsed < 0.25
+
+def test_backfill_fills_only_rows_without_a_base_amount(fx):
+    client = MagicMock()
+    client.read_rows.return_value = [
+        ["Date", "Description", "Amount", "Currency", "Cash", "User", "Category", "Base"],
+        ["2024-01-01", "Hotel", 100, "USD", False, "42"],
+        ["2024-01-01", "Taxi", 200, "THB", True, "42", "Transport", 200],
+        ["2024-01-01", "Souvenir", 5, "GBP", True, "42"],
+    ]
+
+    assert backfill_base_amounts(client, fx, start_row=1) == 1
+    client.write_base_amounts.assert_called_once_with(1, ["Base", 3500.0, 200, ""])
+
+def test_day_numbers_reads_strings_and_dates_and_rejects_invalid_dates():
+    assert day_numbers(["1970-01-02", "2024-02-29"]).tolist() == [1, 19782]
+    assert day_numbers([date(2024, 2, 29)]).tolist() == [19782]
+    with pytest.raises(ValueError):
+        day_numbers(["2023-02-29"])
+
+def test_missing_rates_file_leaves_a_base_only_table(tmp_path):
+    fx = FxTable.load(str(tmp_path / "missing.csv"), "THB")
+    assert fx.convert(100, "THB", "2024-01-01") == 100.0
+    assert fx.convert(100, "USD", "2024-01-01") is None
@@ -0,0 +1,28 @@
+import pytest
+from datetime import date
+from src.agent.dates import date_context, resolve_dates
+
+TODAY = date(2024, 5, 10)  # A Friday
+
+@pytest.mark.parametrize("message, expected", [
+    ("coffee 80 yesterday", [("yesterday", "2024-05-09")]),
+    ("taxi the day before yesterday", [("the day before yesterday", "2024-05-08")]),
+    ("dinner 500 three days ago", [("three days ago", "2024-05-07")]),
+    ("rent 2 weeks ago", [("2 weeks ago", "2024-04-26")]),
+    ("dinner 500 last friday", [("last friday", "2024-05-03")]),
+    ("lunch on Friday", [("on friday", "2024-05-10")]),
+    ("groceries monday", [("monday", "2024-05-06")]),
+    ("такси 200 вчера", [("вчера", "2024-05-09")]),
+    ("ужин в прошлую пятницу", [("в прошлую пятницу", "2024-05-03")]),
+    ("обед 3 дня назад", [("3 дня назад", "2024-05-07")]),
+    ("coffee 80 today, lunch 250 yesterday", [("today", "2024-05-10"), ("yesterday", "2024-05-09")]),
+    ("coffee 80 on 2024-05-01 in maybe sunny weather", []),
+])
+def test_resolves_relative_dates(message, expected):
+    assert [(phrase, day.isoformat()) for phrase, day in resolve_dates(message, TODAY)] == expected
+
+def test_context_names_today_and_resolved_phrases():
+    assert date_context("dinner 500 last friday", TODAY) == (
+        'Today is 2024-05-10 (Friday). In the message, "last friday" is 2024-05-03.'
+    )
+    assert date_context("dinner 500", TODAY) == "Today is 2024-05-10 (Friday)."
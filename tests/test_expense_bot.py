@@ -1,14 +1,42 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from telegram import InlineKeyboardMarkup
-from src.agent.main import ExpenseTrackingAgent
+from src.agent.summary import format_expenses_summary
 from src.bot.main import ExpenseBot
+from src.currency import FxTable
+from src.tenants import Tenant, TenantRegistry
+
+def make_item(**overrides):
+    item = {
+        "date": "2024-01-01",
+        "amount": 100,
+        "currency": "THB",
+        "description": "Test expense",
+        "cash": True,
+        "user": "test_user"
+    }
+    item.update(overrides)
+    return item
+
+def make_expense(*items, **overrides):
+    items = list(items) or [make_item(**overrides)]
+    return {
+        "key": "abc123",
+        "items": items,
+        "selected": [True] * len(items),
+        "summary": format_expenses_summary(items)
+    }
 
 @pytest.fixture
 @patch('src.bot.main.SheetsClient', autospec=True)
-@patch('src.bot.main.ExpenseTrackingAgent', autospec=True)
+@patch('src.bot.main.SheetMirror', autospec=True)
+@patch('src.bot.main.Outbox', autospec=True)
+@patch('src.bot.main.OutboxWorker', autospec=True)
+@patch('src.agent.main.ExpenseTrackingAgent', autospec=True)
 @patch('src.bot.main.Application', autospec=True)
-def expense_bot(mock_application, mock_agent, mock_sheets_client):
+@patch('src.bot.main.LAZY_STARTUP', False)
+def expense_bot(mock_application, mock_agent, mock_outbox_worker, mock_outbox, mock_mirror, mock_sheets_client):
     mock_app = MagicMock()
     mock_application.builder().token().build.return_value = mock_app
     mock_agent_instance = mock_agent.return_value
@@ -20,6 +48,27 @@ def test_initialization(expense_bot):
     assert expense_bot.agent is not None
     assert expense_bot.pending_expenses == {}
 
+@pytest.mark.asyncio
+@patch('src.bot.main.SheetsClient', autospec=True)
+@patch('src.bot.main.SheetMirror', autospec=True)
+@patch('src.bot.main.Outbox', autospec=True)
+@patch('src.bot.main.OutboxWorker', autospec=True)
+@patch('src.agent.main.ExpenseTrackingAgent', autospec=True)
+@patch('src.bot.main.Application', autospec=True)
+@patch('src.bot.main.LAZY_STARTUP', True)
+async def test_lazy_startup_builds_agent_in_background(mock_application, mock_agent, *mocks):
+    mock_sheets_client = mocks[-1]
+    bot = ExpenseBot(started_at=0.0)
+    mock_agent.assert_not_called()
+    assert mock_sheets_client.call_args.kwargs["lazy"] is True
+
+    agent = await bot.get_agent()
+
+    mock_agent.assert_called_once()
+    assert agent is mock_agent.return_value
+    assert await bot.get_agent() is agent
+    assert bot.startup_timings["agent_seconds"] > 0
+
 @pytest.mark.asyncio
 async def test_start_command(expense_bot):
     update = AsyncMock()
@@ -35,23 +84,14 @@ async def test_handle_message_new_expense(expense_bot):
     update.message.chat_id = 123
     context = MagicMock()
     
-    mock_expense_data = {
-        "data": {
-            "date": "2024-01-01",
-            "amount": 100,
-            "currency": "THB",
-            "description": "Test expense",
-            "cash": True,
-            "user": "test_user"
-        },
-        "summary": "Test expense summary"
-    }
+    mock_expense_data = make_expense()
     
     expense_bot.agent.process_message = AsyncMock(return_value=mock_expense_data)
     await expense_bot.handle_message(update, context)
     
-    # Check if expense was stored in pending_expenses
-    assert expense_bot.pending_expenses[123] == mock_expense_data
+    # Check if expense was stored in pending_expenses, with the summary re-rendered on read
+    assert expense_bot.pending_expenses[123]["items"] == mock_expense_data["items"]
+    assert expense_bot.pending_expenses[123]["summary"] == mock_expense_data["summary"]
     
     # Verify that reply contains both summary and confirmation buttons
     update.message.reply_text.assert_called_once()
@@ -59,6 +99,26 @@ async def test_handle_message_new_expense(expense_bot):
     assert mock_expense_data["summary"] in call_args[0][0]
     assert isinstance(call_args[1]["reply_markup"], InlineKeyboardMarkup)
 
+@pytest.mark.asyncio
+async def test_handle_message_streams_preview_then_attaches_keyboard(expense_bot):
+    update = AsyncMock()
+    update.message.chat_id = 123
+    placeholder = update.message.reply_text.return_value
+    mock_expense_data = make_expense()
+
+    async def process_message(text, user=None, on_progress=None, tenant=None):
+        on_progress([])
+        await asyncio.sleep(0.01)
+        return mock_expense_data
+    expense_bot.agent.process_message = process_message
+    await expense_bot.handle_message(update, MagicMock())
+
+    # The placeholder is edited into the confirmation instead of sending a second message
+    update.message.reply_text.assert_called_once()
+    call_args = placeholder.edit_text.call_args
+    assert mock_expense_data["summary"] in call_args[0][0]
+    assert isinstance(call_args[1]["reply_markup"], InlineKeyboardMarkup)
+
 @pytest.mark.asyncio
 async def test_handle_message_correction(expense_bot):
     update = AsyncMock()
@@ -66,16 +126,10 @@ async def test_handle_message_correction(expense_bot):
     context = MagicMock()
     
     # Set up a pending expense
-    mock_previous_expense = {
-        "data": {"date": "2024-01-01"},
-        "summary": "Previous expense"
-    }
+    mock_previous_expense = make_expense(date="2024-01-01")
     expense_bot.pending_expenses[123] = mock_previous_expense
     
-    mock_corrected_expense = {
-        "data": {"date": "2024-01-02"},
-        "summary": "Corrected expense"
-    }
+    mock_corrected_expense = make_expense(date="2024-01-02")
     expense_bot.agent.process_correction = AsyncMock(return_value=mock_corrected_expense)
     
     await expense_bot.handle_message(update, context)
@@ -83,33 +137,35 @@ async def test_handle_message_correction(expense_bot):
     # Verify correction was processed
     expense_bot.agent.process_correction.assert_called_once_with(
         mock_previous_expense,
-        update.message.text
+        update.message.text,
+        user=str(update.message.from_user.id),
+        tenant=expense_bot.tenants.default
     )
     
     # Check if corrected expense was stored
     assert expense_bot.pending_expenses[123] == mock_corrected_expense
 
 @pytest.mark.asyncio
-@patch.object(ExpenseTrackingAgent, 'write_expense', new_callable=AsyncMock)
-async def test_handle_button_confirm(mock_write_expense, expense_bot):
-    query = AsyncMock()
+async def test_handle_button_confirm(expense_bot):
+    update = AsyncMock()
+    query = update.callback_query
     query.message.chat_id = 123
     query.data = "confirm"
     context = MagicMock()
+    mock_write_expense = expense_bot.agent.write_expense = AsyncMock()
     
-    mock_expense = {
-        "data": {"date": "2024-01-01"},
-        "summary": "Test expense"
-    }
+    mock_expense = make_expense()
     expense_bot.pending_expenses[123] = mock_expense
     
     query.answer = AsyncMock(return_value=None)
     query.message.reply_text = AsyncMock()
-    await expense_bot.handle_button(query, context)
+    await expense_bot.handle_button(update, context)
     query.answer.assert_called_once()
     
     # Verify expense was written
-    mock_write_expense.assert_called_once_with(mock_expense)
+    mock_write_expense.assert_called_once_with(
+        mock_expense, tenant=expense_bot.tenants.default, outbox=expense_bot.outbox
+    )
     
     # Verify success message
     query.message.reply_text.assert_called_once_with("✅ Expense successfully recorded!")
@@ -117,20 +173,104 @@ async def test_handle_button_confirm(mock_write_expense, expense_bot):
     # Verify pending expense was cleared
     assert 123 not in expense_bot.pending_expenses
 
+@pytest.mark.asyncio
+async def test_repeated_confirm_is_answered_without_writing(expense_bot):
+    update = AsyncMock()
+    query = update.callback_query
+    query.message.chat_id = 123
+    query.data = "confirm"
+    expense_bot.agent.write_expense = AsyncMock()
+    expense_bot.pending_expenses[123] = make_expense()
+
+    await expense_bot.handle_button(update, MagicMock())
+    # A second tap on the same confirmation, and the first callback delivered again
+    update.callback_query.id = "another-callback"
+    await expense_bot.handle_button(update, MagicMock())
+
+    expense_bot.agent.write_expense.assert_called_once()
+    assert query.message.reply_text.call_args[0][0] == "✅ Expense already recorded."
+
+@pytest.mark.asyncio
+async def test_confirm_of_pending_that_outlived_its_write_is_not_repeated(expense_bot):
+    update = AsyncMock()
+    update.callback_query.message.chat_id = 123
+    update.callback_query.data = "confirm"
+    expense_bot.agent.write_expense = AsyncMock()
+    expense = make_expense()
+    expense_bot.pending_expenses[123] = expense
+    await expense_bot.handle_button(update, MagicMock())
+
+    # The same pending entry comes back, e.g. restored after a restart, and is confirmed from a new callback
+    expense_bot.pending_expenses[123] = expense
+    retry = AsyncMock()
+    retry.callback_query.message.chat_id = 123
+    retry.callback_query.data = "confirm"
+    await expense_bot.handle_button(retry, MagicMock())
+
+    expense_bot.agent.write_expense.assert_called_once()
+    assert 123 not in expense_bot.pending_expenses
+
+def test_backpressure_counts_updates_waiting_in_the_update_queue(expense_bot):
+    expense_bot.app.update_queue.qsize.return_value = 0
+    assert expense_bot.accepting_updates()
+    # PTB starts at most 256 handlers, so a long backlog only shows in its update queue
+    expense_bot.app.update_queue.qsize.return_value = 10_000
+    assert not expense_bot.accepting_updates()
+
+@pytest.mark.asyncio
+async def test_tap_on_older_confirmation_keeps_current_pending(expense_bot):
+    expense_bot.agent.write_expense = AsyncMock()
+    first = AsyncMock()
+    first.callback_query.message.chat_id = 123
+    first.callback_query.message.message_id = 1
+    first.callback_query.data = "confirm"
+    expense_bot.pending_expenses[123] = make_expense()
+    await expense_bot.handle_button(first, MagicMock())
+
+    # A new expense is pending when "Yes" is tapped again on the first confirmation
+    current = make_expense(description="Lunch")
+    current["key"] = "def456"
+    expense_bot.pending_expenses[123] = current
+    first.callback_query.id = "another-callback"
+    await expense_bot.handle_button(first, MagicMock())
+
+    expense_bot.agent.write_expense.assert_called_once()
+    assert first.callback_query.message.reply_text.call_args[0][0] == "✅ Expense already recorded."
+    assert expense_bot.pending_expenses[123]["items"] == current["items"]
+
+    second = AsyncMock()
+    second.callback_query.message.chat_id = 123
+    second.callback_query.message.message_id = 2
+    second.callback_query.data = "confirm"
+    await expense_bot.handle_button(second, MagicMock())
+    assert expense_bot.agent.write_expense.call_count == 2
+    assert 123 not in expense_bot.pending_expenses
+
+@pytest.mark.asyncio
+async def test_recently_recorded_expense_is_flagged(expense_bot):
+    expense_bot.recent_writes.record(["callback:1"], expense_bot.tenants.default.id, [make_item()])
+    update = AsyncMock()
+    update.message.chat_id = 123
+    expense_bot.agent.process_message = AsyncMock(return_value=make_expense())
+
+    await expense_bot.handle_message(update, MagicMock())
+
+    assert expense_bot.pending_expenses[123]["duplicates"]
+    text = update.message.reply_text.call_args[0][0]
+    assert "⚠️ Possibly already recorded:\n1. Test expense (less than a minute ago)" in text
+
 @pytest.mark.asyncio
 async def test_handle_button_reject(expense_bot):
-    query = AsyncMock()
+    update = AsyncMock()
+    query = update.callback_query
     query.message.chat_id = 123
     query.data = "reject"
     context = MagicMock()
     
-    mock_expense = {
-        "data": {"date": "2024-01-01"},
-        "summary": "Test expense"
-    }
+    mock_expense = make_expense()
     expense_bot.pending_expenses[123] = mock_expense
     
-    await expense_bot.handle_button(query, context)
+    await expense_bot.handle_button(update, context)
     
     # Verify correction message
     query.message.reply_text.assert_called_once_with(
@@ -139,3 +279,133 @@ async def test_handle_button_reject(expense_bot):
     
     # Verify pending expense remains
     assert expense_bot.pending_expenses[123] == mock_expense
+
+@pytest.mark.asyncio
+async def test_handle_button_confirm_failure_keeps_pending(expense_bot):
+    update = AsyncMock()
+    query = update.callback_query
+    query.message.chat_id = 123
+    query.data = "confirm"
+    context = MagicMock()
+    expense_bot.agent.write_expense = AsyncMock(side_effect=RuntimeError("disk full"))
+    
+    mock_expense = make_expense()
+    expense_bot.pending_expenses[123] = mock_expense
+    
+    await expense_bot.handle_button(update, context)
+    
+    query.message.reply_text.assert_called_once_with("❌ Failed to record expense: disk full")
+    assert expense_bot.pending_expenses[123] == mock_expense
+
+@pytest.mark.asyncio
+async def test_handle_message_multiple_expenses_adds_toggles(expense_bot):
+    update = AsyncMock()
+    update.message.chat_id = 123
+    context = MagicMock()
+    
+    mock_expense_data = make_expense(
+        make_item(description="Coffee", amount=80),
+        make_item(description="Lunch", amount=250, cash=False)
+    )
+    expense_bot.agent.process_message = AsyncMock(return_value=mock_expense_data)
+    await expense_bot.handle_message(update, context)
+    
+    keyboard = update.message.reply_text.call_args[1]["reply_markup"].inline_keyboard
+    assert [row[0].callback_data for row in keyboard] == ["toggle:0", "toggle:1", "confirm"]
+
+@pytest.mark.asyncio
+async def test_handle_button_toggle_then_confirm_writes_selected(expense_bot):
+    update = AsyncMock()
+    query = update.callback_query
+    query.message.chat_id = 123
+    context = MagicMock()
+    expense_bot.agent.write_expense = AsyncMock()
+    expense_bot.pending_expenses[123] = make_expense(
+        make_item(description="Coffee", amount=80),
+        make_item(description="Lunch", amount=250)
+    )
+    
+    query.data = "toggle:1"
+    await expense_bot.handle_button(update, context)
+    
+    assert expense_bot.pending_expenses[123]["selected"] == [True, False]
+    text = query.edit_message_text.call_args[0][0]
+    assert "⬜ 2." in text
+    
+    query.data = "confirm"
+    await expense_bot.handle_button(update, context)
+    
+    written = expense_bot.agent.write_expense.call_args[0][0]
+    assert written["selected"] == [True, False]
+    assert 123 not in expense_bot.pending_expenses
+
+@pytest.mark.asyncio
+async def test_month_command_reports_from_mirror(expense_bot):
+    update = AsyncMock()
+    context = MagicMock()
+    expense_bot.mirror.totals.return_value = [("THB", 1234.5, 3)]
+    
+    await expense_bot.month_command(update, context)
+    
+    text = update.message.reply_text.call_args[0][0]
+    assert "This month" in text
+    assert "1,234.50 THB (3 expenses)" in text
+
+@pytest.mark.asyncio
+async def test_month_command_adds_base_currency_total(expense_bot):
+    update = AsyncMock()
+    expense_bot._fx = FxTable.from_quotes("THB", [("2024-05-01", "USD", 35.0)])
+    expense_bot.mirror.totals.return_value = [("THB", 200.0, 1), ("USD", 20.0, 2)]
+    expense_bot.mirror.amounts.return_value = [
+        ("2024-05-01", 200.0, "THB", 200.0), ("2024-05-02", 10.0, "USD", 340.0), ("2024-05-03", 10.0, "USD", None)
+    ]
+
+    await expense_bot.month_command(update, MagicMock())
+
+    text = update.message.reply_text.call_args[0][0]
+    assert "💱 All together: 890.00 THB" in text
+
+@pytest.mark.asyncio
+@patch('src.bot.main.SheetsClient', autospec=True)
+@patch('src.bot.main.SheetMirror', autospec=True)
+@patch('src.bot.main.Outbox', autospec=True)
+@patch('src.bot.main.OutboxWorker', autospec=True)
+@patch('src.agent.main.ExpenseTrackingAgent', autospec=True)
+@patch('src.bot.main.Application', autospec=True)
+@patch('src.bot.main.LAZY_STARTUP', False)
+async def test_households_are_resolved_by_chat(mock_application, mock_agent, mock_outbox_worker, mock_outbox, *mocks):
+    tenants = TenantRegistry([Tenant("smiths", "sheet-1", "1", "2", chats=(1, 2)), Tenant("joneses", "sheet-2", chats=(3,))])
+    with patch.object(TenantRegistry, "from_config", return_value=tenants):
+        bot = ExpenseBot()
+    assert set(bot.households) == {"smiths", "joneses"}
+    assert [call.args[0] for call in mock_outbox.call_args_list] == ["outbox.smiths.db", "outbox.joneses.db"]
+    assert bot.outbox is None  # No default household
+
+    update = AsyncMock()
+    update.effective_chat.id = 3
+    update.message.chat_id = 3
+    bot.agent.process_message = AsyncMock(return_value=make_expense())
+    await bot.handle_message(update, MagicMock())
+    assert bot.agent.process_message.call_args.kwargs["tenant"].id == "joneses"
+
+    stranger = AsyncMock()
+    stranger.effective_chat.id = 99
+    stranger.message.chat_id = 99
+    await bot.handle_message(stranger, MagicMock())
+    stranger.effective_message.reply_text.assert_awaited_once_with("This chat isn't linked to a household yet.")
+    assert 99 not in bot.pending_expenses
+
+@patch('src.bot.main.SheetsClient', autospec=True)
+@patch('src.bot.main.SheetMirror', autospec=True)
+@patch('src.bot.main.Outbox', autospec=True)
+@patch('src.bot.main.OutboxWorker', autospec=True)
+@patch('src.agent.main.ExpenseTrackingAgent', autospec=True)
+@patch('src.bot.main.Application', autospec=True)
+@patch('src.bot.main.LAZY_STARTUP', True)
+@patch('src.bot.main.OPENAI_RPM', 600)
+def test_shard_workers_split_the_quota(*mocks):
+    single = ExpenseBot()
+    shard = ExpenseBot(shard=1, shards=4)
+    assert single.quota.buckets["openai_requests"].rate == 10.0
+    assert shard.quota.buckets["openai_requests"].rate == 2.5
+    assert shard.quota.buckets["openai_requests"].capacity == 25.0
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+from src.agent.cache import ExtractionCache
+
+EXPENSE = {
+    "date": "2024-01-01",
+    "description": "Lunch",
+    "amount": 120.0,
+    "currency": "THB",
+    "cash": False,
+    "user": "42"
+}
+
+def test_key_normalizes_message_and_includes_date_context():
+    key = ExtractionCache.make_key("Lunch  120", "2024-01-01", "42")
+    assert key == ExtractionCache.make_key("  lunch 120!", "2024-01-01", "42")
+    assert key != ExtractionCache.make_key("lunch 120", "2024-01-02", "42")
+    assert key != ExtractionCache.make_key("lunch 120", "2024-01-01", "43")
+
+def test_hit_and_miss_counters():
+    cache = ExtractionCache()
+    assert cache.get("key") is None
+    cache.set("key", EXPENSE)
+    assert cache.get("key") == EXPENSE
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+def test_evicts_least_recently_used():
+    cache = ExtractionCache(max_size=2)
+    cache.set("a", EXPENSE)
+    cache.set("b", EXPENSE)
+    cache.get("a")
+    cache.set("c", EXPENSE)
+    assert cache.get("b") is None
+    assert cache.get("a") == EXPENSE
+    assert cache.get("c") == EXPENSE
+
+def test_expires_entries_after_ttl():
+    cache = ExtractionCache(ttl=60)
+    with patch("src.agent.cache.time.time", return_value=1000):
+        cache.set("key", EXPENSE)
+    with patch("src.agent.cache.time.time", return_value=1061):
+        assert cache.get("key") is None
+
+def test_disk_backing_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ExtractionCache(path=path)
+    cache.set("key", EXPENSE)
+    cache.close()
+
+    reopened = ExtractionCache(path=path)
+    assert reopened.get("key") == EXPENSE
+    assert reopened.hits == 1
+    reopened.close()
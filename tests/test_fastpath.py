@@ -0,0 +1,48 @@
+import pytest
+from datetime import date
+from src.agent.fastpath import parse_expense_fast, parse_expenses_fast
+
+TODAY = date(2024, 5, 2)
+
+@pytest.mark.parametrize("message, expected", [
+    ("coffee 80 cash", {"description": "Coffee", "amount": 80.0, "currency": "THB", "cash": True}),
+    ("450 thb grab card", {"description": "Grab", "amount": 450.0, "currency": "THB", "cash": False}),
+    ("1,200 baht rent", {"description": "Rent", "amount": 1200.0, "currency": "THB", "cash": False}),
+    ("€12.50 museum tickets", {"description": "Museum tickets", "amount": 12.5, "currency": "EUR", "cash": False}),
+])
+def test_parses_formulaic_messages(message, expected):
+    result = parse_expense_fast(message, "42", TODAY)
+    assert result == dict(expected, date="2024-05-02", user="42")
+
+def test_resolves_yesterday():
+    result = parse_expense_fast("taxi 200 cash yesterday", "42", TODAY)
+    assert result["date"] == "2024-05-01"
+
+@pytest.mark.parametrize("message", [
+    "coffee",
+    "80 cash",
+    "coffee 80, lunch 250 card",
+    "taxi 200 cash card",
+    "paid 300 for groceries at the big market near home",
+    "dinner 500 last friday",
+    "coffee -80",
+    "ramen 1000 jpy",
+    "lunch 30 rm",
+    "hotel 120 sgd",
+    "taxi 20 pounds",
+    "dinner 15 chf",
+])
+def test_falls_through_on_ambiguous_messages(message):
+    assert parse_expense_fast(message, "42", TODAY) is None
+
+def test_requires_known_user():
+    assert parse_expense_fast("coffee 80 cash", None, TODAY) is None
+
+def test_parses_several_expenses_in_one_message():
+    result = parse_expenses_fast("coffee 80, lunch 250 card, taxi 120 cash", "42", TODAY)
+    assert [(e["description"], e["amount"], e["cash"]) for e in result] == [
+        ("Coffee", 80.0, False), ("Lunch", 250.0, False), ("Taxi", 120.0, True)
+    ]
+
+def test_several_expenses_fall_through_if_any_is_ambiguous():
+    assert parse_expenses_fast("coffee 80, something odd happened", "42", TODAY) is None
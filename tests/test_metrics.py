@@ -0,0 +1,50 @@
+from src.metrics import MetricsRegistry
+
+def test_counter_renders_labelled_samples():
+    registry = MetricsRegistry()
+    counter = registry.counter("messages_total", "Messages", ["parser"])
+    counter.inc(parser="cache")
+    counter.inc(2, parser="llm")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE messages_total counter" in lines
+    assert 'messages_total{parser="cache"} 1' in lines
+    assert 'messages_total{parser="llm"} 2' in lines
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_sum 5.55" in lines
+    assert "latency_seconds_count 3" in lines
+
+def test_histogram_time_records_observation():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("node_seconds", "Node time", ["node"])
+    with histogram.time(node="fast_parse"):
+        pass
+
+    assert histogram.count(node="fast_parse") == 1
+    assert histogram.count(node="parse_expense") == 0
+
+def test_callback_gauge_reads_value_at_render_time():
+    registry = MetricsRegistry()
+    depth = [3]
+    registry.gauge_callback("queue_depth", "Queue depth", lambda: depth[0])
+    assert "queue_depth 3" in registry.render()
+
+    depth[0] = 7
+    assert "queue_depth 7" in registry.render()
+
+def test_failing_callback_is_skipped():
+    registry = MetricsRegistry()
+    registry.gauge_callback("broken", "Broken", lambda: 1 / 0)
+    assert "# TYPE broken gauge" in registry.render()
+    assert "broken 0" not in registry.render()
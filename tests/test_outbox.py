@@ -0,0 +1,191 @@
+import sqlite3
+import pytest
+from unittest.mock import MagicMock, patch
+from src.sheets.outbox import Outbox, OutboxWorker, main
+from src.tenants import tenant_path
+from src.sheets.transport import SheetsApiError
+
+EXPENSE = {
+    "date": "2024-01-01",
+    "description": "Coffee",
+    "amount": 80,
+    "currency": "THB",
+    "cash": True,
+    "user": "test_user"
+}
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    yield outbox
+    outbox.close()
+
+def resolved(value=None):
+    async def _resolved(*args, **kwargs):
+        return value
+    return _resolved
+
+def test_enqueue_is_idempotent(outbox):
+    assert outbox.enqueue("key-1", EXPENSE) is True
+    assert outbox.enqueue("key-1", EXPENSE) is False
+    assert outbox.pending_count() == 1
+    assert outbox.pending()[0].expense == EXPENSE
+
+def test_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    outbox.enqueue("key-1", EXPENSE)
+    outbox.close()
+
+    reopened = Outbox(path)
+    assert [entry.key for entry in reopened.pending()] == ["key-1"]
+    reopened.close()
+
+@pytest.mark.asyncio
+async def test_drain_writes_batch_and_marks_sent(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = resolved()
+    outbox.enqueue("key-1", EXPENSE)
+    outbox.enqueue("key-2", dict(EXPENSE, description="Lunch"))
+
+    worker = OutboxWorker(outbox, sheets_client)
+    assert await worker.drain() == 2
+
+    sheets_client.append_expenses.assert_called_once()
+    assert [e["description"] for e in sheets_client.append_expenses.call_args[0][0]] == ["Coffee", "Lunch"]
+    assert outbox.pending_count() == 0
+
+@pytest.mark.asyncio
+async def test_drain_failure_keeps_entries(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = RuntimeError("quota exceeded")
+    outbox.enqueue("key-1", EXPENSE)
+
+    worker = OutboxWorker(outbox, sheets_client)
+    with pytest.raises(RuntimeError):
+        await worker.drain()
+
+    entries = outbox.pending()
+    assert len(entries) == 1
+    assert entries[0].attempts == 1
+
+@pytest.mark.asyncio
+async def test_worker_replays_on_start(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = resolved()
+    outbox.enqueue("key-1", EXPENSE)
+
+    worker = OutboxWorker(outbox, sheets_client)
+    worker.start()
+    await worker.stop()
+
+    sheets_client.append_expenses.assert_called_once()
+    assert outbox.pending_count() == 0
+
+def test_enqueue_many_skips_known_keys(outbox):
+    outbox.enqueue("key-1:0", EXPENSE)
+    assert outbox.enqueue_many([("key-1:0", EXPENSE), ("key-1:1", EXPENSE)]) == 1
+    assert [entry.key for entry in outbox.pending()] == ["key-1:0", "key-1:1"]
+
+def rejecting(description):
+    async def _append(expenses):
+        if any(expense["description"] == description for expense in expenses):
+            raise SheetsApiError(400, "Invalid values")
+    return _append
+
+@pytest.mark.asyncio
+async def test_rejected_entry_becomes_dead_letter(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = rejecting("Bad")
+    outbox.enqueue("key-1", EXPENSE)
+    outbox.enqueue("key-2", dict(EXPENSE, description="Bad"))
+    outbox.enqueue("key-3", dict(EXPENSE, description="Lunch"))
+
+    worker = OutboxWorker(outbox, sheets_client, max_attempts=2)
+    with pytest.raises(SheetsApiError):
+        await worker.drain()
+    assert [entry.key for entry in outbox.pending()] == ["key-2"]
+    written = [call.args[0] for call in sheets_client.append_expenses.call_args_list]
+    assert [[e["description"] for e in batch] for batch in written[1:]] == [["Coffee"], ["Bad"], ["Lunch"]]
+
+    assert await worker.drain() == 0
+    assert outbox.pending_count() == 0
+    assert outbox.dead_count() == 1
+
+@pytest.mark.asyncio
+async def test_transient_errors_never_dead_letter(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = SheetsApiError(429, "Rate limit exceeded")
+    outbox.enqueue("key-1", EXPENSE)
+
+    worker = OutboxWorker(outbox, sheets_client, max_attempts=2)
+    for _ in range(3):
+        with pytest.raises(SheetsApiError):
+            await worker.drain()
+    assert outbox.pending()[0].attempts == 3
+    assert outbox.dead_count() == 0
+
+def test_requeue_dead(outbox):
+    outbox.enqueue("key-1", EXPENSE)
+    outbox.mark_dead([outbox.pending()[0].id])
+    assert outbox.pending_count() == 0
+
+    assert outbox.requeue_dead() == 1
+    assert outbox.pending()[0].attempts == 0
+    assert outbox.dead_count() == 0
+
+def test_opens_outbox_without_dead_letter_column(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, expense TEXT NOT NULL,
+            created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, sent_at REAL
+        )
+    """)
+    conn.execute("INSERT INTO outbox (key, expense, created_at) VALUES ('key-1', '{}', 0)")
+    conn.commit()
+    conn.close()
+
+    outbox = Outbox(path)
+    assert [entry.key for entry in outbox.pending()] == ["key-1"]
+    assert outbox.dead_count() == 0
+    outbox.close()
+
+@pytest.mark.asyncio
+async def test_sheet_wide_errors_never_dead_letter(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = SheetsApiError(403, "The caller does not have permission")
+    for index in range(4):
+        outbox.enqueue(f"key-{index}", EXPENSE)
+
+    worker = OutboxWorker(outbox, sheets_client, max_attempts=1)
+    with pytest.raises(SheetsApiError):
+        await worker.drain()
+    assert sheets_client.append_expenses.call_count == 1
+    assert outbox.pending_count() == 4
+    assert outbox.dead_count() == 0
+
+@pytest.mark.asyncio
+async def test_batch_rejected_as_a_whole_is_retried(outbox):
+    sheets_client = MagicMock()
+    sheets_client.append_expenses.side_effect = SheetsApiError(400, "Unable to parse range: Actual!A:H")
+    outbox.enqueue("key-1", EXPENSE)
+    outbox.enqueue("key-2", dict(EXPENSE, description="Lunch"))
+
+    worker = OutboxWorker(outbox, sheets_client, max_attempts=1)
+    with pytest.raises(SheetsApiError):
+        await worker.drain()
+    assert [entry.attempts for entry in outbox.pending()] == [1, 1]
+    assert outbox.dead_count() == 0
+
+def test_requeue_command(tmp_path, capsys):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(tenant_path(path, "smiths"))
+    outbox.enqueue("key-1", EXPENSE)
+    outbox.mark_dead([outbox.pending()[0].id])
+    outbox.close()
+
+    with patch("src.config.OUTBOX_PATH", path):
+        assert main(["requeue", "--household", "smiths"]) == 1
+    assert "Requeued 1" in capsys.readouterr().out
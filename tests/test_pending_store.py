@@ -0,0 +1,82 @@
+import time
+import pytest
+from unittest.mock import patch
+from src.bot.pending import MemoryPendingStore, SQLitePendingStore
+
+def make_entry(description="Coffee"):
+    return {
+        "key": "abc123",
+        "items": [{
+            "date": "2024-01-01",
+            "description": description,
+            "amount": 80.0,
+            "currency": "THB",
+            "cash": True,
+            "user": "42"
+        }],
+        "selected": [True],
+        "summary": "rendered summary",
+        "parser": "fast_path"
+    }
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def _make_store(**kwargs):
+        if request.param == "memory":
+            store = MemoryPendingStore(**kwargs)
+        else:
+            store = SQLitePendingStore(str(tmp_path / "pending.db"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield _make_store
+    for store in stores:
+        store.close()
+
+def test_stores_compact_entry_and_rerenders_summary(make_store):
+    store = make_store()
+    store[1] = make_entry()
+
+    entry = store[1]
+    assert entry["key"] == "abc123"
+    assert entry["items"][0]["description"] == "Coffee"
+    assert "parser" not in entry
+    assert "📄 Description: Coffee" in entry["summary"]
+
+def test_delete_and_contains(make_store):
+    store = make_store()
+    store[1] = make_entry()
+    assert 1 in store
+    del store[1]
+    assert 1 not in store
+    with pytest.raises(KeyError):
+        del store[1]
+
+def test_evicts_expired_entries(make_store):
+    store = make_store(ttl=60)
+    with patch("src.bot.pending.time.time", return_value=1000):
+        store[1] = make_entry()
+    with patch("src.bot.pending.time.time", return_value=1061):
+        assert 1 not in store
+    assert store.stats()["evicted_ttl"] == 1
+
+def test_evicts_oldest_when_full(make_store):
+    store = make_store(max_size=2)
+    now = time.time()
+    for chat_id in (1, 2, 3):
+        with patch("src.bot.pending.time.time", return_value=now + chat_id):
+            store[chat_id] = make_entry()
+    assert sorted(store) == [2, 3]
+    assert store.stats() == {"size": 2, "evicted_ttl": 0, "evicted_size": 1}
+
+def test_sqlite_store_survives_restart(tmp_path):
+    path = str(tmp_path / "pending.db")
+    store = SQLitePendingStore(path)
+    store[1] = make_entry("Lunch")
+    store.close()
+
+    reopened = SQLitePendingStore(path)
+    assert reopened[1]["items"][0]["description"] == "Lunch"
+    reopened.close()
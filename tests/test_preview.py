@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telegram.error import RetryAfter
+from src.bot.preview import ConfirmationPreview
+
+ITEM = {"date": "2024-01-01", "description": "Groceries", "amount": 300, "currency": "THB", "cash": False}
+
+async def reply(send, *args, **kwargs):
+    return await send(*args, **kwargs)
+
+def make_preview(interval=0.05):
+    message = MagicMock()
+    placeholder = MagicMock()
+    placeholder.edit_text = AsyncMock()
+    placeholder.delete = AsyncMock()
+    message.reply_text = AsyncMock(return_value=placeholder)
+    return ConfirmationPreview(message, reply, interval), message, placeholder
+
+@pytest.mark.asyncio
+async def test_finish_without_updates_sends_one_message():
+    preview, message, placeholder = make_preview()
+    await preview.finish("done", reply_markup="keyboard")
+
+    message.reply_text.assert_awaited_once_with("done", reply_markup="keyboard")
+    placeholder.edit_text.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_updates_are_coalesced_within_interval():
+    preview, message, placeholder = make_preview(interval=0.05)
+    preview.update([])
+    await asyncio.sleep(0.01)
+    message.reply_text.assert_awaited_once()
+    assert "Reading" in message.reply_text.call_args[0][0]
+
+    # A burst of partial results shows only the latest one, after the interval
+    for amount in (3, 30, 300):
+        preview.update([dict(ITEM, amount=amount)])
+    await asyncio.sleep(0.1)
+    placeholder.edit_text.assert_awaited_once()
+    assert "300 THB" in placeholder.edit_text.call_args[0][0]
+
+    await preview.finish("final", reply_markup="keyboard")
+    assert placeholder.edit_text.call_args == (("final",), {"reply_markup": "keyboard"})
+    message.reply_text.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_finish_skips_throttled_update():
+    preview, message, placeholder = make_preview(interval=10)
+    preview.update([])
+    await asyncio.sleep(0.01)
+    preview.update([ITEM])
+
+    await preview.finish("final")
+
+    # Only the final edit is made; the pending partial result is dropped
+    placeholder.edit_text.assert_awaited_once_with("final", reply_markup=None)
+
+@pytest.mark.asyncio
+async def test_retry_after_holds_back_edits():
+    preview, message, placeholder = make_preview(interval=0)
+    placeholder.edit_text.side_effect = [RetryAfter(0.05), None, None]
+    preview.update([])
+    await asyncio.sleep(0.01)
+    preview.update([ITEM])
+    await asyncio.sleep(0.01)
+    assert placeholder.edit_text.await_count == 1
+
+    await asyncio.sleep(0.1)
+    assert placeholder.edit_text.await_count == 2
+    assert "Groceries" in placeholder.edit_text.call_args[0][0]
+
+@pytest.mark.asyncio
+async def test_discard_deletes_placeholder():
+    preview, message, placeholder = make_preview()
+    preview.update([])
+    await asyncio.sleep(0.01)
+
+    await preview.discard()
+
+    placeholder.delete.assert_awaited_once()
+    preview.update([ITEM])
+    assert preview._task is None
@@ -0,0 +1,31 @@
+from src.agent.prompts import PARSE_PROMPT, CompiledPrompt, TokenBudget, compact, count_tokens
+
+def test_compact_strips_indentation_and_blank_lines():
+    assert compact("""
+        first line
+
+        second {"line"}
+    """) == 'first line\nsecond {"line"}'
+
+def test_fixed_prefix_is_identical_across_requests():
+    first = PARSE_PROMPT.template.format_messages(input="coffee 80", user="42", dates="Today is 2024-05-10 (Friday).")
+    second = PARSE_PROMPT.template.format_messages(input="taxi 150", user="43", dates="Today is 2024-05-11 (Saturday).")
+    assert first[0].content == second[0].content == PARSE_PROMPT.instructions
+    assert '{"expenses": [...]}' in first[0].content
+    assert first[1].content == "Today is 2024-05-10 (Friday). The sender is 42."
+    assert first[2].content == "coffee 80"
+
+def test_budget_measures_prompt_and_totals_reported_usage():
+    prompt = CompiledPrompt("test", "Fixed instructions", "{dates}")
+    budget = prompt.budget({"input": "coffee 80", "dates": "Today is 2024-05-10."}, limit=100)
+    assert budget.fixed == count_tokens("Fixed instructions") > 0
+    assert budget.variable == count_tokens("Today is 2024-05-10.") + count_tokens("coffee 80")
+
+    budget.charge({"input_tokens": 60, "output_tokens": 20, "input_token_details": {"cache_read": 40}})
+    budget.charge({"input_tokens": 60, "output_tokens": 25})
+    report = budget.report()
+    assert "2 calls used 120 input (40 cached) and 45 output tokens" in report
+    assert report.endswith("over budget")
+
+def test_budget_without_usage_is_within_limit():
+    assert not TokenBudget("test", 10, 5, 100).report().endswith("over budget")
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import pytest
+from src.ratelimit import PRIORITY_CONFIRM, PRIORITY_PARSE, QuotaScheduler, parse_retry_after
+
+@pytest.mark.asyncio
+async def test_burst_is_granted_then_callers_wait_for_refill():
+    quota = QuotaScheduler({"api": (600, 2)})  # 10 per second
+
+    assert await quota.acquire("api") < 0.01
+    assert await quota.acquire("api") < 0.01
+    waited = await quota.acquire("api")
+
+    assert 0.05 < waited < 0.3
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_by_priority():
+    quota = QuotaScheduler({"api": (600, 1)})
+    await quota.acquire("api")
+    order = []
+
+    async def call(name, priority):
+        await quota.acquire("api", priority=priority)
+        order.append(name)
+
+    parse = asyncio.create_task(call("parse", PRIORITY_PARSE))
+    await asyncio.sleep(0)
+    confirm = asyncio.create_task(call("confirm", PRIORITY_CONFIRM))
+    await asyncio.gather(parse, confirm)
+
+    assert order == ["confirm", "parse"]
+
+@pytest.mark.asyncio
+async def test_pause_holds_callers_for_retry_after():
+    quota = QuotaScheduler({"api": (6000, 10)})
+    quota.pause("api", 0.1)
+
+    start = time.monotonic()
+    await quota.acquire("api")
+
+    assert time.monotonic() - start >= 0.09
+
+@pytest.mark.asyncio
+async def test_charge_puts_bucket_into_debt():
+    quota = QuotaScheduler({"tokens": (6000, 100)})  # 100 per second
+    await quota.acquire("tokens", 50)
+    quota.charge("tokens", 60)
+
+    waited = await quota.acquire("tokens", 10)
+
+    assert waited > 0.1
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_block_the_queue():
+    quota = QuotaScheduler({"api": (600, 1)})
+    await quota.acquire("api")
+    stuck = asyncio.create_task(quota.acquire("api", priority=PRIORITY_CONFIRM))
+    await asyncio.sleep(0)
+    stuck.cancel()
+
+    await asyncio.wait_for(quota.acquire("api"), timeout=1)
+    assert quota.waiting("api") == 0
+
+@pytest.mark.asyncio
+async def test_unknown_bucket_is_unlimited():
+    quota = QuotaScheduler({"api": (0, 1)})  # 0 disables the limit
+    assert await quota.acquire("api") == 0
+    assert await quota.acquire("other") == 0
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
@@ -0,0 +1,53 @@
+import time
+from unittest.mock import patch
+from src.bot.writes import RecentWrites, confirmation_key, format_age
+
+def make_item(**overrides):
+    item = {"date": "2024-01-01", "amount": 80.0, "currency": "THB", "description": "Coffee", "cash": True, "user": "42"}
+    item.update(overrides)
+    return item
+
+def test_records_and_finds_any_key():
+    writes = RecentWrites()
+    writes.record(["callback:1", "message:5:10"], "default", [make_item()])
+    assert writes.find(["callback:2", "message:5:10"]).count == 1
+    assert writes.find(["callback:2", "message:5:11"]) is None
+    assert writes.stats()["suppressed"] == 1
+
+def test_confirmation_key_covers_selected_items_only():
+    expense = {"key": "abc", "items": [make_item(), make_item(description="Lunch")], "selected": [True, False]}
+    toggled = dict(expense, selected=[True, True])
+    assert confirmation_key(expense) != confirmation_key(toggled)
+    assert confirmation_key(expense) == confirmation_key(dict(expense, items=[make_item(), make_item(amount=1)]))
+
+def test_flags_same_user_amount_and_description_within_window():
+    writes = RecentWrites()
+    writes.record(["callback:1"], "default", [make_item()])
+    items = [make_item(description="  coffee. ", amount=80), make_item(amount=90), make_item(user="43")]
+    assert [index for index, _ in writes.duplicates("default", items, window=3600)] == [0]
+    assert writes.duplicates("other", items, window=3600) == []
+    with patch("src.bot.writes.time.time", return_value=time.time() + 7200):
+        assert writes.duplicates("default", items, window=3600) == []
+
+def test_entries_expire_and_are_bounded():
+    writes = RecentWrites(max_size=2, ttl=60)
+    writes.record(["callback:1"], "default", [])
+    writes.record(["callback:2", "callback:3"], "default", [])
+    assert writes.get("callback:1") is None
+    with patch("src.bot.writes.time.time", return_value=time.time() + 120):
+        assert writes.get("callback:3") is None
+
+def test_sqlite_index_survives_restart(tmp_path):
+    path = str(tmp_path / "recent_writes.db")
+    writes = RecentWrites(path=path)
+    writes.record(["callback:1"], "default", [make_item()])
+    writes.close()
+    reopened = RecentWrites(path=path)
+    assert reopened.get("callback:1").count == 1
+    assert reopened.duplicates("default", [make_item()], window=3600)
+    reopened.close()
+
+def test_format_age():
+    assert format_age(30) == "less than a minute"
+    assert format_age(300) == "5 min"
+    assert format_age(3900) == "1 h 5 min"
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from src.bot.scheduler import ChatScheduler
+from src.ratelimit import PRIORITY_CONFIRM
+
+def make_update(chat_id):
+    update = MagicMock()
+    update.effective_chat.id = chat_id
+    return update
+
+@pytest.mark.asyncio
+async def test_preserves_order_within_chat():
+    scheduler = ChatScheduler(max_concurrency=4)
+    events = []
+
+    async def handler(update, context):
+        events.append(("start", update.name))
+        await asyncio.sleep(0.01 if update.name == "first" else 0)
+        events.append(("end", update.name))
+
+    first, second = make_update(1), make_update(1)
+    first.name, second.name = "first", "second"
+    wrapped = scheduler.wrap(handler)
+    await asyncio.gather(wrapped(first, None), wrapped(second, None))
+
+    assert events == [("start", "first"), ("end", "first"), ("start", "second"), ("end", "second")]
+
+@pytest.mark.asyncio
+async def test_runs_different_chats_concurrently():
+    scheduler = ChatScheduler(max_concurrency=4)
+    started = asyncio.Event()
+    both_running = asyncio.Event()
+
+    async def handler(update, context):
+        if started.is_set():
+            both_running.set()
+        started.set()
+        await asyncio.wait_for(both_running.wait(), timeout=1)
+
+    wrapped = scheduler.wrap(handler)
+    await asyncio.gather(wrapped(make_update(1), None), wrapped(make_update(2), None))
+    assert scheduler.queued == 0
+
+@pytest.mark.asyncio
+async def test_caps_global_concurrency():
+    scheduler = ChatScheduler(max_concurrency=2)
+    peak = 0
+
+    async def handler(update, context):
+        nonlocal peak
+        peak = max(peak, scheduler.running)
+        await asyncio.sleep(0.01)
+
+    wrapped = scheduler.wrap(handler)
+    await asyncio.gather(*(wrapped(make_update(chat_id), None) for chat_id in range(6)))
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_confirmations_get_free_slots_first():
+    scheduler = ChatScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    async def blocker(update, context):
+        await release.wait()
+
+    async def handler(update, context):
+        order.append(update.name)
+
+    busy = asyncio.create_task(scheduler.wrap(blocker)(make_update(1), None))
+    await asyncio.sleep(0)
+    message, button = make_update(2), make_update(3)
+    message.name, button.name = "message", "button"
+    waiting = [
+        asyncio.create_task(scheduler.wrap(handler)(message, None)),
+        asyncio.create_task(scheduler.wrap(handler, PRIORITY_CONFIRM)(button, None)),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(busy, *waiting)
+
+    assert order == ["button", "message"]
@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.bot.shards import ShardRouter
+from src.tenants import Tenant, TenantRegistry, shard_for
+
+def make_update(chat_id):
+    update = MagicMock()
+    update.effective_chat.id = chat_id
+    update.effective_message.reply_text = AsyncMock()
+    update.to_dict.return_value = {"update_id": 1, "chat": chat_id}
+    return update
+
+@pytest.fixture
+@patch("src.bot.shards.Application", autospec=True)
+def router(mock_application):
+    tenants = TenantRegistry([Tenant(f"household-{index}", f"sheet-{index}", chats=(index,)) for index in range(8)])
+    return ShardRouter(3, tenants=tenants)
+
+@pytest.mark.asyncio
+async def test_routes_each_household_to_its_shard(router):
+    router.queues = [MagicMock() for _ in router.queues]
+    for chat_id in range(8):
+        await router.route(make_update(chat_id), None)
+        await router.route(make_update(chat_id), None)
+
+    for chat_id in range(8):
+        shard = shard_for(f"household-{chat_id}", 3)
+        router.queues[shard].put.assert_any_call({"update_id": 1, "chat": chat_id})
+    assert sum(router.forwarded.values()) == 16
+    assert sum(queue.put.call_count for queue in router.queues) == 16
+
+@pytest.mark.asyncio
+async def test_drops_updates_from_unknown_chats(router):
+    router.queues = [MagicMock() for _ in router.queues]
+    update = make_update(999)
+    await router.route(update, None)
+
+    assert not any(queue.put.called for queue in router.queues)
+    update.effective_message.reply_text.assert_awaited_once()
@@ -0,0 +1,118 @@
+import pytest
+import sqlite3
+from datetime import date
+from unittest.mock import MagicMock
+from src.sheets.mirror import SheetMirror
+
+HEADER = ["Date", "Description", "Amount", "Currency", "Cash", "User"]
+
+@pytest.fixture
+def sheets_client():
+    client = MagicMock()
+    client.append_listeners = []
+    return client
+
+@pytest.fixture
+def mirror(tmp_path, sheets_client):
+    mirror = SheetMirror(str(tmp_path / "mirror.db"), sheets_client)
+    yield mirror
+    mirror.close()
+
+def test_bootstrap_then_incremental_sync(mirror, sheets_client):
+    sheets_client.read_rows.return_value = [
+        HEADER,
+        ["2024-05-01", "Coffee", 80, "THB", True, "42"],
+        ["5/2/2024", "Lunch", 250, "THB", False, "43"],
+    ]
+    assert mirror.sync() == 3
+    sheets_client.read_rows.assert_called_with(1)
+    assert mirror.last_row == 3
+
+    sheets_client.read_rows.return_value = [["2024-05-03", "Taxi", "1,200", "thb", "FALSE", "42"]]
+    mirror.sync()
+    sheets_client.read_rows.assert_called_with(4)
+
+    totals = mirror.totals(date(2024, 5, 1), date(2024, 5, 31))
+    assert totals == [("THB", 1530.0, 3)]
+
+def test_records_own_appends_without_reading(mirror, sheets_client):
+    sheets_client.read_rows.return_value = [HEADER]
+    mirror.sync()
+
+    listener = sheets_client.append_listeners[0]
+    listener(
+        [["2024-05-01", "Coffee", 80, "THB", True, "42"], ["2024-05-02", "Dinner", 500, "THB", False, "43"]],
+        {"updates": {"updatedRange": "Actual!A2:F3"}}
+    )
+
+    assert mirror.last_row == 3
+    assert mirror.totals(date(2024, 5, 1), date(2024, 5, 31), by_user=True) == [
+        ("42", "THB", 80.0, 1), ("43", "THB", 500.0, 1)
+    ]
+
+def test_append_after_unseen_rows_does_not_skip_them(mirror, sheets_client):
+    sheets_client.read_rows.return_value = [HEADER]
+    mirror.sync()
+
+    # Someone else added row 2 by hand; our append landed in row 3
+    sheets_client.append_listeners[0](
+        [["2024-05-02", "Dinner", 500, "THB", False, "43"]],
+        {"updates": {"updatedRange": "Actual!A3:F3"}}
+    )
+    assert mirror.last_row == 1
+
+    sheets_client.read_rows.return_value = [
+        ["2024-05-01", "Groceries", 300, "THB", False, "42"],
+        ["2024-05-02", "Dinner", 500, "THB", False, "43"],
+    ]
+    mirror.sync()
+    assert mirror.last_row == 3
+    assert mirror.totals(date(2024, 5, 1), date(2024, 5, 31)) == [("THB", 800.0, 2)]
+
+def test_category_column_is_mirrored(mirror, sheets_client):
+    sheets_client.read_rows.return_value = [
+        HEADER + ["Category"],
+        ["2024-05-01", "Coffee", 80, "THB", True, "42", "Food"],
+        ["2024-05-02", "Taxi", 120, "THB", False, "42"],
+    ]
+    mirror.sync()
+
+    assert mirror.labeled_rows() == [("Coffee", "Food")]
+    assert mirror.totals(date(2024, 5, 1), date(2024, 5, 31), by_category=True) == [
+        ("", "THB", 120.0, 1), ("Food", "THB", 80.0, 1)
+    ]
+
+def test_mirror_without_category_column_is_resynced(tmp_path, sheets_client):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE actual (row INTEGER PRIMARY KEY, date TEXT NOT NULL, description TEXT NOT NULL, "
+        "amount REAL NOT NULL, currency TEXT NOT NULL, cash INTEGER NOT NULL, user TEXT NOT NULL)"
+    )
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT INTO meta VALUES ('last_row', 10)")
+    conn.commit()
+    conn.close()
+
+    mirror = SheetMirror(path, sheets_client)
+    assert mirror.last_row == 0
+    mirror.close()
+
+def test_base_amounts_are_mirrored(mirror, sheets_client):
+    sheets_client.read_rows.return_value = [
+        HEADER + ["Category", "Base"],
+        ["2024-05-01", "Hotel", 100, "USD", False, "42", "Travel", 3500],
+        ["2024-05-02", "Taxi", 120, "THB", False, "42"],
+    ]
+    mirror.sync()
+
+    assert mirror.amounts(date(2024, 5, 1), date(2024, 5, 31)) == [
+        ("2024-05-01", 100.0, "USD", 3500.0), ("2024-05-02", 120.0, "THB", None)
+    ]
+
+def test_sync_reads_through_the_given_client(mirror, sheets_client):
+    resolved = MagicMock()
+    resolved.read_rows.return_value = [HEADER]
+    assert mirror.sync(resolved) == 1
+    resolved.read_rows.assert_called_once_with(1)
+    sheets_client.read_rows.assert_not_called()
@@ -1,20 +1,123 @@
+import asyncio
+import time
 import pytest
 from unittest.mock import patch, MagicMock
+from src.ratelimit import QuotaScheduler
 from src.sheets.client import SheetsClient
+from src.sheets.transport import SheetsApiError
 
 @pytest.fixture
-@patch('src.sheets.client.build')
-@patch('src.sheets.client.service_account.Credentials.from_service_account_info')
-@patch('src.sheets.client.GOOGLE_CREDENTIALS', '{"type": "service_account"}')
-def sheets_client(mock_creds, mock_build):
-    mock_service = MagicMock()
-    mock_build.return_value = mock_service
-    return SheetsClient('test_spreadsheet_id')
+def sheets_client():
+    return SheetsClient('test_spreadsheet_id', flush_interval=0.01, transport=MagicMock())
 
 def test_initialization(sheets_client):
-    assert sheets_client.service is not None
+    assert sheets_client.transport is not None
     assert sheets_client.spreadsheet_id == 'test_spreadsheet_id'
 
-def test_append_expense(sheets_client):
-    sheets_client.append_expense('2024-01-01', 'Food', 100, 'THB', cash=True, user='test_user')
-    sheets_client.service.spreadsheets().values().append.assert_called_once()
+def test_lazy_client_builds_transport_on_first_use():
+    with patch.object(SheetsClient, 'create_transport', return_value=MagicMock()) as create_transport:
+        client = SheetsClient('test_spreadsheet_id', lazy=True)
+        create_transport.assert_not_called()
+
+        assert client.transport is client.transport
+        create_transport.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_append_expense(sheets_client):
+    await sheets_client.append_expense('2024-01-01', 'Food', 100, 'THB', cash=True, user='test_user')
+    sheets_client.transport.append_values.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_append_expense_batches_rows(sheets_client):
+    append = sheets_client.transport.append_values
+    first = sheets_client.append_expense('2024-01-01', 'Food', 100, 'THB', cash=True, user='his')
+    second = sheets_client.append_expense('2024-01-02', 'Taxi', 200, 'THB', cash=False, user='her')
+
+    await asyncio.gather(first, second)
+
+    append.assert_called_once()
+    assert append.call_args.args[2] == [
+        ['2024-01-01', 'Food', 100, 'THB', True, 'his'],
+        ['2024-01-02', 'Taxi', 200, 'THB', False, 'her'],
+    ]
+
+@pytest.mark.asyncio
+async def test_append_expenses_writes_category_column(sheets_client):
+    await sheets_client.append_expenses([
+        {'date': '2024-01-01', 'description': 'Taxi', 'amount': 200, 'currency': 'THB', 'cash': False, 'user': 'her', 'category': 'Transport'},
+        {'date': '2024-01-01', 'description': 'Misc', 'amount': 50, 'currency': 'THB'},
+    ])
+
+    append = sheets_client.transport.append_values
+    assert append.call_args.args[1] == 'Actual!A:H'
+    assert [row[6] for row in append.call_args.args[2]] == ['Transport', '']
+
+@pytest.mark.asyncio
+async def test_append_expenses_writes_base_amount_column(sheets_client):
+    await sheets_client.append_expenses([
+        {'date': '2024-01-01', 'description': 'Hotel', 'amount': 100, 'currency': 'USD', 'base_amount': 3500.0},
+        {'date': '2024-01-01', 'description': 'Souvenir', 'amount': 5, 'currency': 'GBP', 'base_amount': None},
+    ])
+
+    rows = sheets_client.transport.append_values.call_args.args[2]
+    assert [row[7] for row in rows] == [3500.0, '']
+
+def test_write_base_amounts_updates_one_column(sheets_client):
+    sheets_client.write_base_amounts(2, [3500.0, ''])
+    sheets_client.transport.update_values.assert_called_once_with(
+        'test_spreadsheet_id', 'Actual!H2:H3', [[3500.0], ['']]
+    )
+
+@pytest.mark.asyncio
+async def test_append_expense_flushes_on_batch_size(sheets_client):
+    sheets_client.writer.batch_size = 2
+    sheets_client.writer.flush_interval = 60
+    append = sheets_client.transport.append_values
+
+    futures = [
+        sheets_client.append_expense('2024-01-01', f'Item {i}', 10, 'THB')
+        for i in range(2)
+    ]
+    await asyncio.wait_for(asyncio.gather(*futures), timeout=1)
+
+    append.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_append_expense_propagates_errors(sheets_client):
+    sheets_client.transport.append_values.side_effect = RuntimeError("quota")
+
+    with pytest.raises(RuntimeError, match="quota"):
+        await sheets_client.append_expense('2024-01-01', 'Food', 100, 'THB')
+
+@pytest.mark.asyncio
+async def test_quota_rejection_is_retried_after_retry_after():
+    quota = QuotaScheduler({"sheets_write": (6000, 10)})
+    client = SheetsClient('test_spreadsheet_id', flush_interval=0.01, transport=MagicMock(), quota=quota)
+    client.transport.append_values.side_effect = [
+        SheetsApiError(429, "Quota exceeded", retry_after=0.05),
+        {"updates": {"updatedRange": "Actual!A2:F2"}},
+    ]
+
+    result = await client.append_expense('2024-01-01', 'Food', 100, 'THB')
+
+    assert result["updates"]["updatedRange"] == "Actual!A2:F2"
+    assert client.transport.append_values.call_count == 2
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_close_does_not_block_the_event_loop(sheets_client):
+    sheets_client.transport.get_values.side_effect = lambda *args: time.sleep(0.3)
+    read = sheets_client.run_blocking(sheets_client.transport.get_values, "range")
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await sheets_client.close()
+    ticker.cancel()
+    await read
+    assert ticks > 5
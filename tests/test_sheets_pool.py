@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.sheets.pool import SheetsClientCache
+
+def make_cache(max_size=2):
+    created = []
+    def factory(spreadsheet_id):
+        client = MagicMock()
+        client.spreadsheet_id = spreadsheet_id
+        client.close = AsyncMock()
+        created.append(client)
+        return client
+    return SheetsClientCache(factory, max_size), created
+
+@pytest.mark.asyncio
+async def test_evicts_and_closes_least_recently_used():
+    cache, created = make_cache(max_size=2)
+    a = cache.get("a")
+    cache.get("b")
+    assert cache.get("a") is a  # "b" is now least recently used
+    cache.get("c")
+    await cache.close()
+
+    assert [client.spreadsheet_id for client in created] == ["a", "b", "c"]
+    created[1].close.assert_awaited_once()
+    assert cache.evictions == 1
+    a.close.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_handle_rebuilds_evicted_client_and_keeps_listeners():
+    cache, created = make_cache(max_size=1)
+    handle = cache.handle("a")
+    listener = MagicMock()
+    handle.append_listeners.append(listener)
+
+    handle.append_expenses([])
+    cache.get("b")  # Evicts "a"
+    handle.append_expenses([])
+
+    assert [client.spreadsheet_id for client in created] == ["a", "b", "a"]
+    assert created[2].append_listeners == [listener]
+    created[2].append_expenses.assert_called_once_with([])
+    await cache.close()
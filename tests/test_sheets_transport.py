@@ -0,0 +1,103 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+import pytest
+import pytest_asyncio
+from benchmarks.fakes import FakeSheetsServer
+from src.sheets.transport import SheetsApiError, SheetsTransport, TokenProvider, get_token_provider
+
+class FakeCredentials:
+    def __init__(self, lifetime=3600):
+        self.token = None
+        self.expiry = None
+        self.lifetime = lifetime
+        self.refresh_calls = 0
+
+    def refresh(self, request):
+        self.refresh_calls += 1
+        self.token = f"token-{self.refresh_calls}"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=self.lifetime)
+
+@pytest_asyncio.fixture
+async def server():
+    server = FakeSheetsServer(latency=0)
+    server.start()
+    yield server
+    await server.stop()
+
+@pytest.fixture
+def provider():
+    provider = TokenProvider(FakeCredentials())
+    yield provider
+    provider.close()
+
+@pytest.mark.asyncio
+async def test_append_and_read_round_trip(server, provider):
+    transport = SheetsTransport(provider, base_url=server.url)
+
+    response = await asyncio.to_thread(
+        transport.append_values, "sheet-id", "Actual!A:F", [["2024-01-01", "Coffee", 80, "THB", True, "42"]]
+    )
+    values = await asyncio.to_thread(transport.get_values, "sheet-id", "Actual!A2:F")
+
+    assert response["updates"]["updatedRange"] == "Actual!A2:F2"
+    assert values["values"] == [["2024-01-01", "Coffee", 80, "THB", True, "42"]]
+    assert server.auth_headers == ["Bearer token-1", "Bearer token-1"]
+    assert provider.credentials.refresh_calls == 1
+
+@pytest.mark.asyncio
+async def test_requests_run_in_parallel_across_threads(server):
+    server.latency = 0.2
+    transport = SheetsTransport(base_url=server.url, pool_size=8)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        asyncio.to_thread(transport.get_values, "sheet-id", "Actual!A1:F") for _ in range(8)
+    ))
+
+    assert time.perf_counter() - start < 0.8
+    assert server.requests == 8
+
+@pytest.mark.asyncio
+async def test_error_carries_retry_after(server):
+    server.failures.append((429, 7))
+    transport = SheetsTransport(base_url=server.url)
+
+    with pytest.raises(SheetsApiError) as error:
+        await asyncio.to_thread(transport.get_values, "sheet-id", "Actual!A1:F")
+
+    assert error.value.status == 429
+    assert error.value.retry_after == 7
+
+@pytest.mark.asyncio
+async def test_unauthorized_refreshes_token_and_retries(server, provider):
+    server.failures.append((401, None))
+    transport = SheetsTransport(provider, base_url=server.url)
+
+    await asyncio.to_thread(transport.get_values, "sheet-id", "Actual!A1:F")
+
+    assert server.auth_headers == ["Bearer token-1", "Bearer token-2"]
+
+def test_token_near_expiry_is_not_refreshed_inline():
+    credentials = FakeCredentials()
+    credentials.token = "current"
+    credentials.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=60)
+    provider = TokenProvider(credentials, refresh_margin=300)
+
+    assert provider.token() == "current"
+    assert credentials.refresh_calls == 0
+
+def test_refresh_schedules_next_refresh_ahead_of_expiry(provider):
+    provider.refresh()
+
+    assert provider.timer is not None
+    assert provider.timer.interval == pytest.approx(3600 - 300, abs=5)
+
+def test_credentials_are_parsed_once_per_string():
+    with patch("google.oauth2.service_account.Credentials.from_service_account_info") as from_info:
+        first = get_token_provider('{"type": "service_account", "client_email": "a@example.com"}')
+        second = get_token_provider('{"type": "service_account", "client_email": "a@example.com"}')
+
+    assert first is second
+    from_info.assert_called_once()
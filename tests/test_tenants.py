@@ -0,0 +1,55 @@
+import json
+import pytest
+from unittest.mock import patch
+from src.tenants import DEFAULT_TENANT_ID, Tenant, TenantRegistry, shard_for, tenant_path
+
+HOUSEHOLDS = {
+    "households": [
+        {"id": "smiths", "spreadsheet_id": "sheet-1", "his_id": 1, "her_id": 2},
+        {"id": "joneses", "spreadsheet_id": "sheet-2", "his_id": 3, "her_id": 4, "chats": [-100, 3, 4]},
+    ]
+}
+
+def test_chats_default_to_members_private_chats(tmp_path):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps(HOUSEHOLDS))
+    registry = TenantRegistry.load(str(path))
+
+    assert registry.for_chat(1).id == "smiths"
+    assert registry.for_chat(2).spreadsheet_id == "sheet-1"
+    assert registry.for_chat(-100).id == "joneses"
+    assert registry.for_chat(-100).his_id == "3"
+    assert registry.for_chat(999) is None
+    assert len(registry) == 2
+
+def test_unlisted_chats_go_to_default():
+    default = Tenant(DEFAULT_TENANT_ID, "legacy-sheet", "10", "11")
+    registry = TenantRegistry(TenantRegistry.parse(HOUSEHOLDS), default)
+
+    assert registry.for_chat(999) is default
+    assert registry.for_chat(None) is default
+    assert registry.for_chat(1).id == "smiths"
+
+def test_rejects_chat_in_two_households():
+    data = {"households": [
+        {"id": "a", "spreadsheet_id": "s1", "chats": [5]},
+        {"id": "b", "spreadsheet_id": "s2", "chats": [5]},
+    ]}
+    with pytest.raises(ValueError):
+        TenantRegistry(TenantRegistry.parse(data))
+
+@patch("src.config.TENANTS_PATH", None)
+@patch("src.config.GOOGLE_SHEETS_ID", "legacy-sheet")
+def test_from_config_without_registry_serves_every_chat_from_one_sheet():
+    registry = TenantRegistry.from_config()
+    assert registry.for_chat(42).spreadsheet_id == "legacy-sheet"
+
+def test_shard_for_is_stable_and_in_range():
+    shards = [shard_for(f"household-{index}", 4) for index in range(200)]
+    assert shards == [shard_for(f"household-{index}", 4) for index in range(200)]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shard_for("anything", 1) == 0
+
+def test_tenant_path():
+    assert tenant_path("data/outbox.db", "smiths") == "data/outbox.smiths.db"
+    assert tenant_path("data/outbox.db", DEFAULT_TENANT_ID) == "data/outbox.db"
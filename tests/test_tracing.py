@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import MagicMock
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from src.agent.tracing import TraceSampler
+
+async def traced_call(sampler):
+    collector = sampler.collector()
+    chain = ChatPromptTemplate.from_messages([("user", "{input}")]) | FakeListChatModel(responses=["{}"])
+    await chain.ainvoke({"input": "coffee"}, config={"callbacks": [collector], "run_name": "parse_expense"})
+    return collector
+
+def test_disabled_sampler_collects_nothing():
+    sampler = TraceSampler(False)
+
+    assert sampler.collector() is None
+    assert sampler.finish(None) is False
+    assert sampler.thread is None
+
+@pytest.mark.asyncio
+async def test_unsampled_success_is_not_exported():
+    client = MagicMock()
+    sampler = TraceSampler(True, sample_rate=0.0, client=client)
+
+    assert sampler.finish(await traced_call(sampler)) is False
+    sampler.close()
+
+    client.batch_ingest_runs.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_failures_are_always_exported_with_error():
+    client = MagicMock()
+    sampler = TraceSampler(True, sample_rate=0.0, client=client, flush_interval=0.01)
+
+    assert sampler.finish(await traced_call(sampler), error="ValueError: No expenses found") is True
+    sampler.close()
+
+    payloads = client.batch_ingest_runs.call_args.kwargs["create"]
+    assert payloads[0]["name"] == "parse_expense"
+    assert payloads[0]["error"] == "ValueError: No expenses found"
+    # The prompt and model runs are exported with their parent
+    assert {payload["trace_id"] for payload in payloads} == {payloads[0]["id"]}
+    assert len(payloads) == 3
+
+@pytest.mark.asyncio
+async def test_sampled_calls_are_exported_in_one_batch():
+    client = MagicMock()
+    sampler = TraceSampler(True, sample_rate=1.0, client=client, batch_size=10, flush_interval=5.0)
+
+    for _ in range(3):
+        sampler.finish(await traced_call(sampler))
+    sampler.close()
+
+    client.batch_ingest_runs.assert_called_once()
+    assert sampler.exported == 3
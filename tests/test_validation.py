@@ -0,0 +1,54 @@
+import pytest
+from datetime import date
+from src.agent.validation import resolve_user, validate_expense, validate_expenses
+
+TODAY = date(2024, 5, 2)
+
+ITEM = {
+    "date": "2024-05-01",
+    "description": "Groceries",
+    "amount": 300,
+    "currency": "baht",
+    "cash": False,
+    "user": "42"
+}
+
+def test_valid_item_is_normalized():
+    expense, errors = validate_expense(ITEM, TODAY)
+    assert errors == []
+    assert expense == dict(ITEM, amount=300.0, currency="THB")
+
+@pytest.mark.parametrize("currency", ["CHF", "aud", "CAD", "KRW", "PHP", "HKD"])
+def test_any_iso_currency_is_accepted(currency):
+    expense, errors = validate_expense(dict(ITEM, currency=currency), TODAY)
+    assert errors == []
+    assert expense["currency"] == currency.upper()
+
+@pytest.mark.parametrize("changes, problem", [
+    ({"amount": -5}, "amount"),
+    ({"amount": "lots"}, "amount"),
+    ({"currency": "XYZ"}, "currency"),
+    ({"date": "01/05/2024"}, "date"),
+    ({"date": "2024-06-01"}, "date"),
+    ({"description": " "}, "description"),
+])
+def test_invalid_fields_are_reported(changes, problem):
+    expense, errors = validate_expense(dict(ITEM, **changes), TODAY)
+    assert expense is None
+    assert any(problem in error for error in errors)
+
+def test_user_words_map_to_household_ids():
+    assert resolve_user("her", "1", "1", "2") == "2"
+    assert resolve_user("His", "2", "1", "2") == "1"
+    assert resolve_user("default_user", "2", "1", "2") == "2"
+    assert resolve_user("someone", "2", "1", "2") is None
+    # Without configured ids anything goes
+    assert resolve_user("someone", "42", None, None) == "someone"
+
+def test_one_bad_item_rejects_the_result():
+    expenses, errors = validate_expenses([ITEM, dict(ITEM, amount=0)], TODAY)
+    assert expenses == []
+    assert errors and errors[0].startswith("item 2")
+
+def test_empty_result_is_rejected():
+    assert validate_expenses([], TODAY) == ([], ["no expenses found"])